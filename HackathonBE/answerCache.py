@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+import envConfig  # noqa: F401
+from jsonCodec import dumps
+from kbEmbeddings import get_embedder
+
+# Tunables (override in .env)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))   # cosine similarity
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "900"))                # seconds
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))               # answers kept in memory
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "")                        # e.g. index/answers.sqlite
+ANSWER_CACHE_EMBEDDER = os.getenv("ANSWER_CACHE_EMBEDDER", "hashing")         # see kbEmbeddings.get_embedder
+
+_PUNCT = re.compile(r"[^\w\s]")
+# Words that change what is being asked but that embedders (and kbIndex stopwords) discount:
+# a semantic match must agree on all of them
+_INTENT_WORDS = frozenset("what why how when where who whom which whose not no never cannot can t".split())
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(_PUNCT.sub(" ", question.lower()).split())
+
+
+def _intent(normalized: str) -> frozenset:
+    return frozenset(w for w in normalized.split() if w in _INTENT_WORDS)
+
+
+def payload_fingerprint(api_data, history=None) -> str:
+    """
+    sha256 of the fetched entity payload (a JSON string, or the decoded value, which is
+    hashed as compact JSON), so any change in the Rentvine data changes the key. A
+    non-empty chat history (the client's blob, or chatSessions.transcript_key of the
+    stored transcript) is folded in: follow-up answers depend on it.
+    """
+    if not isinstance(api_data, str):
+        api_data = dumps(api_data)
+    digest = hashlib.sha256(api_data.encode("utf-8"))
+    if history not in (None, "", "[]"):
+        digest.update(b"\0" + str(history).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CachedAnswer:
+    __slots__ = ("question", "vector", "answer", "sources", "created", "expires")
+
+    def __init__(self, question: str, vector: np.ndarray, answer: str, sources: list,
+                 created: float, expires: float):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.sources = sources
+        self.created = created
+        self.expires = expires
+
+
+class _SqliteStore:
+    """Optional on-disk tier, shared by every worker on the box and kept across restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " fingerprint TEXT, question TEXT, vector BLOB, answer TEXT, sources TEXT,"
+            " created REAL, expires REAL, PRIMARY KEY (fingerprint, question))"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def bucket(self, fingerprint: str) -> list:
+        rows = self._conn().execute(
+            "SELECT question, vector, answer, sources, created, expires FROM answers"
+            " WHERE fingerprint = ? AND expires > ?", (fingerprint, time.time())
+        ).fetchall()
+        return [CachedAnswer(q, np.frombuffer(v, dtype=np.float32), a, json.loads(s), c, e)
+                for q, v, a, s, c, e in rows]
+
+    def put(self, fingerprint: str, entry: CachedAnswer):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (fingerprint, entry.question, entry.vector.astype(np.float32).tobytes(), entry.answer,
+             json.dumps(entry.sources, ensure_ascii=False), entry.created, entry.expires),
+        )
+        conn.execute("DELETE FROM answers WHERE expires <= ?", (time.time(),))
+
+
+class AnswerCache:
+    """
+    Answers keyed by (payload fingerprint, question). A lookup first tries the normalized
+    question verbatim, then the most similar cached question for the same fingerprint
+    (cosine >= threshold). Entries expire after ttl and the in-memory tier is an LRU of
+    max_entries answers.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_SIZE, path: str = ANSWER_CACHE_PATH,
+                 embedder: str = ANSWER_CACHE_EMBEDDER):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (fingerprint, normalized question) -> CachedAnswer
+        self._buckets = {}              # fingerprint -> set of normalized questions
+        self._lock = threading.Lock()
+        self._store = _SqliteStore(path) if path else None
+        self._embedder_name = embedder
+        self._embedder = None
+        self._vector = lru_cache(maxsize=1024)(self._embed)
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0,
+                         "evictions": 0, "expired": 0, "disk_loads": 0}
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        if self._embedder is None:
+            self._embedder = get_embedder(self._embedder_name)
+        return np.asarray(self._embedder.embed([normalized])[0], dtype=np.float32)
+
+    def _drop(self, key: tuple):
+        self._entries.pop(key, None)
+        bucket = self._buckets.get(key[0])
+        if bucket is not None:
+            bucket.discard(key[1])
+            if not bucket:
+                del self._buckets[key[0]]
+
+    def _insert(self, fingerprint: str, entry: CachedAnswer):
+        key = (fingerprint, entry.question)
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        self._buckets.setdefault(fingerprint, set()).add(entry.question)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._drop(old_key)
+            self.counters["evictions"] += 1
+
+    def _candidates(self, fingerprint: str) -> list:
+        now = time.time()
+        out = []
+        for question in list(self._buckets.get(fingerprint, ())):
+            entry = self._entries[(fingerprint, question)]
+            if entry.expires <= now:
+                self._drop((fingerprint, question))
+                self.counters["expired"] += 1
+            else:
+                out.append(entry)
+        return out
+
+    def lookup(self, question: str, fingerprint: str):
+        """
+        Returns:
+            {"answer", "sources", "match": "exact"|"semantic", "similarity", "age"} or None.
+        """
+        normalized = normalize_question(question)
+        with self._lock:
+            candidates = self._candidates(fingerprint)
+        if not candidates and self._store is not None:
+            loaded = self._store.bucket(fingerprint)
+            if loaded:
+                with self._lock:
+                    self.counters["disk_loads"] += 1
+                    for entry in loaded:
+                        self._insert(fingerprint, entry)
+                    candidates = self._candidates(fingerprint)
+
+        best, similarity, match = None, 0.0, "exact"
+        for entry in candidates:
+            if entry.question == normalized:
+                best, similarity = entry, 1.0
+                break
+        intent = _intent(normalized)
+        candidates = [c for c in candidates if _intent(c.question) == intent]
+        if best is None and candidates:
+            vector = self._vector(normalized)
+            scores = np.stack([c.vector for c in candidates]) @ vector
+            i = int(np.argmax(scores))
+            if scores[i] >= self.threshold:
+                best, similarity, match = candidates[i], float(scores[i]), "semantic"
+
+        with self._lock:
+            if best is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters[match + "_hits"] += 1
+            key = (fingerprint, best.question)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return {"answer": best.answer, "sources": best.sources, "match": match,
+                "similarity": round(similarity, 4), "age": round(time.time() - best.created, 1)}
+
+    def store(self, question: str, fingerprint: str, answer: str, sources: list):
+        normalized = normalize_question(question)
+        now = time.time()
+        entry = CachedAnswer(normalized, self._vector(normalized), answer, sources, now, now + self.ttl)
+        with self._lock:
+            self._insert(fingerprint, entry)
+            self.counters["stores"] += 1
+        if self._store is not None:
+            self._store.put(fingerprint, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+            lookups = hits + self.counters["misses"]
+            return dict(
+                self.counters,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                threshold=self.threshold,
+                ttl=self.ttl,
+                hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                shared=bool(self._store),
+            )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Process-wide answer cache, or None when ANSWER_CACHE=0."""
+    global _cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
+
+
+def answer_cache_stats() -> dict:
+    cache = get_answer_cache()
+    return cache.stats() if cache else {"enabled": False}
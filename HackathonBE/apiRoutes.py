@@ -1,7 +1,17 @@
+import os
 import re
-import json
-import requests
+from functools import lru_cache
 from urllib.parse import urlparse
+import envConfig  # noqa: F401
+from fetchEngine import DEFAULT_TIMEOUT, run_plan
+from jsonCodec import dumps
+from routeRegistry import ApiCall, RouteRegistry
+from telemetry import get_logger, span
+
+log = get_logger("apiRoutes")
+
+# Tunables (override in .env)
+INCLUDE_PROJECTION = os.getenv("INCLUDE_PROJECTION", "1") != "0"   # 0 = always fetch every include
 
 # Pre-encoded includes strings (kept exactly as provided)
 INCLUDES = {
@@ -26,240 +36,311 @@ INCLUDES = {
     "ledgers": "balances",
 }
 
-# Route table: each entry defines how to match a web URL and build the API URL(s)
+# Question intents: a question has an intent when one of its words starts with one of
+# these stems. Routes map intents to the relations they need (PROJECTIONS below); a
+# question with no intent, or none a call knows, gets the call's full includes.
+INTENTS = {
+    "vendor": ("vendor", "contractor", "technician", "trade", "assign", "schedul", "appointment", "dispatch"),
+    "billing": ("bill", "invoice", "cost", "charge", "paid", "pay", "price", "expense", "fee"),
+    "owner": ("owner", "approv", "portfolio", "reserve"),
+    "tenant": ("tenant", "resident", "lease", "rent", "renter", "occupant", "move"),
+    "balance": ("balance", "owe", "outstanding", "ledger", "transaction", "deposit", "escrow",
+                "statement", "distribut", "posting", "money", "fund"),
+    "inspection": ("inspect", "checklist", "area", "item", "photo", "picture", "image", "file"),
+    "property": ("propert", "unit", "address", "appliance", "association", "hoa", "listing",
+                 "bed", "bath", "sqft", "manager"),
+    "project": ("project",),
+    "review": ("review", "rating", "feedback"),
+    "applicant": ("applicant", "application", "animal", "pet", "prospect", "group", "cosign", "guarantor"),
+    "report": ("report", "credit", "criminal", "eviction", "background"),
+}
+_INTENT_PATTERNS = {intent: re.compile(r"\b(?:" + "|".join(stems) + ")", re.IGNORECASE)
+                    for intent, stems in INTENTS.items()}
+
+# Relations per intent for the routes whose includes are worth trimming; "core" is
+# always fetched (and must keep any field a dependent call reads)
+PROJECTIONS = {
+    "maintenance_work_orders": {
+        "core": "property,unit",
+        "vendor": "vendor,vendorTrade,assignees",
+        "billing": "bills,vendor",
+        "owner": "portfolio,owners",
+        "tenant": "lease,leaseTenants",
+        "balance": "portfolio,portfolioBalances,lease,leaseBalances",
+        "inspection": "inspection",
+        "project": "workOrderProject",
+        "property": "associations",
+        "review": "review",
+    },
+    "maintenance_inspections": {
+        "core": "property,unit",
+        "inspection": "areas,items,files",
+        "tenant": "lease",
+    },
+    "properties": {
+        "core": "unit",
+        "tenant": "lease,pastLeases,futureLeases",
+        "owner": "owners,portfolios",
+        "billing": "managementFeeSetting",
+        "property": "image,listing,appliances,associations,propertyManager",
+        "applicant": "applicationTemplate,listing",
+    },
+    "screening_applications": {
+        "core": "applicants",
+        "applicant": "group,prospect,animals",
+        "report": "reports,creditReportDocument,criminalReportDocument,evictionReportDocument",
+        "tenant": "lease",
+    },
+    "portfolios": {
+        "core": "ledger",    # the ledger call reads ledger.ledgerID
+        "owner": "owners",
+        "property": "properties",
+        "balance": "posting,statementSetting",
+        "billing": "posting",
+    },
+}
+
+# Route table: each entry maps a page template to the API calls that describe it.
+# "{id}" segments match the numeric ID in the page URL. Calls without "after" are fetched
+# concurrently; a call with after=<key> is issued once that response lands, with "{value}"
+# taken from its dotted "field". Multi-call routes return {key: body}, others the body.
+# Optional "timeout" is a (connect, read) tuple in seconds; defaults to fetchEngine.DEFAULT_TIMEOUT
+# Optional "cache_ttl" is how long (seconds) a response is reused before revalidation; defaults to DEFAULT_CACHE_TTL
+# A call's "projections" and "when" narrow it per question (see routeRegistry.ApiCall)
+# Optional "kb" picks the page's help material at build time (see pageContext.py): KB "sections"
+# ("Category" or "Category/Subcategory"), TrainingData "training" domains and ranking "terms"
+DEFAULT_CACHE_TTL = 60
 ROUTES = [
     # Maintenance
     {
-        "pattern": re.compile(r"^/maintenance/work-orders/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/maintenance/work-orders/{_id}",
-        "includes": INCLUDES["maintenance_work_orders"],
+        "template": "/maintenance/work-orders/{id}",
+        "calls": [ApiCall("/api/manager/maintenance/work-orders/{id}", INCLUDES["maintenance_work_orders"],
+                         projections=PROJECTIONS["maintenance_work_orders"])],
+        "cache_ttl": 30,  # status/assignees change during the day
+        "kb": {"sections": ("Maintenance", "Vendors", "Accounting/Pay Bills"), "training": ("Maintenance",),
+               "terms": "work order status vendor estimate assign watcher bill recurring entry instructions review"},
     },
     {
-        "pattern": re.compile(r"^/maintenance/inspections/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/maintenance/inspections/{_id}",
-        "includes": INCLUDES["maintenance_inspections"],
+        "template": "/maintenance/inspections/{id}",
+        "calls": [ApiCall("/api/manager/maintenance/inspections/{id}", INCLUDES["maintenance_inspections"],
+                         projections=PROJECTIONS["maintenance_inspections"])],
+        "kb": {"sections": ("Maintenance", "Properties/Properties"), "training": ("Maintenance",),
+               "terms": "inspection move in move out checklist area item photos images files condition"},
     },
     {
-        "pattern": re.compile(r"^/maintenance/projects/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/maintenance/work-orders/projects/{_id}",
-        "includes": INCLUDES["maintenance_projects"],
+        "template": "/maintenance/projects/{id}",
+        "calls": [ApiCall("/api/manager/maintenance/work-orders/projects/{id}", INCLUDES["maintenance_projects"])],
+        "kb": {"sections": ("Maintenance",), "training": ("Maintenance",),
+               "terms": "work order project template recurring assign status"},
     },
 
-    # Diagnostics (no ID; maps to TWO API endpoints)
+    # Diagnostics (no ID; maps to TWO independent API endpoints)
     {
-        "pattern": re.compile(r"^/accounting/diagnostics/?$"),
-        "api_paths": [
-            "/api/manager/accounting/accounts",    # GL accounts
-            "/api/manager/accounting/diagnostics"  # actual diagnostics
+        "template": "/accounting/diagnostics",
+        "calls": [
+            ApiCall("/api/manager/accounting/accounts", key="accounts"),        # GL accounts
+            ApiCall("/api/manager/accounting/diagnostics", key="diagnostics"),  # actual diagnostics
         ],
+        "timeout": (3.05, 45),  # diagnostics are computed on request
+        "cache_ttl": 120,
+        "kb": {"sections": ("Accounting/General Accounting", "Accounting/Banking", "Reports"), "training": ("Accounting",),
+               "terms": "diagnostics chart of accounts general ledger reconcile escrow mismatch balance journal entry bank"},
     },
 
     # Properties
     {
-        "pattern": re.compile(r"^/properties/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/properties/{_id}",
-        "includes": INCLUDES["properties"],
+        "template": "/properties/{id}",
+        "calls": [ApiCall("/api/manager/properties/{id}", INCLUDES["properties"],
+                         projections=PROJECTIONS["properties"])],
+        "cache_ttl": 300,
+        "kb": {"sections": ("Properties", "Leases/Lease Details"), "training": ("General", "Leases"),
+               "terms": "property unit address appliances association listing marketing market rent reserve management fee"},
     },
 
     # Screening
     {
-        "pattern": re.compile(r"^/screening/applications/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/screening/applications/{_id}",
-        "includes": INCLUDES["screening_applications"],
+        "template": "/screening/applications/{id}",
+        "calls": [ApiCall("/api/manager/screening/applications/{id}", INCLUDES["screening_applications"],
+                         projections=PROJECTIONS["screening_applications"])],
+        "kb": {"sections": ("Screening",), "training": ("Screening",),
+               "terms": "application applicant screening report credit criminal eviction approve deny cosigner animal"},
     },
     {
-        "pattern": re.compile(r"^/screening/prospects/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/screening/prospects/{_id}",
-        "includes": INCLUDES["screening_prospects"],
+        "template": "/screening/prospects/{id}",
+        "calls": [ApiCall("/api/manager/screening/prospects/{id}", INCLUDES["screening_prospects"])],
+        "kb": {"sections": ("Screening/Applications & Screening", "Contacts"), "training": ("Screening", "Contacts"),
+               "terms": "prospect invitation invite apply contact unit showing"},
     },
     {
-        "pattern": re.compile(r"^/screening/payments/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/screening/payments/{_id}",
-        "includes": INCLUDES["screening_payments"],
+        "template": "/screening/payments/{id}",
+        "calls": [ApiCall("/api/manager/screening/payments/{id}", INCLUDES["screening_payments"])],
+        "kb": {"sections": ("Screening/Application Payments", "Accounting/Money In"), "training": ("Screening",),
+               "terms": "application fee payment refund applicant"},
     },
-    
-    # Portfolios (special case: requires two API calls)
+
+    # Portfolios (the ledger call depends on the ledgerID in the portfolio response and is
+    # skipped for questions that are not about money)
     {
-        "pattern": re.compile(r"^/portfolios/(?P<id>\d+)/?$"),
-        "api_path": lambda _id: f"/api/manager/portfolios/{_id}",
-        "includes": INCLUDES["portfolios"],
-        "needs_ledger": True,  # Flag to indicate this route needs a second API call
+        "template": "/portfolios/{id}",
+        "calls": [
+            ApiCall("/api/manager/portfolios/{id}", INCLUDES["portfolios"], key="portfolio",
+                    projections=PROJECTIONS["portfolios"]),
+            ApiCall("/api/manager/accounting/ledgers/{value}", INCLUDES["ledgers"], key="ledger",
+                    after="portfolio", field="ledger.ledgerID", when=("balance", "billing")),
+        ],
+        "timeout": (3.05, 30),  # large property/ledger expansions
+        "cache_ttl": 120,
+        "kb": {"sections": ("Portfolios", "Owners", "Accounting/Paying Owners", "Accounting/Management Fees"),
+               "training": ("Portfolios", "Accounting"),
+               "terms": "portfolio owner statement distribution contribution reserve ledger balance management fee"},
     },
 ]
 
-def build_api_url(webpage_url: str) -> str:
+REGISTRY = RouteRegistry(ROUTES, default_timeout=DEFAULT_TIMEOUT, default_ttl=DEFAULT_CACHE_TTL)
+
+
+def resolve_route(webpage_url: str) -> tuple:
+    """
+    Given a Rentvine webpage URL, return (base, route, params).
+
+    Raises:
+        ValueError if the URL path is unsupported.
+    """
+    parsed = urlparse(webpage_url)
+    base = f"{parsed.scheme}://{parsed.netloc}"
+    route, params = REGISTRY.resolve(parsed.path)
+    if route is None:
+        raise ValueError(f"Unsupported or unrecognized path: {parsed.path.rstrip('/')}")
+    return base, route, params
+
+
+def question_intents(question: str | None) -> frozenset:
+    """The INTENTS a question touches; empty (= fetch everything) when projection is off."""
+    if not question or not INCLUDE_PROJECTION:
+        return frozenset()
+    return _intents(question)
+
+
+@lru_cache(maxsize=1024)    # the same question is planned for the fetch and for the prompt note
+def _intents(question: str) -> frozenset:
+    return frozenset(intent for intent, pattern in _INTENT_PATTERNS.items() if pattern.search(question))
+
+
+def plan_fetch(webpage_url: str, question: str | None = None) -> tuple:
+    """
+    Resolve a page URL and narrow its fetch plan to what the question needs.
+
+    Returns:
+        (base, route, params, calls, omitted); omitted names the relations (and calls)
+        left out, which a follow-up question about them will fetch.
+    Raises:
+        ValueError if the URL path is unsupported.
+    """
+    base, route, params = resolve_route(webpage_url)
+    calls, omitted = route.project(question_intents(question))
+    return base, route, params, calls, omitted
+
+
+def call_keys(webpage_url: str) -> tuple:
+    """
+    The top-level payload keys that hold a whole call body (Route.combine on a multi-call
+    route); () for single-call and unsupported pages.
+    """
+    try:
+        route = resolve_route(webpage_url)[1]
+    except ValueError:
+        return ()
+    return tuple(c.key for c in route.calls) if len(route.calls) > 1 else ()
+
+
+def omitted_relations(webpage_url: str, question: str | None) -> list:
+    """What fetch_api_responses(webpage_url, question=question) leaves out; [] if unsupported."""
+    try:
+        return plan_fetch(webpage_url, question)[4]
+    except ValueError:
+        return []
+
+
+def project_payload(webpage_url: str, payload, question: str | None) -> tuple:
+    """
+    Narrow a payload fetched with the full plan (e.g. a prefetch) to what
+    fetch_api_data(webpage_url, question=question) would have returned.
+
+    Returns:
+        (payload, omitted); payload is the same object when nothing is omitted.
+    Raises:
+        ValueError if the URL path is unsupported.
+    """
+    base, route, params, calls, omitted = plan_fetch(webpage_url, question)
+    return route.trim(payload, omitted), omitted
+
+
+def build_api_url(webpage_url: str):
     """
     Given a Rentvine webpage URL, return the corresponding API URL(s).
     - Extracts the base (scheme+host)
-    - Matches path patterns
+    - Resolves the path against the route registry
     - Injects the object ID when present
     - Appends the correct 'includes' querystring when required
 
+    Calls that depend on another response (the portfolio's ledger) are not included.
+
     Returns:
-        List of API URL strings (Diagnostics maps to two endpoints).
+        The API URL string, or a list of them for routes with several independent calls
+        (Diagnostics maps to two endpoints).
     Raises:
-        ValueError if the URL path is unsupported or an ID is missing/invalid.
+        ValueError if the URL path is unsupported.
     """
-    print("WEB PAGE URL", webpage_url)
-
-    print("building api url")
-    parsed = urlparse(webpage_url)
-    base = f"{parsed.scheme}://{parsed.netloc}"
-    path = parsed.path.rstrip("/")
+    base, route, params = resolve_route(webpage_url)
+    urls = [c.url(base, params) for c in route.first_calls]
+    api = urls[0] if len(urls) == 1 else urls
+    log.debug("%s -> %s", webpage_url, api)
+    return api
 
-    for route in ROUTES:
-        match = route["pattern"].match(path)
-        if not match:
-            continue
 
-        # Special case: routes with multiple API paths (Diagnostics)
-        if "api_paths" in route:
-            return [base + p for p in route["api_paths"]]
+def fetch_api_data(webpage_url: str, username: str = None, password: str = None,
+                   question: str | None = None):
+    """
+    Given a Rentvine webpage URL, fetch the corresponding API response(s).
 
-        # Routes with an ID
-        _id = match.groupdict().get("id")
-        if _id is not None and not _id.isdigit():
-            raise ValueError("Found an ID segment, but it is not numeric.")
+    The route's fetch plan runs through fetchEngine's pooled session (keep-alive, retries
+    with backoff, per-route timeouts) and the response cache (per-route TTL, ETag
+    revalidation). Independent calls (Diagnostics) are fetched concurrently; dependent
+    calls (the portfolio's ledger) are issued as soon as the response they need lands.
+    With a question, only the includes (and calls) its intents need are requested; see
+    plan_fetch. Without one, or when it matches no intent, everything is fetched.
 
-        api = base + route["api_path"](_id)  # type: ignore
-        if "includes" in route and route["includes"]:
-            api += f"?includes={route['includes']}"
-        print("HERE IS THE API URL", api)
-        return api
+    Returns:
+        The decoded response (the body, or {key: body} for multi-call routes), to be
+        chunked as is rather than serialized and parsed again.
+    Raises:
+        ValueError if the URL path is unsupported or a dependent call's field is missing.
+        requests.RequestException if API calls fail.
+    """
+    with span("route"):
+        base, route, params, calls, omitted = plan_fetch(webpage_url, question)
+    log.debug("%s matched route %s; not fetching %s", webpage_url, route.name, omitted or "nothing")
+    auth = (username, password) if username and password else None
 
-    raise ValueError(f"Unsupported or unrecognized path: {path}")
+    with span("fetch"):
+        results = run_plan(
+            calls,
+            lambda call, parent: call.url(base, params, parent),
+            auth=auth, timeout=route.timeout, ttl=route.cache_ttl,
+        )
+    return route.combine(results)
 
 
-def fetch_api_responses(webpage_url: str, username: str = None, password: str = None) -> str:
+def fetch_api_responses(webpage_url: str, username: str = None, password: str = None,
+                        question: str | None = None) -> str:
     """
-    Given a Rentvine webpage URL, fetch the corresponding API response(s) and return as JSON string.
-    
-    For portfolios, this will:
-    1. Call the portfolio endpoint
-    2. Extract the ledgerID from the response
-    3. Call the ledger endpoint
-    4. Combine both responses into a single JSON string
-    
-    For other routes, it will call the single endpoint and return the response.
-    
-    Returns:
-        JSON string containing the API response(s)
+    fetch_api_data() as an indented JSON string, for printing and older callers.
+
     Raises:
-        ValueError if the URL path is unsupported or an ID is missing/invalid.
+        ValueError if the URL path is unsupported or a dependent call's field is missing.
         requests.RequestException if API calls fail.
     """
-    print("FETCHING API RESPONSES FROM API ROUTES")
-    print(f"Input webpage_url: {webpage_url}")
-    parsed = urlparse(webpage_url)
-    base = f"{parsed.scheme}://{parsed.netloc}"
-    path = parsed.path.rstrip("/")
-    print(f"Extracted path: {path}")
-    print(f"Base URL: {base}")
-
-    for route in ROUTES:
-        match = route["pattern"].match(path)
-        if not match:
-            continue
-        print(f"Matched route pattern: {route['pattern'].pattern}")
-
-        # Special case: portfolios (requires two API calls)
-        if route.get("needs_ledger"):
-            print("Processing portfolio route (needs ledger)")
-            _id = match.groupdict().get("id")
-            print(f"Portfolio ID: {_id}")
-            if _id is None or not _id.isdigit():
-                raise ValueError("Portfolio ID is missing or invalid.")
-            
-            # Build first API URL (portfolio endpoint)
-            portfolio_url = base + route["api_path"](_id)
-            if "includes" in route and route["includes"]:
-                portfolio_url += f"?includes={route['includes']}"
-            print(f"Portfolio API URL: {portfolio_url}")
-            
-            # Make first API call
-            if username and password:
-                print("Making portfolio API call with username and password")
-                portfolio_response = requests.get(portfolio_url, auth=(username, password), verify=False)
-            else:
-                portfolio_response = requests.get(portfolio_url, verify=False)
-            portfolio_response.raise_for_status()
-            portfolio_data = portfolio_response.json()
-            print("Portfolio API call successful")
-            
-            # Extract ledgerID from the response
-            ledger_id = None
-            if "ledger" in portfolio_data and isinstance(portfolio_data["ledger"], dict):
-                ledger_id = portfolio_data["ledger"].get("ledgerID")
-            print(f"Extracted ledgerID: {ledger_id}")
-            
-            if not ledger_id:
-                raise ValueError("Could not find ledgerID in portfolio response.")
-            
-            # Build second API URL (ledger endpoint)
-            ledger_url = base + f"/api/manager/accounting/ledgers/{ledger_id}"
-            if "ledgers" in INCLUDES:
-                ledger_url += f"?includes={INCLUDES['ledgers']}"
-            print(f"Ledger API URL: {ledger_url}")
-            
-            # Make second API call
-            if username and password:
-                ledger_response = requests.get(ledger_url, auth=(username, password), verify=False)
-            else:
-                ledger_response = requests.get(ledger_url, verify=False)
-            ledger_response.raise_for_status()
-            ledger_data = ledger_response.json()
-            print("Ledger API call successful")
-            
-            # Combine both responses
-            combined_data = {
-                "portfolio": portfolio_data,
-                "ledger": ledger_data
-            }
-            print("Combined portfolio and ledger data")
-            
-            return json.dumps(combined_data, indent=2)
-
-        # Special case: routes with multiple API paths (Diagnostics)
-        if "api_paths" in route:
-            responses = []
-            for api_path in route["api_paths"]:
-                api_url = base + api_path
-                if username and password:
-                    response = requests.get(api_url, auth=(username, password), verify=False)
-                else:
-                    response = requests.get(api_url, verify=False)
-                response.raise_for_status()
-                responses.append(response.json())
-            
-            # Combine multiple responses (for diagnostics)
-            if len(responses) == 1:
-                return json.dumps(responses[0], indent=2)
-            else:
-                combined = {
-                    "accounts": responses[0],
-                    "diagnostics": responses[1]
-                }
-                return json.dumps(combined, indent=2)
-
-        # Routes with an ID
-        _id = match.groupdict().get("id")
-        if _id is not None and not _id.isdigit():
-            raise ValueError("Found an ID segment, but it is not numeric.")
-
-        api_url = base + route["api_path"](_id)  # type: ignore
-        if "includes" in route and route["includes"]:
-            api_url += f"?includes={route['includes']}"
-        
-        # Make API call
-        if username and password:
-            response = requests.get(api_url, auth=(username, password), verify=False)
-        else:
-            response = requests.get(api_url, verify=False)
-        response.raise_for_status()
-        
-        return json.dumps(response.json(), indent=2)
-
-    raise ValueError(f"Unsupported or unrecognized path: {path}")
+    return dumps(fetch_api_data(webpage_url, username, password, question), pretty=True)
 
 
 if __name__ == "__main__":
@@ -272,6 +353,7 @@ if __name__ == "__main__":
         "https://abchomes.rentvinedev.com/screening/applications/1638",
         "https://abchomes.rentvinedev.com/screening/prospects/114",
         "https://abchomes.rentvinedev.com/screening/payments/1",
+        "https://abchomes.rentvinedev.com/portfolios/391",
     ]
     for e in examples:
         print(e, "=>", build_api_url(e))
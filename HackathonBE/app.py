@@ -1,22 +1,33 @@
-from flask import Flask, request, jsonify, make_response, send_from_directory
-import requests
+from flask import Flask, Response, g, request, jsonify, make_response, send_from_directory, stream_with_context
 import json
 from urllib.parse import urlparse
 from flask_cors import CORS
-from dotenv import load_dotenv, set_key
+from dotenv import set_key
 import os
 from werkzeug.serving import make_server
 import threading
+import envConfig  # noqa: F401  (loads .env before the imports below read their tunables)
 from promptParsing import chunk_for_lm_studio
-from apiRoutes import fetch_api_responses
-
-# Load .env vars
-load_dotenv()
+from apiRoutes import call_keys, fetch_api_data, omitted_relations
+from kbIndex import search_kb
+from kbEmbeddings import search_semantic
+from pageContext import page_material
+from responseCache import cache_stats
+from llmScheduler import Saturated, client_id, get_scheduler, scheduler_stats
+from contextPacker import CONTEXT_ENCODING, pack_context
+from promptPrefix import affinity_options, observe_prefix, session_key
+from prefetch import get_prefetcher, prefetch_stats
+from chatSessions import chat_session_stats, conversation_id, get_chat_sessions, question_message
+from answerCache import answer_cache_stats, get_answer_cache, payload_fingerprint
+from batchQuery import BATCH_MAX_ITEMS, batch_stats, get_batch_runner, request_items
+from telemetry import add_gauge_source, get_logger, render_metrics, span, start_trace
 
 username = os.getenv("API_USERNAME")
 password = os.getenv("API_PASSWORD")
 base_url = os.getenv("API_URL")
 
+log = get_logger("app")
+
 # Frontend origins allowed to call your API
 ALLOWED_ORIGINS = {"https://abchomes.rentvinedev.com"}
 FRONTEND_BUILD_DIR = os.path.join(os.path.dirname(__file__), "..", "hackathonfe", "dist")
@@ -31,23 +42,256 @@ CORS(
     app,
     resources={r"/api/*": {"origins": list(ALLOWED_ORIGINS)}},
     methods=["POST", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "X-Session-Id", "X-User-Id"],
+    expose_headers=["Retry-After"],
 )
 
+def cors_headers(origin: str | None) -> dict:
+    # Echo back only allowed origins (shared with the ASGI app in asgiApp.py)
+    if origin not in ALLOWED_ORIGINS:
+        return {}
+    return {
+        "Access-Control-Allow-Origin": origin,
+        "Vary": "Origin",
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Session-Id, X-User-Id",
+        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+        "Access-Control-Expose-Headers": "Retry-After",
+    }
+
 @app.after_request
 def add_cors_headers(response):
     """
     Ensure CORS headers are present on every response (including errors),
     and echo back only allowed origins.
     """
-    origin = request.headers.get("Origin")
-    if origin in ALLOWED_ORIGINS:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Vary"] = "Origin"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers.update(cors_headers(request.headers.get("Origin")))
+    return response
+
+# Endpoints whose pipeline stages are timed (see telemetry.py)
+TRACED_ENDPOINTS = {"query", "query_stream"}
+
+@app.before_request
+def begin_trace():
+    if request.method == "POST" and request.endpoint in TRACED_ENDPOINTS:
+        g.trace = start_trace(request.endpoint)
+
+@app.after_request
+def end_trace(response):
+    # Streamed responses are closed by stream_events once the last byte is sent
+    trace = g.pop("trace", None)
+    if trace is not None:
+        trace.finish(response.status_code, response.calculate_content_length(), "json")
     return response
 
+# Identical on every request so it always heads the prompt-cache prefix
+SYSTEM_PROMPT = (
+    "You are a helpful customer support assistant. The following messages contain the "
+    "conversation so far with the Rentvine context for this page as [PART] messages (an "
+    "[UPDATED PART] supersedes earlier parts with the same path), then related help material; "
+    "the customer's question comes last."
+)
+
+def fetch_page_data(data: dict):
+    # Rentvine API call - fetch_api_data handles the API call(s) and returns the decoded body;
+    # only the includes the question needs are requested (apiRoutes.plan_fetch)
+    url = (data.get("url")).strip()
+    return fetch_api_data(url, username=username, password=password, question=data.get("question"))
+
+
+def chunk_page_data(api_data) -> list:
+    # api_data is the decoded body (or its JSON text); envelopes are only indented when the
+    # prompt will show them indented, so the packer parses the smaller compact form.
+    # No overlap: every envelope carries its own path, and the packer needs valid JSON
+    return chunk_for_lm_studio(api_data, max_tokens=2000, reserve_tokens=600, overlap_tokens=0,
+                               pretty_json=CONTEXT_ENCODING == "pretty")
+
+
+def prefetch_page_data(url: str):
+    # Warm start (see prefetch.py): the full plan, so a prefetch can serve any question on the page
+    return fetch_api_data(url, username=username, password=password)
+
+
+def load_page_context(data: dict):
+    """
+    The page's decoded Rentvine payload, from a prefetch when one is ready or in flight.
+
+    Returns:
+        (api_data, parts); parts are None when the caller still has to chunk.
+    """
+    prefetcher = get_prefetcher(prefetch_page_data, chunk_page_data)
+    if prefetcher is not None:
+        ready = prefetcher.take((data.get("url") or "").strip(), data.get("question"))
+        if ready is not None:
+            return ready
+    return fetch_page_data(data), None
+
+
+def build_messages(data: dict, question: str, session: str = "", api_data=None,
+                   parts: list | None = None, conversation: str = ""):
+    """
+    Fetch the page's Rentvine context (unless api_data is given), chunk it (unless parts
+    are given) and assemble the chat messages for LM Studio with related KB material.
+
+    Messages run from most to least stable so the server can reuse its KV cache across
+    turns: the fixed system prompt, the conversation's transcript (see chatSessions),
+    the entity parts it has not seen yet ordered by sha256, the KB and training notes
+    (the page type's precomputed set, else the question's search results), a note on
+    relations not fetched for this question and finally the question itself. Without a
+    conversation id every turn sends all parts plus the client's history blob.
+
+    Returns:
+        (messages, sources, context_stats, turn); context_stats includes prompt_tokens,
+        the prefill_tokens_saved against the session's previous turn and how many parts
+        were sent or reused; turn.commit(answer) adds the turn to the conversation.
+    """
+    if parts is None:
+        if api_data is None:
+            api_data = fetch_page_data(data)
+        parts = chunk_page_data(api_data)
+    # keep only the envelopes most relevant to the question, within a fixed token budget
+    with span("pack"):
+        packed = pack_context(parts, question, roots=call_keys((data.get("url") or "").strip()))
+    parts = packed.pop("parts")
+    log.debug("Context packed: %s", packed)
+    # The page type's precomputed KB articles and training topics (see pageContext.py)
+    material = page_material((data.get("url") or "").strip())
+    if material is not None:
+        kb_hits, topic_hits = material
+    else:
+        with span("kb_search"):
+            # Related help-center articles from the prebuilt BM25 index (see kbIndex.py)
+            kb_hits = search_kb(question, k=3)
+            # Semantic stage: TrainingData topics the keyword index cannot see
+            topic_hits = search_semantic(question, k=2, source="training")
+    log.debug("KB articles found: %d, training topics found: %d", len(kb_hits), len(topic_hits))
+    turn = get_chat_sessions().begin(conversation, parts, question, data.get("history") or "")
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, *turn.history, *turn.context]
+    if kb_hits:
+        kb_context = "\n\n".join(f"{h['title']} ({h['url']})\n{h['snippet']}" for h in kb_hits)
+        messages.append({
+            "role": "user",
+            "content": f"Related Rentvine knowledge base articles:\n{kb_context}"
+        })
+    if topic_hits:
+        topic_context = "\n\n".join(f"{h['title']}\n{h['snippet']}" for h in topic_hits)
+        messages.append({
+            "role": "user",
+            "content": f"Related Rentvine training notes:\n{topic_context}"
+        })
+    # relations trimmed from the fetch for this question; asking about them fetches them
+    omitted = omitted_relations((data.get("url") or "").strip(), question)
+    if omitted:
+        messages.append({
+            "role": "user",
+            "content": f"Not loaded for this question: {', '.join(omitted)}. If the answer depends on "
+                       "them, say that the customer can ask about them directly."
+        })
+    messages.append(question_message(question))
+    packed["omitted_relations"] = omitted
+    packed.update(turn.stats)
+    packed.update(observe_prefix(session, messages))
+    log.debug("Prefill: %d prompt tokens, %d reusable; parts sent %d, reused %d",
+              packed["prompt_tokens"], packed["prefill_tokens_saved"], packed["parts_sent"], packed["parts_reused"])
+
+    sources = [{"title": h["title"], "url": h["url"], "snippet": h["snippet"]} for h in kb_hits]
+    return messages, sources, packed, turn
+
+
+def format_sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def schedule(messages: list, data: dict, options: dict):
+    # Raises Saturated (-> 429) when every LLM slot is busy and the queue is full
+    return get_scheduler().request(messages, client_id(data, request.headers, request.remote_addr), **options)
+
+
+def saturated_response(e: Saturated):
+    return jsonify({
+        "error": str(e),
+        "queue_position": e.position,
+        "retry_after": e.retry_after,
+    }), 429, {"Retry-After": str(e.retry_after)}
+
+
+def stream_answer(call, sources: list, context_stats: dict, on_complete=None):
+    """
+    Relay the scheduled LLM call's streamed deltas to the client as Server-Sent Events:
+    a "queued" event with {"position": n} while waiting for a slot, "delta" events with
+    {"content": ...}, and a final "done" event with sources and usage.
+    Each delta is forwarded as soon as it arrives; when the answer finished normally,
+    on_complete(answer) is called with the full text (for the answer cache).
+    """
+    pieces = []
+    try:
+        position = call.position
+        if position:
+            yield format_sse("queued", {"position": position})
+        for kind, value in call.stream():
+            if kind == "delta":
+                pieces.append(value)
+                yield format_sse("delta", {"content": value})
+            else:
+                yield format_sse("done", {"sources": sources, "context": context_stats, **value})
+                if on_complete and pieces and value.get("finish_reason") in (None, "stop"):
+                    on_complete("".join(pieces))
+    except Saturated as e:
+        yield format_sse("error", {"error": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        yield format_sse("error", {"error": str(e)})
+    finally:
+        call.close()    # the client left before the first delta: give back the queue place or slot
+
+
+def answer_fingerprint(api_data, data: dict, conversation: str) -> str:
+    """The answer cache key: the page payload plus the stored transcript, else the client's history."""
+    history = get_chat_sessions().transcript_key(conversation) or data.get("history")
+    return payload_fingerprint(api_data, history)
+
+
+def lookup_answer(question: str, fingerprint: str, conversation: str = ""):
+    # Same question (or a near-identical one) about the same entity snapshot and conversation: skip the LLM
+    cache = get_answer_cache()
+    if cache is None:
+        return None
+    with span("answer_cache"):
+        hit = cache.lookup(question, fingerprint)
+    if hit:
+        log.debug("Answer cache %s hit (similarity %s)", hit["match"], hit["similarity"])
+        # the conversation moves on as if the model had answered
+        get_chat_sessions().answered(conversation, question, hit["answer"])
+    return hit
+
+
+def store_answer(question: str, fingerprint: str, sources: list, turn=None):
+    """Callback for a finished answer: the answer cache and, with a conversation, its transcript."""
+    cache = get_answer_cache()
+    if cache is None and turn is None:
+        return None
+
+    def remember(answer: str):
+        if cache is not None:
+            cache.store(question, fingerprint, answer, sources)
+        if turn is not None:
+            turn.commit(answer)
+    return remember
+
+
+def cached_response(hit: dict):
+    cached = {k: hit[k] for k in ("match", "similarity", "age")}
+    if wants_event_stream() or request.path.endswith("/stream"):
+        def events():
+            yield format_sse("delta", {"content": hit["answer"]})
+            yield format_sse("done", {"sources": hit["sources"], "context": {}, "usage": None,
+                                      "finish_reason": "stop", "cached": cached})
+        return stream_events(events())
+    return jsonify({"answer": hit["answer"], "sources": hit["sources"], "context": {}, "cached": cached})
+
+
+def wants_event_stream() -> bool:
+    return "text/event-stream" in (request.headers.get("Accept") or "")
+
+
 @app.route("/api/query", methods=["POST", "OPTIONS"])
 def query():
     # Handle preflight quickly
@@ -56,78 +300,190 @@ def query():
         return ("", 204)
 
     try:
-        print("Getting AI response")
-
         data = request.get_json(silent=True) or {}
-        print(data)
+        log.debug("Query: %s", data)
 
         question = (data.get("question") or "").strip()
         if not question:
             return jsonify({"error": "Missing question"}), 400
 
-        # Rentvine API call - fetch_api_responses handles the API call(s) and returns JSON string
-        print("stripping url")
-        url = (data.get("url")).strip()
-        print("url stripped")
-        print("fetching api data")
-        api_data = fetch_api_responses(url, username=username, password=password)
-        print("api data fetched")
-        #chuncks API data
-        parts = chunk_for_lm_studio(api_data, max_tokens=2000, reserve_tokens=600, overlap_tokens=64)
-        print("API Response chunked")
-        messages = [
-                    {"role": "system", "content": f"You are a helpful customer support assistant. Here is the customers question: {question}. You will receive the context for this prompt in the following messages."},
-                ]
-        print("Messages initialized")
-        cnt = 0
-        for p in parts:
-            cnt = cnt + 1
-            messages.append({
-                "role": "user",
-                "content": f"[PART {p['index']+1}/{p['total']}] SHA256={p['sha256']}\n{p['content']}"
-            })
-        print("Messages added")
-        print("parts: ", parts)
-        messages.append({
-            "role": "user",
-            "content": f"Here is the chat history: {data.get("history")}"
-            })
-        print("history added")
-
-        """
-        Please note that this will be refactored to use the lmstudio client instead of the requests library. This is a temporary solution to get the project running, as we were toying with different LLM platforms and API's
-        """
-
-        lm_studio_url = "http://localhost:1234/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer lm-studio"
-        }
-        payload = {
-            "model": "openai/gpt-oss-20b",
-            "messages": messages,
-            "temperature": 0.5
-        }
-        print("sending request")
-        lm_response = requests.post(lm_studio_url, headers=headers, json=payload)
-        print("count: ", cnt)
-        print("awaiting status and response")
-        lm_response.raise_for_status()
-        lm_data = lm_response.json()
-
-        reply = lm_data["choices"][0]["message"]["content"]
-        print(reply)
+        api_data, parts = load_page_context(data)
+        conversation = conversation_id(data, request.headers)
+        fingerprint = answer_fingerprint(api_data, data, conversation)
+        hit = lookup_answer(question, fingerprint, conversation)
+        if hit:
+            return cached_response(hit)
+
+        session = session_key(data, request.headers)
+        if parts is None:
+            with span("chunk"):
+                parts = chunk_page_data(api_data)
+        with span("build"):
+            messages, sources, context_stats, turn = build_messages(
+                data, question, session, api_data, parts, conversation)
+        call = schedule(messages, data, affinity_options(session))
+        remember = store_answer(question, fingerprint, sources, turn)
+
+        if wants_event_stream():
+            return stream_response(call, sources, context_stats, remember)
+
+        lm_data = call.result()
+        reply = lm_data["content"]
+        log.debug("Answer: %s", reply)
+        if remember and reply:
+            remember(reply)
 
         return jsonify({
             "answer": reply,
-            "sources": [{"title": "N/A", "url": "#"}]
+            "sources": sources,
+            "context": context_stats
         })
 
+    except Saturated as e:
+        return saturated_response(e)
     except Exception as e:
+        log.warning("Query failed: %s", e)
         # Headers will still be added by @after_request
         return jsonify({"error": str(e)}), 500
 
 
+def stream_events(events):
+    # The request's trace is finished here, after the last event, rather than in end_trace
+    trace = g.pop("trace", None)
+    return Response(
+        stream_with_context(measured_stream(events, trace)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def measured_stream(events, trace):
+    size = 0
+    try:
+        for event in events:
+            size += len(event.encode("utf-8"))
+            yield event
+    finally:
+        if trace is not None:
+            trace.finish(200, size, "stream")
+
+
+def stream_response(call, sources: list, context_stats: dict, on_complete=None):
+    return stream_events(stream_answer(call, sources, context_stats, on_complete))
+
+
+@app.route("/api/query/stream", methods=["POST", "OPTIONS"])
+def query_stream():
+    """Same request body as /api/query; always answers with an SSE stream."""
+    if request.method == "OPTIONS":
+        return ("", 204)
+
+    try:
+        data = request.get_json(silent=True) or {}
+        question = (data.get("question") or "").strip()
+        if not question:
+            return jsonify({"error": "Missing question"}), 400
+
+        api_data, parts = load_page_context(data)
+        conversation = conversation_id(data, request.headers)
+        fingerprint = answer_fingerprint(api_data, data, conversation)
+        hit = lookup_answer(question, fingerprint, conversation)
+        if hit:
+            return cached_response(hit)
+
+        session = session_key(data, request.headers)
+        if parts is None:
+            with span("chunk"):
+                parts = chunk_page_data(api_data)
+        with span("build"):
+            messages, sources, context_stats, turn = build_messages(
+                data, question, session, api_data, parts, conversation)
+        call = schedule(messages, data, affinity_options(session))
+        return stream_response(call, sources, context_stats, store_answer(question, fingerprint, sources, turn))
+
+    except Saturated as e:
+        return saturated_response(e)
+    except Exception as e:
+        log.warning("Query failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/prefetch", methods=["POST", "OPTIONS"])
+def prefetch():
+    """
+    Warm start: fetch and chunk the page's Rentvine context in the background so the
+    next /api/query for it does not wait on Rentvine. Body: {"url": ..., "user": ...};
+    a user's newer prefetch cancels their older one.
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+
+    data = request.get_json(silent=True) or {}
+    url = (data.get("url") or "").strip()
+    if not url:
+        return jsonify({"error": "Missing url"}), 400
+    prefetcher = get_prefetcher(prefetch_page_data, chunk_page_data)
+    if prefetcher is None:
+        return jsonify({"status": "disabled"})
+    try:
+        status = prefetcher.start(url, client_id(data, request.headers, request.remote_addr))
+    except ValueError as e:
+        return jsonify({"status": "unsupported", "error": str(e)}), 400
+    return jsonify({"status": status}), 200 if status == "ready" else 202
+
+
+@app.route("/api/batch", methods=["POST", "OPTIONS"])
+def batch():
+    """
+    Bulk questions (see batchQuery.py). Body: {"items": [{"url", "question", "id"}, ...]}
+    or the items as JSON Lines; one JSON line per item streams back as it is answered.
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+
+    items = request_items(request.get_data(as_text=True) or "")
+    if not items:
+        return jsonify({"error": "Missing items"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 413
+    runner = get_batch_runner(fetch_page_data, chunk_page_data, build_messages)
+    lines = (json.dumps(result, ensure_ascii=False) + "\n" for result in runner.run(items))
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+@app.route("/api/cache-stats", methods=["GET"])
+def fetch_cache_stats():
+    # Hit/miss/eviction counters for the Rentvine response cache (per worker)
+    return jsonify(cache_stats())
+
+
+@app.route("/api/answer-cache-stats", methods=["GET"])
+def fetch_answer_cache_stats():
+    # Exact/semantic hit, miss, store and eviction counters for the answer cache (per worker)
+    return jsonify(answer_cache_stats())
+
+
+@app.route("/api/llm-stats", methods=["GET"])
+def fetch_llm_stats():
+    # Queue length, in-flight calls per backend, coalesced / rejected counters (per worker)
+    return jsonify(scheduler_stats())
+
+
+# Cache and scheduler counters are exported next to the stage histograms
+add_gauge_source("fetch_cache", cache_stats)
+add_gauge_source("answer_cache", answer_cache_stats)
+add_gauge_source("llm", scheduler_stats)
+add_gauge_source("chat_sessions", chat_session_stats)
+add_gauge_source("prefetch", prefetch_stats)
+add_gauge_source("batch", batch_stats)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus scrape endpoint: stage / fetch / LLM / response-size histograms (per worker)
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
 # Serve react's static pages from the backend. Not using for demo 
 """
 @app.route("/", defaults={"path": ""})
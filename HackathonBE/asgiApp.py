@@ -0,0 +1,298 @@
+"""
+ASGI entry point: the same /api/query contract as app.py, served by Quart so a slow
+Rentvine fetch or LLM generation waits on the event loop instead of pinning a thread.
+
+    hypercorn asgiApp:app --bind 127.0.0.1:5000
+    python asgiApp.py                               # same, on port 5000
+
+Blocking fetches run on a bounded thread pool, chunking of large payloads on a process
+pool, and generations go through the same llmScheduler as app.py; requests waiting for
+an LLM slot do so without holding a worker.
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from quart import Quart, Response, g, request, jsonify
+
+import envConfig  # noqa: F401
+from app import (
+    ALLOWED_ORIGINS, TRACED_ENDPOINTS, answer_fingerprint, format_sse, build_messages, chunk_page_data,
+    cors_headers, fetch_page_data, load_page_context, lookup_answer, prefetch_page_data, store_answer,
+)
+from answerCache import answer_cache_stats
+from batchQuery import BATCH_MAX_ITEMS, get_batch_runner, request_items
+from chatSessions import conversation_id
+from jsonCodec import dumps
+from llmScheduler import Saturated, client_id, get_scheduler, scheduler_stats
+from prefetch import get_prefetcher
+from promptPrefix import affinity_options, session_key
+from responseCache import cache_stats
+from telemetry import render_metrics, span, start_trace
+
+# Tunables (override in .env)
+IO_WORKERS = int(os.getenv("ASGI_IO_WORKERS", "64"))                 # threads for Rentvine fetches, KB lookups
+CHUNK_WORKERS = int(os.getenv("ASGI_CHUNK_WORKERS", str(os.cpu_count() or 1)))
+CHUNK_INLINE_BYTES = 64 * 1024    # smaller payloads are chunked on a thread; shipping them to a process costs more
+
+app = Quart(__name__)
+app.config["RESPONSE_TIMEOUT"] = None    # generations can outlive Quart's 60s default
+
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="asgi-io")
+_chunk_executor = None
+
+
+def _get_chunk_executor():
+    global _chunk_executor
+    if _chunk_executor is None and CHUNK_WORKERS > 0:
+        # never fork: the pool starts on first use, while I/O threads may hold locks
+        # (logging, the fetch cache) that a forked child would inherit held forever
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _chunk_executor = ProcessPoolExecutor(max_workers=CHUNK_WORKERS,
+                                              mp_context=multiprocessing.get_context(method))
+    return _chunk_executor
+
+
+async def run_io(fn, *args):
+    # run in a copy of the request's context so spans inside fn join its trace
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_io_executor, ctx.run, partial(fn, *args))
+
+
+async def chunk_async(api_data, raw: str) -> list:
+    """
+    CPU-bound chunking off the event loop: a process for big payloads, a thread otherwise.
+    api_data is the decoded body and raw its compact JSON text; a process is sent the
+    text, which is cheaper to ship than pickling the decoded tree.
+    """
+    executor = _get_chunk_executor()
+    if executor is None or len(raw) < CHUNK_INLINE_BYTES:
+        executor, payload = _io_executor, api_data
+    else:
+        payload = raw
+    with span("chunk"):
+        return await asyncio.get_running_loop().run_in_executor(executor, chunk_page_data, payload)
+
+
+@app.after_request
+async def add_cors_headers(response):
+    # Same policy as app.add_cors_headers: only allowed origins are echoed back
+    response.headers.update(cors_headers(request.headers.get("Origin")))
+    return response
+
+
+@app.before_request
+async def begin_trace():
+    if request.method == "POST" and request.endpoint in TRACED_ENDPOINTS:
+        g.trace = start_trace(request.endpoint)
+
+
+@app.after_request
+async def end_trace(response):
+    # Streams are closed by _event_stream after their last event
+    trace = g.pop("trace", None)
+    if trace is not None:
+        trace.finish(response.status_code, response.content_length, "json")
+    return response
+
+
+async def prepare(data: dict, question: str):
+    """
+    Fetch, check the answer cache, chunk and build messages, all as awaitables.
+
+    Returns:
+        (hit, None) for a cached answer, else (None, (call, sources, context_stats,
+        on_complete)) with call already admitted by the LLM scheduler.
+    """
+    api_data, parts = await run_io(load_page_context, data)
+    raw = dumps(api_data)
+    conversation = conversation_id(data, request.headers)
+    fingerprint = answer_fingerprint(raw, data, conversation)
+    hit = await run_io(lookup_answer, question, fingerprint, conversation)
+    if hit:
+        return hit, None
+    session = session_key(data, request.headers)
+    if parts is None:
+        parts = await chunk_async(api_data, raw)
+    with span("build"):
+        messages, sources, context_stats, turn = await run_io(
+            build_messages, data, question, session, api_data, parts, conversation)
+    call = get_scheduler().request(messages, client_id(data, request.headers, request.remote_addr),
+                                   **affinity_options(session))
+    return None, (call, sources, context_stats, store_answer(question, fingerprint, sources, turn))
+
+
+async def stream_answer(call, sources: list, context_stats: dict, on_complete=None):
+    """Async twin of app.stream_answer; the LLM slot is held until the stream ends."""
+    pieces = []
+    try:
+        position = call.position
+        if position:
+            yield format_sse("queued", {"position": position})
+        async for kind, value in call.astream():
+            if kind == "delta":
+                pieces.append(value)
+                yield format_sse("delta", {"content": value})
+            else:
+                yield format_sse("done", {"sources": sources, "context": context_stats, **value})
+                if on_complete and pieces and value.get("finish_reason") in (None, "stop"):
+                    await run_io(on_complete, "".join(pieces))
+    except Saturated as e:
+        yield format_sse("error", {"error": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        yield format_sse("error", {"error": str(e)})
+    finally:
+        call.close()
+
+
+def _event_stream(events):
+    return _measured(events, g.pop("trace", None)), 200, {
+        "Content-Type": "text/event-stream", "Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+    }
+
+
+async def _measured(events, trace):
+    size = 0
+    try:
+        async for event in events:
+            size += len(event.encode("utf-8"))
+            yield event
+    finally:
+        if trace is not None:
+            trace.finish(200, size, "stream")
+
+
+def _cached_response(hit: dict, stream: bool):
+    cached = {k: hit[k] for k in ("match", "similarity", "age")}
+    if not stream:
+        return jsonify({"answer": hit["answer"], "sources": hit["sources"], "context": {}, "cached": cached})
+
+    async def events():
+        yield format_sse("delta", {"content": hit["answer"]})
+        yield format_sse("done", {"sources": hit["sources"], "context": {}, "usage": None,
+                                  "finish_reason": "stop", "cached": cached})
+    return _event_stream(events())
+
+
+def _saturated_response(e: Saturated):
+    return (jsonify({"error": str(e), "queue_position": e.position, "retry_after": e.retry_after}),
+            429, {"Retry-After": str(e.retry_after)})
+
+
+async def _answer(stream: bool):
+    data = await request.get_json(silent=True) or {}
+    question = (data.get("question") or "").strip()
+    if not question:
+        return jsonify({"error": "Missing question"}), 400
+
+    hit, prepared = await prepare(data, question)
+    if hit:
+        return _cached_response(hit, stream)
+    call, sources, context_stats, on_complete = prepared
+
+    if stream:
+        return _event_stream(stream_answer(call, sources, context_stats, on_complete))
+
+    lm_data = await call.aresult()
+    reply = lm_data["content"]
+    if on_complete and reply:
+        await run_io(on_complete, reply)
+    return jsonify({"answer": reply, "sources": sources, "context": context_stats})
+
+
+@app.route("/api/query", methods=["POST", "OPTIONS"])
+async def query():
+    if request.method == "OPTIONS":
+        return "", 204
+    try:
+        return await _answer("text/event-stream" in (request.headers.get("Accept") or ""))
+    except Saturated as e:
+        return _saturated_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/query/stream", methods=["POST", "OPTIONS"])
+async def query_stream():
+    """Same request body as /api/query; always answers with an SSE stream."""
+    if request.method == "OPTIONS":
+        return "", 204
+    try:
+        return await _answer(True)
+    except Saturated as e:
+        return _saturated_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/prefetch", methods=["POST", "OPTIONS"])
+async def prefetch():
+    """Same contract as app.prefetch; start() only queues the work, so it runs inline."""
+    if request.method == "OPTIONS":
+        return "", 204
+    data = await request.get_json(silent=True) or {}
+    url = (data.get("url") or "").strip()
+    if not url:
+        return jsonify({"error": "Missing url"}), 400
+    prefetcher = get_prefetcher(prefetch_page_data, chunk_page_data)
+    if prefetcher is None:
+        return jsonify({"status": "disabled"})
+    try:
+        status = prefetcher.start(url, client_id(data, request.headers, request.remote_addr))
+    except ValueError as e:
+        return jsonify({"status": "unsupported", "error": str(e)}), 400
+    return jsonify({"status": status}), 200 if status == "ready" else 202
+
+
+@app.route("/api/batch", methods=["POST", "OPTIONS"])
+async def batch():
+    """Same contract as app.batch; the runner's threads do the work, results are awaited off the loop."""
+    if request.method == "OPTIONS":
+        return "", 204
+    items = request_items(await request.get_data(as_text=True) or "")
+    if not items:
+        return jsonify({"error": "Missing items"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 413
+    results = get_batch_runner(fetch_page_data, chunk_page_data, build_messages).run(items)
+
+    async def lines():
+        try:
+            for _ in range(len(items)):
+                yield dumps(await run_io(next, results)) + "\n"
+        finally:
+            await run_io(results.close)
+    return lines(), 200, {"Content-Type": "application/x-ndjson"}
+
+
+@app.route("/api/cache-stats", methods=["GET"])
+async def fetch_cache_stats():
+    return jsonify(cache_stats())
+
+
+@app.route("/api/answer-cache-stats", methods=["GET"])
+async def fetch_answer_cache_stats():
+    return jsonify(answer_cache_stats())
+
+
+@app.route("/api/llm-stats", methods=["GET"])
+async def fetch_llm_stats():
+    return jsonify(scheduler_stats())
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [os.getenv("ASGI_BIND", "127.0.0.1:5000")]
+    print(f"ASGI server running on http://{config.bind[0]} (origins: {', '.join(sorted(ALLOWED_ORIGINS))})")
+    asyncio.run(serve(app, config))
@@ -0,0 +1,272 @@
+"""
+Bulk questions (overnight triage of work orders, screening applications): many
+(url, question) items answered as one job, results streamed back as JSON Lines.
+
+    python batchQuery.py items.jsonl > results.jsonl
+    python batchQuery.py items.jsonl --out=results.jsonl --concurrency=4
+
+Each input line is {"url": ..., "question": ..., "id": optional}. The pipeline:
+
+- Fetches are deduplicated through the route table: items on the same page (as
+  prefetch.page_key sees it) share one fetch. When their questions project to the same
+  plan it is fetched as planned, otherwise the full plan once, narrowed per item
+  (apiRoutes.project_payload).
+- Pages are fetched on a pool of BATCH_FETCH_WORKERS threads.
+- Each distinct payload is chunked once, on a process pool when it is large.
+- Items go to the LLM scheduler at PRIORITY_BACKGROUND, at most BATCH_LLM_CONCURRENCY at
+  a time, so interactive chats keep their place in the queue; a full queue is waited
+  out (Retry-After) up to BATCH_LLM_RETRIES times.
+
+Every item yields exactly one line, in completion order: {"index", "id", "answer",
+"sources", "usage"} or {"index", "id", "error"}; a failed item never stops the rest.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import envConfig  # noqa: F401
+from apiRoutes import plan_fetch, project_payload
+from jsonCodec import dumps
+from llmScheduler import PRIORITY_BACKGROUND, Saturated, get_scheduler
+from prefetch import page_key
+from telemetry import get_logger
+
+log = get_logger("batchQuery")
+
+# Tunables (override in .env)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))            # per request to /api/batch
+BATCH_FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", "8"))        # pages fetched at once
+BATCH_CHUNK_WORKERS = int(os.getenv("BATCH_CHUNK_WORKERS", str(os.cpu_count() or 1)))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))    # items generating (or queued) at once
+BATCH_LLM_RETRIES = int(os.getenv("BATCH_LLM_RETRIES", "5"))
+CHUNK_INLINE_BYTES = 64 * 1024    # smaller payloads are chunked on the fetch thread (as in asgiApp)
+BATCH_CLIENT = "batch"            # scheduler client id shared by every batch item
+
+
+class _Page:
+    """The items of one page and the payloads (one per projection) they are answered from."""
+    __slots__ = ("url", "items", "plans")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.items = []      # (index, item, omitted)
+        self.plans = set()   # distinct omitted tuples
+
+
+class BatchRunner:
+    """
+    fetch(data) returns a page's decoded payload for {"url", "question"} (no question =
+    full plan), chunk(payload) its parts, and build(data, question, session, api_data,
+    parts, conversation) the chat messages as app.build_messages does. chunk must accept
+    the payload either decoded or as its JSON text: large payloads go to the process
+    pool as text (see _chunk_parts), like app.chunk_page_data accepts both.
+    """
+
+    def __init__(self, fetch, chunk, build, fetch_workers: int = BATCH_FETCH_WORKERS,
+                 chunk_workers: int = BATCH_CHUNK_WORKERS, concurrency: int = BATCH_LLM_CONCURRENCY):
+        self._fetch = fetch
+        self._chunk = chunk
+        self._build = build
+        self._fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="batch-fetch")
+        self._llm_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-llm")
+        self._chunk_workers = chunk_workers
+        self._chunk_executor = None
+        self._lock = threading.Lock()
+        self._counters = {"batches": 0, "items": 0, "answered": 0, "errors": 0, "pages": 0,
+                          "fetches_saved": 0, "payloads": 0, "retries": 0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, n in deltas.items():
+                self._counters[name] += n
+
+    def _get_chunk_executor(self):
+        if self._chunk_executor is None and self._chunk_workers > 0:
+            with self._lock:
+                if self._chunk_executor is None:
+                    # never fork: fetch threads may hold locks a forked child would inherit held
+                    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    self._chunk_executor = ProcessPoolExecutor(max_workers=self._chunk_workers,
+                                                               mp_context=multiprocessing.get_context(method))
+        return self._chunk_executor
+
+    def _chunk_parts(self, payload) -> list:
+        raw = dumps(payload)
+        executor = self._get_chunk_executor() if len(raw) >= CHUNK_INLINE_BYTES else None
+        if executor is None:
+            return self._chunk(payload)
+        return executor.submit(self._chunk, raw).result()   # the text ships cheaper than the tree
+
+    def _load_page(self, page: _Page) -> dict:
+        """Fetch a page once; {omitted: (payload, parts)} for every projection its items need."""
+        if len(page.plans) == 1:
+            _, item, _ = page.items[0]
+            payload = self._fetch({"url": page.url, "question": item["question"]})
+            loaded = {next(iter(page.plans)): payload}
+        else:
+            full = self._fetch({"url": page.url})
+            loaded = {omitted: project_payload(page.url, full, question)[0]
+                      for omitted, question in {o: i["question"] for _, i, o in page.items}.items()}
+        self._count(payloads=len(loaded))
+        return {omitted: (payload, self._chunk_parts(payload)) for omitted, payload in loaded.items()}
+
+    def _answer(self, item: dict, payload, parts: list) -> dict:
+        data = {"url": item["url"], "question": item["question"]}
+        messages, sources, _, _ = self._build(data, item["question"], "", payload, parts, "")
+        for attempt in range(BATCH_LLM_RETRIES + 1):
+            try:
+                lm_data = get_scheduler().request(messages, BATCH_CLIENT, priority=PRIORITY_BACKGROUND).result()
+                return {"answer": lm_data["content"], "sources": sources, "usage": lm_data.get("usage")}
+            except Saturated as e:
+                if attempt == BATCH_LLM_RETRIES:
+                    raise
+                self._count(retries=1)
+                time.sleep(e.retry_after)
+
+    def run(self, items: list):
+        """
+        Answer every item; yields one result dict per item as it completes (see the
+        module docstring for their shape). Closing the generator early drops the items
+        that have not reached the LLM yet.
+        """
+        results = queue.Queue()
+        pages = {}
+        stopped = threading.Event()
+        self._count(batches=1, items=len(items))
+
+        def fail(index: int, item, error):
+            self._count(errors=1)
+            results.put({"index": index, "id": item.get("id") if isinstance(item, dict) else None,
+                         "error": str(error)})
+
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                fail(index, item, "Item is not a JSON object")
+                continue
+            url, question = item.get("url"), item.get("question")
+            if not isinstance(url, str) or not isinstance(question, str) or not url.strip() or not question.strip():
+                fail(index, item, "Missing url or question")
+                continue
+            item = dict(item, url=url.strip(), question=question.strip())
+            try:
+                omitted = tuple(plan_fetch(item["url"], item["question"])[4])
+            except ValueError as e:
+                fail(index, item, e)
+                continue
+            page = pages.setdefault(page_key(item["url"]), _Page(item["url"]))
+            page.items.append((index, item, omitted))
+            page.plans.add(omitted)
+        self._count(pages=len(pages), fetches_saved=sum(len(p.items) for p in pages.values()) - len(pages))
+
+        def answer(index: int, item: dict, payload, parts: list):
+            if stopped.is_set():
+                return
+            try:
+                results.put({"index": index, "id": item.get("id"), **self._answer(item, payload, parts)})
+                self._count(answered=1)
+            except Exception as e:
+                log.warning("Batch item %d (%s) failed: %s", index, item["url"], e)
+                fail(index, item, e)
+
+        def page_loaded(page: _Page, future):
+            if stopped.is_set():
+                return
+            try:
+                loaded = future.result()
+            except Exception as e:
+                log.warning("Batch fetch of %s failed: %s", page.url, e)
+                for index, item, _ in page.items:
+                    fail(index, item, e)
+                return
+            for index, item, omitted in page.items:
+                self._llm_executor.submit(answer, index, item, *loaded[omitted])
+
+        for page in pages.values():
+            future = self._fetch_executor.submit(self._load_page, page)
+            future.add_done_callback(lambda f, page=page: page_loaded(page, f))
+
+        try:
+            for _ in range(len(items)):
+                yield results.get()
+        finally:
+            stopped.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+def read_items(lines) -> list:
+    """Items from JSON Lines (blank lines skipped); a line that is not JSON is kept as None, an error item."""
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(None)
+    return items
+
+
+def request_items(body: str) -> list:
+    """
+    The items of a /api/batch body: {"items": [...]}, a JSON array of items, or JSON Lines
+    (one item per line).
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return read_items(body.splitlines())
+    if isinstance(data, dict):
+        return data["items"] if isinstance(data.get("items"), list) else [data]
+    return data if isinstance(data, list) else [data]
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_batch_runner(fetch=None, chunk=None, build=None):
+    """Process-wide BatchRunner; the first caller supplies fetch, chunk and build."""
+    global _runner
+    if _runner is None and fetch is not None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = BatchRunner(fetch, chunk, build)
+    return _runner
+
+
+def batch_stats() -> dict:
+    return _runner.stats() if _runner is not None else {}
+
+
+if __name__ == "__main__":
+    from app import build_messages, chunk_page_data, fetch_page_data
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    if not args:
+        sys.exit("usage: python batchQuery.py items.jsonl [--out=results.jsonl] [--concurrency=N]")
+    with open(args[0], encoding="utf-8") as f:
+        batch = read_items(f)
+    runner = BatchRunner(fetch_page_data, chunk_page_data, build_messages,
+                         concurrency=int(opts.get("concurrency", BATCH_LLM_CONCURRENCY)))
+    out = open(opts["out"], "w", encoding="utf-8") if "out" in opts else sys.stdout
+    started = time.perf_counter()
+    try:
+        for result in runner.run(batch):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    stats = runner.stats()
+    print(f"{stats['answered']} answered, {stats['errors']} failed in {time.perf_counter() - started:.1f}s; "
+          f"{stats['pages']} pages fetched for {stats['items']} items", file=sys.stderr)
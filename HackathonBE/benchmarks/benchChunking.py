@@ -0,0 +1,81 @@
+"""
+Micro-benchmark chunk_for_lm_studio with the settings app.py uses, on help-center prose
+(articles from the KB export, concatenated) and on Rentvine-shaped JSON of increasing
+size. The sections_* cases chunk the same prose with sections=True, each article's
+title as its top heading.
+
+    python benchmarks/benchChunking.py
+    python benchmarks/benchChunking.py --prose-kb 10 100 --json-kb 100 1000 --check
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchUtil import add_baseline_args, finish, peak_rss_mb  # noqa: E402
+from benchPacker import rentvine_portfolio  # noqa: E402
+from htmlText import html_to_text  # noqa: E402
+from kbIndex import iter_kb_rows  # noqa: E402
+from promptParsing import chunk_for_lm_studio, get_encoder  # noqa: E402
+
+SUITE = "chunking"
+
+
+def kb_prose(target_bytes: int, heading: str = "") -> str:
+    """Help-center article bodies, in export order, until target_bytes of text; heading prefixes each title."""
+    pieces, size = [], 0
+    while size < target_bytes:
+        before = size
+        for row in iter_kb_rows():
+            text = html_to_text(row.get("Article body") or "")
+            pieces.append(f"{heading}{row.get('Article title') or ''}\n\n{text}")
+            size += len(text.encode("utf-8"))
+            if size >= target_bytes:
+                break
+        if size == before:
+            raise SystemExit("KB export has no article text to benchmark with")
+    return "\n\n".join(pieces)
+
+
+def bench(text: str, min_time: float, sections: bool = False) -> dict:
+    runs, chunks, start = 0, [], time.perf_counter()
+    while runs == 0 or time.perf_counter() - start < min_time:
+        chunks = chunk_for_lm_studio(text, max_tokens=2000, reserve_tokens=600, overlap_tokens=0, sections=sections)
+        runs += 1
+    seconds = (time.perf_counter() - start) / runs
+    mb = len(text.encode("utf-8")) / (1024 * 1024)
+    return {"seconds": seconds, "chunks": len(chunks), "mb_per_s": mb / seconds}
+
+
+def run(prose_kb: list, json_kb: list, min_time: float = 0.5) -> dict:
+    results = {}
+    for kb in prose_kb:
+        results[f"prose_{kb}kb"] = bench(kb_prose(kb * 1024), min_time)
+        results[f"sections_{kb}kb"] = bench(kb_prose(kb * 1024, heading="# "), min_time, sections=True)
+    for kb in json_kb:
+        results[f"json_{kb}kb"] = bench(json.dumps(rentvine_portfolio(kb * 1024), indent=2), min_time)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prose-kb", type=int, nargs="+", default=[10, 100, 1000], help="prose sizes in KB")
+    parser.add_argument("--json-kb", type=int, nargs="+", default=[10, 100, 1000, 5000], help="JSON sizes in KB")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to repeat each case for")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    print(f"tokenizer: {'tiktoken' if get_encoder() else 'word estimate (tiktoken not installed)'}")
+    results = run(args.prose_kb, args.json_kb, args.min_time)
+    print(f"{'case':>14} {'chunks':>8} {'ms':>10} {'MB/s':>8}")
+    for case, r in results.items():
+        print(f"{case:>14} {r['chunks']:8d} {r['seconds'] * 1000:10.2f} {r['mb_per_s']:8.2f}")
+    print(f"peak RSS: {peak_rss_mb()} MB")
+    return finish(SUITE, results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
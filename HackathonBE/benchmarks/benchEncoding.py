@@ -0,0 +1,110 @@
+"""
+Measure what the context encodings cost in tokens on the recorded Rentvine fixtures
+(work order, portfolio + ledger, accounting diagnostics), and time the payload path
+from decoded response to packed parts: the previous one (indent=2 dump, parse again,
+pretty envelopes) against passing the decoded value straight through.
+
+    python benchmarks/benchEncoding.py
+    python benchmarks/benchEncoding.py --path-kb 1000 --check
+
+Token counts use tiktoken when its encoding file is available, otherwise the
+conservative estimate from promptParsing.count_tokens; the tokenizer is printed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchUtil import add_baseline_args, finish  # noqa: E402
+from benchPacker import rentvine_portfolio  # noqa: E402
+from contextPacker import ENCODINGS, pack_context  # noqa: E402
+from fakeRentvineServer import FIXTURES_DIR  # noqa: E402
+from jsonCodec import BACKEND  # noqa: E402
+from promptParsing import chunk_for_lm_studio, get_encoder  # noqa: E402
+
+SUITE = "encoding"
+NO_BUDGET = 10 ** 9     # keep every part, so encodings are compared on the same content
+
+
+def _fixture(name: str):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sample_routes() -> dict:
+    """The decoded payload of each sample route, shaped as apiRoutes.fetch_api_data returns it."""
+    return {
+        "work_order": _fixture("workOrder.json"),
+        "portfolio": {"portfolio": _fixture("portfolio.json"), "ledger": _fixture("ledger.json")},
+        "diagnostics": {"accounts": _fixture("accounts.json"), "diagnostics": _fixture("diagnostics.json")},
+    }
+
+
+def chunk(payload, pretty: bool) -> list:
+    return chunk_for_lm_studio(payload, max_tokens=2000, reserve_tokens=600, overlap_tokens=0, pretty_json=pretty)
+
+
+def encode_tokens(payload, encoding: str) -> dict:
+    packed = pack_context(chunk(payload, encoding == "pretty"), "", token_budget=NO_BUDGET, encoding=encoding)
+    return {
+        "tokens": packed["kept_tokens"],
+        "bytes": sum(len(p["content"].encode("utf-8")) for p in packed["parts"]),
+        "parts": packed["kept_parts"],
+    }
+
+
+def legacy_path(payload) -> list:
+    text = json.dumps(payload, indent=2)
+    return pack_context(chunk(text, True), "", token_budget=NO_BUDGET, encoding="pretty")["parts"]
+
+
+def direct_path(payload) -> list:
+    return pack_context(chunk(payload, False), "", token_budget=NO_BUDGET, encoding="compact")["parts"]
+
+
+def _seconds(fn, payload, min_time: float) -> float:
+    runs, start = 0, time.perf_counter()
+    while runs == 0 or time.perf_counter() - start < min_time:
+        fn(payload)
+        runs += 1
+    return (time.perf_counter() - start) / runs
+
+
+def run(path_kb: int = 500, min_time: float = 0.5) -> dict:
+    results = {}
+    for route, payload in sample_routes().items():
+        for encoding in ENCODINGS:
+            results[f"{route}_{encoding}"] = encode_tokens(payload, encoding)
+    big = rentvine_portfolio(path_kb * 1024)
+    results[f"path_legacy_{path_kb}kb"] = {"seconds": _seconds(legacy_path, big, min_time)}
+    results[f"path_direct_{path_kb}kb"] = {"seconds": _seconds(direct_path, big, min_time)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path-kb", type=int, default=500, help="synthetic payload size for the path timing")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to repeat each timing for")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    print(f"tokenizer: {'tiktoken' if get_encoder() else 'estimate (tiktoken encoding unavailable)'}, json: {BACKEND}")
+    results = run(args.path_kb, args.min_time)
+    print(f"{'case':>22} {'tokens':>8} {'vs pretty':>10} {'bytes':>9} {'parts':>6}")
+    for case, r in results.items():
+        if "tokens" not in r:
+            continue
+        route = case.rsplit("_", 1)[0]
+        pretty = results[f"{route}_pretty"]["tokens"]
+        print(f"{case:>22} {r['tokens']:8d} {1 - r['tokens'] / pretty:9.0%} {r['bytes']:9d} {r['parts']:6d}")
+    legacy, direct = (results[f"path_{k}_{args.path_kb}kb"]["seconds"] for k in ("legacy", "direct"))
+    print(f"payload path, {args.path_kb} KB: legacy {legacy * 1000:.1f} ms, direct {direct * 1000:.1f} ms "
+          f"({legacy / direct:.1f}x)")
+    return finish(SUITE, results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
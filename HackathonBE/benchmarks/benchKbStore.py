@@ -0,0 +1,114 @@
+"""
+Measure what holding the KB costs a worker as the export grows: the columnar mmap store
+(kbStore) against loading the export's rows as dicts. Each export size is the repo's
+KB repeated --scales times (URLs made unique), and each case runs in a fresh child
+process so its startup time and peak RSS are its own.
+
+    python benchmarks/benchKbStore.py
+    python benchmarks/benchKbStore.py --scales 1 10 40 --check
+
+A "store" worker opens the store, filters Published articles in one category and
+decodes one body; a "dicts" worker reads every row of the export into memory.
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchUtil import BENCH_DIR, add_baseline_args, finish  # noqa: E402
+from kbIndex import KB_CSV_PATH  # noqa: E402
+
+SUITE = "kb_store"
+
+# Child programs; the workers print {"open_s", "rss_mb", "articles"} as JSON. Linux keeps
+# a process's peak RSS across fork+exec, so the parent only streams files and leaves the
+# building to a child too, staying smaller than anything it measures.
+_CHILD_PRELUDE = f"""
+import json, sys, time
+sys.path.insert(0, {BENCH_DIR!r})
+from benchUtil import peak_rss_mb
+"""
+BUILD = _CHILD_PRELUDE + """
+from kbStore import build_store
+t0 = time.perf_counter()
+build_store(sys.argv[2], sys.argv[1])
+print(json.dumps({"build_s": time.perf_counter() - t0}))
+"""
+STORE_WORKER = _CHILD_PRELUDE + """
+from kbStore import KbStore
+t0 = time.perf_counter()
+store = KbStore(sys.argv[1])
+ids = store.filter(category="Accounting")
+body = store.body(ids[0]) if ids else ""
+print(json.dumps({"open_s": time.perf_counter() - t0, "rss_mb": peak_rss_mb(), "articles": len(store)}))
+"""
+DICTS_WORKER = _CHILD_PRELUDE + """
+from kbIndex import iter_kb_rows
+t0 = time.perf_counter()
+rows = list(iter_kb_rows(sys.argv[2], published_only=False))
+print(json.dumps({"open_s": time.perf_counter() - t0, "rss_mb": peak_rss_mb(), "articles": len(rows)}))
+"""
+
+
+def write_export(path: str, scale: int, csv_path: str = KB_CSV_PATH):
+    """The export repeated scale times, streamed row by row."""
+    csv.field_size_limit(sys.maxsize)
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = None
+        for copy in range(scale):
+            with open(csv_path, newline="", encoding="utf-8-sig") as f:
+                reader = csv.DictReader(f)
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=reader.fieldnames)
+                    writer.writeheader()
+                for row in reader:
+                    writer.writerow(dict(row, **{"Article URL": f"{row['Article URL']}?copy={copy}"}))
+
+
+def _child(program: str, store_path: str, csv_path: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", program, store_path, csv_path],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(scales: list) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        baseline = _child(_CHILD_PRELUDE + "print(json.dumps({'rss_mb': peak_rss_mb()}))", "", "")
+        for scale in scales:
+            csv_path = os.path.join(scratch, f"kb_x{scale}.csv")
+            store_path = os.path.join(scratch, f"kb_x{scale}.store")
+            write_export(csv_path, scale)
+            build_s = _child(BUILD, store_path, csv_path)["build_s"]
+            for case, program in (("store", STORE_WORKER), ("dicts", DICTS_WORKER)):
+                r = _child(program, store_path, csv_path)
+                results[f"{case}_x{scale}"] = {
+                    "articles": r["articles"],
+                    "open_s": r["open_s"],
+                    "rss_mb": r["rss_mb"] - baseline["rss_mb"],
+                    **({"build_s": build_s, "file_mb": os.path.getsize(store_path) / 1e6} if case == "store" else {}),
+                }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 40], help="export sizes, in copies of the KB")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    results = run(args.scales)
+    print(f"{'case':>10} {'articles':>9} {'open ms':>9} {'RSS MB':>8} {'build s':>8} {'file MB':>8}")
+    for case, r in results.items():
+        extra = f"{r['build_s']:8.2f} {r['file_mb']:8.1f}" if "build_s" in r else ""
+        print(f"{case:>10} {r['articles']:9d} {r['open_s'] * 1000:9.2f} {r['rss_mb']:8.1f} {extra}")
+    return finish(SUITE, results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
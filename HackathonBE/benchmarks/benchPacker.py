@@ -0,0 +1,190 @@
+"""
+Benchmark the JSON envelope packer (promptParsing.pack_json) against the previous
+copy-and-redump implementation on synthetic Rentvine-like payloads.
+
+    python benchmarks/benchPacker.py                    # 1, 5, 10, 25, 50 MB
+    python benchmarks/benchPacker.py --sizes 1 5 --legacy-max-mb 5
+
+Both implementations must produce identical envelopes; the legacy one is quadratic per
+chunk, so it is only timed up to --legacy-max-mb.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchUtil import add_baseline_args, finish  # noqa: E402
+from promptParsing import pack_json  # noqa: E402
+
+SUITE = "packer"
+
+
+# --- previous implementation, kept verbatim as the reference ---------------------
+def legacy_pack_json(obj, max_bytes: int, pretty: bool = True):
+    def _size_bytes(s: str) -> int:
+        return len(s.encode("utf-8", "replace"))
+
+    def _wrap(path: str, payload, pretty: bool) -> str:
+        if pretty:
+            return json.dumps({"path": path, "data": payload}, ensure_ascii=False, indent=2)
+        return json.dumps({"path": path, "data": payload}, ensure_ascii=False, separators=(",", ":"))
+
+    def _byte_chunks_fallback(raw: str, max_bytes: int, path: str, pretty: bool):
+        bs = raw.encode("utf-8", "replace")
+        out = []
+        i = 0
+        overhead = 64 + len(path.encode("utf-8", "replace"))
+        while i < len(bs):
+            j = min(len(bs), i + max(1024, max_bytes - overhead))
+            if j < len(bs):
+                back = 0
+                while j - back > i and bs[j - back:j - back + 1] not in b", \n\r\t}]":
+                    back += 1
+                if j - back <= i:
+                    back = 0
+                j -= back
+            chunk = bs[i:j].decode("utf-8", "replace")
+            out.append(_wrap(path, chunk, pretty))
+            i = j
+        return out
+
+    def _split_any(obj, max_bytes: int, path: str, pretty: bool):
+        if isinstance(obj, dict):
+            return _pack_dict(obj, max_bytes, path, pretty)
+        if isinstance(obj, list):
+            return _pack_list(obj, max_bytes, path, pretty)
+        s = _wrap(path, obj, pretty)
+        if _size_bytes(s) <= max_bytes:
+            return [s]
+        raw = json.dumps(obj, ensure_ascii=False)
+        return _byte_chunks_fallback(raw, max_bytes, path, pretty)
+
+    def _pack_dict(d: dict, max_bytes: int, path: str, pretty: bool):
+        out, current = [], {}
+        for k, v in d.items():
+            tentative = dict(current); tentative[k] = v
+            if _size_bytes(_wrap(path, tentative, pretty)) <= max_bytes:
+                current = tentative
+                continue
+            single = _wrap(f"{path}.{k}" if path else k, v, pretty)
+            if _size_bytes(single) <= max_bytes:
+                if current:
+                    out.append(_wrap(path, current, pretty)); current = {}
+                out.append(single)
+            else:
+                if current:
+                    out.append(_wrap(path, current, pretty)); current = {}
+                out.extend(_split_any(v, max_bytes, f"{path}.{k}" if path else k, pretty))
+        if current:
+            out.append(_wrap(path, current, pretty))
+        return out
+
+    def _pack_list(arr: list, max_bytes: int, path: str, pretty: bool):
+        out, buf = [], []
+        for idx, item in enumerate(arr):
+            tentative = list(buf); tentative.append(item)
+            if _size_bytes(_wrap(path, tentative, pretty)) <= max_bytes:
+                buf = tentative
+                continue
+            single = _wrap(f"{path}[{idx}]", item, pretty)
+            if _size_bytes(single) <= max_bytes:
+                if buf:
+                    out.append(_wrap(path, buf, pretty)); buf = []
+                out.append(single)
+            else:
+                if buf:
+                    out.append(_wrap(path, buf, pretty)); buf = []
+                out.extend(_split_any(item, max_bytes, f"{path}[{idx}]", pretty))
+        if buf:
+            out.append(_wrap(path, buf, pretty))
+        return out
+
+    return _split_any(obj, max_bytes, "", pretty)
+
+
+# --- synthetic payloads -----------------------------------------------------------
+def rentvine_portfolio(target_bytes: int, seed: int = 7) -> dict:
+    """
+    A portfolio + ledger shaped like the /portfolios route output, grown until its
+    pretty-printed size reaches target_bytes.
+    """
+    rng = random.Random(seed)
+    streets = ["Main St", "Oak Ave", "Elm Dr", "Cedar Ln", "Lakeview Blvd", "Peachtree Rd"]
+    descriptions = ["Rent payment", "Owner distribution", "Management fee", "Repair bill – HVAC",
+                    "Late fee", "Security deposit", "Utility reimbursement"]
+    properties, balances = [], []
+    data = {
+        "portfolio": {
+            "portfolioID": 391, "name": "ABC Holdings LLC", "reserve": "500.00",
+            "owners": [{"contactID": i, "name": f"Owner {i}", "email": f"owner{i}@example.com",
+                        "ownershipPercent": "50.00"} for i in range(4)],
+            "properties": properties,
+            "statementSetting": {"frequency": "monthly", "includeBills": True, "note": None},
+            "ledger": {"ledgerID": 976},
+        },
+        "ledger": {"ledgerID": 976, "name": "ABC Holdings LLC", "balances": balances},
+    }
+    size, i = 2_000, 0
+    while size < target_bytes:
+        prop = {
+            "propertyID": i, "name": f"{rng.randint(100, 9999)} {rng.choice(streets)}",
+            "city": "Atlanta", "stateID": "GA", "postalCode": f"30{rng.randint(100, 999)}",
+            "unit": {"unitID": i * 10, "beds": rng.randint(1, 5), "baths": rng.choice([1, 1.5, 2, 2.5]),
+                     "sqft": rng.randint(600, 3200)},
+            "lease": {"leaseID": i * 7, "rent": f"{rng.uniform(800, 3500):.2f}", "status": "active",
+                      "tenants": [{"contactID": i * 3 + t, "name": f"Tenant {t}"} for t in range(rng.randint(1, 3))]},
+            "managementFeeSetting": None, "pastLeases": [],
+        }
+        properties.append(prop)
+        for _ in range(8):
+            balances.append({
+                "ledgerEntryID": len(balances), "description": rng.choice(descriptions),
+                "amount": f"{rng.uniform(-2500, 2500):.2f}", "propertyID": i,
+                "dateTimePosted": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+                "memo": rng.choice([None, "", "Paid via ACH", "Check #1042"]),
+            })
+        size += 1_900
+        i += 1
+    return data
+
+
+def _time(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 5, 10, 25, 50], help="payload sizes in MB")
+    parser.add_argument("--max-bytes", type=int, default=16_000, help="envelope byte cap (default 16 KB, as for max_tokens=2000)")
+    parser.add_argument("--legacy-max-mb", type=float, default=10, help="skip the legacy packer above this size")
+    parser.add_argument("--compact", action="store_true", help="benchmark compact envelopes instead of indent=2")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+    pretty = not args.compact
+
+    results = {}
+    print(f"{'size':>8} {'chunks':>8} {'new (s)':>10} {'MB/s':>8} {'legacy (s)':>11} {'speedup':>8}")
+    for mb in args.sizes:
+        payload = rentvine_portfolio(int(mb * 1024 * 1024))
+        real_mb = len(json.dumps(payload, indent=2)) / (1024 * 1024)
+        new_s, new_out = _time(pack_json, payload, args.max_bytes, pretty)
+        if mb <= args.legacy_max_mb:
+            old_s, old_out = _time(legacy_pack_json, payload, args.max_bytes, pretty)
+            if old_out != new_out:
+                raise SystemExit(f"{mb} MB: packer output differs from the legacy implementation")
+            legacy, speedup = f"{old_s:11.2f}", f"{old_s / new_s:7.1f}x"
+        else:
+            legacy, speedup = f"{'skipped':>11}", f"{'-':>8}"
+        print(f"{real_mb:7.1f}M {len(new_out):8d} {new_s:10.2f} {real_mb / new_s:8.1f} {legacy} {speedup}")
+        results[f"{'compact' if args.compact else 'pretty'}_{mb:g}mb"] = {"seconds": new_s, "mb_per_s": real_mb / new_s}
+    return finish(SUITE, results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
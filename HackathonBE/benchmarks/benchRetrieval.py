@@ -0,0 +1,79 @@
+"""
+Micro-benchmark KB retrieval: BM25 search over the mmap index (kbIndex) and dense search
+over the embedding index (kbEmbeddings, hashing embedder so results do not depend on a
+downloaded model). Both indexes are built from the repo's KB export into a scratch
+directory first, so the numbers do not depend on what is in index/.
+
+    python benchmarks/benchRetrieval.py
+    python benchmarks/benchRetrieval.py --k 5 --check
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchUtil import add_baseline_args, finish, latency_summary, peak_rss_mb, time_calls  # noqa: E402
+from kbEmbeddings import EmbeddingIndex, HashingEmbedder, build_embeddings  # noqa: E402
+from kbIndex import KbIndex, build_index  # noqa: E402
+
+SUITE = "retrieval"
+
+# Questions of the kind the widget receives, short and long
+QUESTIONS = [
+    "how do I create a new portfolio",
+    "why is there an escrow mismatch",
+    "owner distribution failed",
+    "How do I set up late fees for a lease that starts mid-month and prorate the first payment?",
+    "work order vendor bill not showing on the owner statement",
+    "screening application payment refund",
+    "Why does the accounting diagnostics page show an unbalanced journal entry after I voided a check?",
+    "add a tenant to an existing lease",
+]
+
+
+def run(k: int = 3, min_time: float = 1.0) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        index_path = os.path.join(scratch, "kb.idx")
+        t0 = time.perf_counter()
+        n_docs = build_index(index_path=index_path)
+        bm25_build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        build_embeddings(out_dir=scratch, backend="hashing")
+        dense_build = time.perf_counter() - t0
+
+        bm25 = KbIndex(index_path)
+        dense = EmbeddingIndex(scratch, embedder=HashingEmbedder())
+        args = [(q, k) for q in QUESTIONS]
+        bm25_samples = time_calls(bm25.search, args, min_time)
+        dense_samples = time_calls(dense.search, args, min_time)
+        del bm25, dense
+
+    return {
+        "bm25": {"docs": n_docs, "build_s": bm25_build, **latency_summary(bm25_samples),
+                 "queries_per_s": len(bm25_samples) / sum(bm25_samples)},
+        "dense": {"build_s": dense_build, **latency_summary(dense_samples),
+                  "queries_per_s": len(dense_samples) / sum(dense_samples)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3, help="results per query")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to query each index for")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    results = run(args.k, args.min_time)
+    print(f"{'index':>6} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/s':>9}")
+    for case, r in results.items():
+        print(f"{case:>6} {r['build_s']:8.2f} {r['p50_s'] * 1000:8.3f} {r['p95_s'] * 1000:8.3f} "
+              f"{r['p99_s'] * 1000:8.3f} {r['queries_per_s']:9.0f}")
+    print(f"peak RSS: {peak_rss_mb()} MB")
+    return finish(SUITE, results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark route resolution over apiRoutes.ROUTES: the trie walk with a cold memo
+(every page ID distinct), repeated pages served from the memo, unsupported URLs, and
+building the API URL(s) for a page, and planning a question-projected fetch.
+
+    python benchmarks/benchRoutes.py
+    python benchmarks/benchRoutes.py --pages 50000 --check
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchUtil import add_baseline_args, finish  # noqa: E402
+from apiRoutes import REGISTRY, build_api_url, plan_fetch  # noqa: E402
+
+SUITE = "routes"
+HOST = "https://abchomes.rentvinedev.com"
+
+
+def page_paths(n: int, seed: int = 3) -> list:
+    """n page paths spread over every route template, each with a fresh numeric ID."""
+    rng = random.Random(seed)
+    templates = [r.template for r in REGISTRY.routes]
+    return [rng.choice(templates).replace("{id}", str(rng.randint(1, 10_000_000))) for _ in range(n)]
+
+
+def _per_op(fn, items: list) -> dict:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    seconds = time.perf_counter() - start
+    return {"us_per_op": seconds / len(items) * 1e6, "ops_per_s": len(items) / seconds}
+
+
+def run(pages: int = 20_000) -> dict:
+    paths = page_paths(pages)
+    misses = [p.replace("/", "/x", 1) for p in paths[:pages // 4]]
+    results = {}
+
+    REGISTRY.resolve.cache_clear()
+    results["resolve_cold"] = _per_op(REGISTRY._resolve, paths)
+    REGISTRY.resolve.cache_clear()
+    for p in paths[:1000]:
+        REGISTRY.resolve(p)
+    results["resolve_memo"] = _per_op(REGISTRY.resolve, paths[:1000] * max(1, pages // 1000))
+    results["resolve_miss"] = _per_op(REGISTRY._resolve, misses)
+    results["build_api_url"] = _per_op(build_api_url, [HOST + p for p in paths[:pages // 4]])
+    results["plan_projected"] = _per_op(lambda u: plan_fetch(u, "When is the vendor scheduled to come out?"),
+                                        [HOST + p for p in paths[:pages // 4]])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20_000, help="distinct page URLs to resolve")
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    results = run(args.pages)
+    print(f"{len(REGISTRY.routes)} routes")
+    print(f"{'case':>14} {'us/op':>8} {'ops/s':>12}")
+    for case, r in results.items():
+        print(f"{case:>14} {r['us_per_op']:8.2f} {r['ops_per_s']:12.0f}")
+    return finish(SUITE, results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Shared helpers for the benchmark scripts: timing loops, percentiles, peak RSS and the
+baseline file that regressions are checked against.
+
+Every benchmark reports a flat {metric: number} dict per case. Metrics ending in
+"_per_s" are throughputs (higher is better); everything else (seconds, bytes, MB) is
+lower-is-better.
+"""
+import json
+import math
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+DEFAULT_TOLERANCE = 0.25    # a metric may be 25% worse than its baseline before it is a regression
+
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(q / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(samples: list, prefix: str = "") -> dict:
+    """p50/p95/p99/max of a list of durations in seconds."""
+    values = sorted(samples)
+    return {
+        f"{prefix}p50_s": percentile(values, 50),
+        f"{prefix}p95_s": percentile(values, 95),
+        f"{prefix}p99_s": percentile(values, 99),
+        f"{prefix}max_s": values[-1] if values else 0.0,
+    }
+
+
+def time_calls(fn, args_list: list, min_time: float = 0.2) -> list:
+    """
+    Call fn(*args) for every args tuple in args_list, cycling until at least min_time
+    has passed. Returns per-call durations in seconds.
+    """
+    samples = []
+    start = time.perf_counter()
+    while True:
+        for args in args_list:
+            t0 = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - t0)
+        if time.perf_counter() - start >= min_time:
+            return samples
+
+
+def peak_rss_mb(children: bool = False) -> float | None:
+    """Peak resident set size of this process (or its reaped children) in MB, None where unsupported."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def load_baselines(path: str = BASELINES_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baselines(suite: str, results: dict, path: str = BASELINES_PATH):
+    """Store the baseline of each case in results ({case: {metric: value}}), keeping other cases."""
+    baselines = load_baselines(path)
+    baselines.setdefault(suite, {}).update(results)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def compare(suite: str, results: dict, tolerance: float = DEFAULT_TOLERANCE, path: str = BASELINES_PATH) -> list:
+    """
+    Returns:
+        Regressions as human-readable strings (empty when everything is within tolerance
+        or there is no baseline for the suite).
+    """
+    baseline = load_baselines(path).get(suite, {})
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(case, {}).get(metric)
+            if not isinstance(base, (int, float)) or not isinstance(value, (int, float)):
+                continue
+            if base == 0:
+                worse = value > 0 and not metric.endswith("_per_s")     # e.g. errors appearing
+            elif metric.endswith("_per_s"):
+                worse = value < base * (1 - tolerance)
+            else:
+                worse = value > base * (1 + tolerance)
+            if worse:
+                regressions.append(f"{suite}/{case}: {metric} {value:.6g} vs baseline {base:.6g}")
+    return regressions
+
+
+def add_baseline_args(parser):
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a metric regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before --check fails (default 0.25)")
+
+
+def finish(suite: str, results: dict, args) -> int:
+    """Apply --save-baseline / --check for a suite's results; returns the exit code."""
+    if args.save_baseline:
+        save_baselines(suite, results)
+        print(f"Baseline for {suite} saved to {os.path.relpath(BASELINES_PATH)}")
+    if args.check:
+        regressions = compare(suite, results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"{suite}: no regressions (tolerance {args.tolerance:.0%})")
+    return 0
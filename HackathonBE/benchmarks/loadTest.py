@@ -0,0 +1,251 @@
+"""
+End-to-end load test of /api/query: the backend runs in a child process (Flask or the
+ASGI app) against local stand-ins for Rentvine (fakeRentvineServer, recorded fixtures)
+and LM Studio (fakeLlmServer, configurable latency), while this process drives it with
+concurrent clients and reports latency percentiles, throughput and the server's peak RSS.
+
+    python benchmarks/loadTest.py                                  # Flask, JSON answers
+    python benchmarks/loadTest.py --server asgi --stream --clients 64 --requests 1000
+    python benchmarks/loadTest.py --llm-ttft 0.8 --llm-token-delay 0.03 --llm-parallel 4
+    python benchmarks/loadTest.py --save-baseline                  # then later: --check
+
+Pages rotate over work orders, portfolios (portfolio + dependent ledger call) and
+accounting diagnostics (two parallel calls). Each request uses a distinct page ID unless
+--pages limits them, so the response and answer caches only help when asked to.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchUtil import add_baseline_args, finish, latency_summary, peak_rss_mb  # noqa: E402
+
+SUITE = "load"
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PAGES = [
+    "/maintenance/work-orders/{id}",
+    "/portfolios/{id}",
+    "/accounting/diagnostics",
+]
+QUESTIONS = [
+    "What is the status of this work order?",
+    "Who is the vendor and when are they scheduled?",
+    "What is the available balance for this portfolio?",
+    "Summarize the recent ledger activity.",
+    "Which diagnostics are errors and what should I fix first?",
+    "Is owner approval required, and was it given?",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(server: str, port: int):
+    """Child-process mode: run the backend until stdin closes."""
+    sys.path.insert(0, BACKEND_DIR)
+    if server == "asgi":
+        import asyncio
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+        import asgiApp
+
+        config = Config()
+        config.bind = [f"127.0.0.1:{port}"]
+        config.accesslog = None
+
+        async def run():
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            threading.Thread(target=lambda: (sys.stdin.read(), loop.call_soon_threadsafe(stop.set)),
+                             daemon=True).start()
+            await hypercorn_serve(asgiApp.app, config, shutdown_trigger=stop.wait)
+        asyncio.run(run())
+    else:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        import app
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):    # one access-log line per request skews the numbers
+                pass
+
+        httpd = make_server("127.0.0.1", port, app.app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        sys.stdin.read()
+        httpd.shutdown()
+
+
+def _wait_ready(base: str, child: subprocess.Popen, timeout: float = 60):
+    import requests
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if child.poll() is not None:
+            raise SystemExit(f"backend exited with code {child.returncode}")
+        try:
+            if requests.get(base + "/api/cache-stats", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("backend did not come up")
+
+
+def _one(session, base: str, body: dict, stream: bool) -> dict:
+    started = time.perf_counter()
+    ttft = None
+    if stream:
+        with session.post(base + "/api/query/stream", json=body, stream=True, timeout=300) as r:
+            size = 0
+            for line in r.iter_lines():
+                size += len(line) + 1
+                if ttft is None and line.startswith(b"event: delta"):
+                    ttft = time.perf_counter() - started
+            status = r.status_code
+    else:
+        r = session.post(base + "/api/query", json=body, timeout=300)
+        status, size = r.status_code, len(r.content)
+    return {"status": status, "seconds": time.perf_counter() - started, "ttft": ttft, "bytes": size}
+
+
+def run(args) -> dict:
+    import requests
+    from fakeLlmServer import start_fake_llm
+    from fakeRentvineServer import start_fake_rentvine
+
+    rentvine = start_fake_rentvine(0, args.rentvine_latency)
+    llm = start_fake_llm(0, args.llm_ttft, args.llm_token_delay, args.llm_parallel)
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ)
+        env.update({
+            "LLM_BACKENDS": f"http://127.0.0.1:{llm.server_port}/v1/chat/completions",
+            "LLM_MAX_IN_FLIGHT": str(args.llm_slots or args.clients),
+            "LLM_MAX_QUEUE": str(max(64, args.clients * 2)),
+            "ANSWER_CACHE": "1" if args.answer_cache else "0",
+            "FETCH_CACHE": "1" if args.fetch_cache else "0",
+            "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        })
+        if not args.no_kb:
+            from kbEmbeddings import build_embeddings
+            from kbIndex import build_index
+
+            build_index(index_path=os.path.join(scratch, "kb.idx"))
+            build_embeddings(out_dir=scratch, backend="hashing")
+            env.update({"KB_INDEX_PATH": os.path.join(scratch, "kb.idx"), "EMBEDDINGS_DIR": scratch})
+
+        child = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", args.server, "--port", str(port)],
+            cwd=BACKEND_DIR, env=env, stdin=subprocess.PIPE,
+        )
+        try:
+            _wait_ready(base, child)
+            rng = random.Random(args.seed)
+            n_pages = args.pages or args.requests
+            bodies = []
+            for i in range(args.requests):
+                page = PAGES[i % len(PAGES)].format(id=1 + rng.randrange(n_pages))
+                bodies.append({"question": rng.choice(QUESTIONS), "history": "[]",
+                               "url": f"http://127.0.0.1:{rentvine.server_port}{page}",
+                               "session_id": f"load-{i % args.clients}"})
+
+            local = threading.local()
+
+            def worker(body):
+                if not hasattr(local, "session"):
+                    local.session = requests.Session()
+                try:
+                    return _one(local.session, base, body, args.stream)
+                except requests.RequestException as e:
+                    return {"status": type(e).__name__, "seconds": 0.0, "ttft": None, "bytes": 0}
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                outcomes = list(pool.map(worker, bodies))
+            wall = time.perf_counter() - started
+        finally:
+            child.stdin.close()
+            try:
+                child.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                child.kill()
+                child.wait()
+    rentvine.shutdown()
+    llm.shutdown()
+
+    ok = [o for o in outcomes if o["status"] == 200]
+    statuses = {}
+    for o in outcomes:
+        statuses[str(o["status"])] = statuses.get(str(o["status"]), 0) + 1
+    result = {
+        "requests": len(outcomes),
+        "errors": len(outcomes) - len(ok),
+        "requests_per_s": len(ok) / wall if wall else 0.0,
+        **latency_summary([o["seconds"] for o in ok]),
+        "mean_bytes": sum(o["bytes"] for o in ok) / len(ok) if ok else 0,
+        "server_peak_rss_mb": peak_rss_mb(children=True),
+    }
+    if args.stream:
+        result.update(latency_summary([o["ttft"] for o in ok if o["ttft"] is not None], "ttft_"))
+    return {"case": f"{args.server}_{'stream' if args.stream else 'json'}_c{args.clients}",
+            "result": result, "statuses": statuses, "wall": wall}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--stream", action="store_true", help="use /api/query/stream and report time to first token")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="total requests")
+    parser.add_argument("--pages", type=int, default=0, help="distinct page IDs (0 = one per request)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rentvine-latency", type=float, default=0.1, help="fake Rentvine seconds per call")
+    parser.add_argument("--llm-ttft", type=float, default=0.3, help="fake LLM seconds before the first token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01, help="fake LLM seconds between tokens")
+    parser.add_argument("--llm-parallel", type=int, default=0, help="fake LLM generations at once (0 = unbounded)")
+    parser.add_argument("--llm-slots", type=int, default=0, help="LLM_MAX_IN_FLIGHT for the backend (0 = --clients)")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the answer cache on")
+    parser.add_argument("--fetch-cache", action="store_true", help="leave the Rentvine response cache on")
+    parser.add_argument("--no-kb", action="store_true", help="skip building the KB indexes (no KB search)")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--serve", choices=("flask", "asgi"), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    add_baseline_args(parser)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return 0
+
+    out = run(args)
+    r = out["result"]
+    if args.json:
+        print(json.dumps(out, indent=2))
+    else:
+        print(f"{out['case']}: {r['requests']} requests in {out['wall']:.2f}s, statuses {out['statuses']}")
+        print(f"  throughput {r['requests_per_s']:.1f} req/s, mean response {r['mean_bytes']:.0f} bytes")
+        print(f"  latency  p50 {r['p50_s'] * 1000:.0f} ms  p95 {r['p95_s'] * 1000:.0f} ms  "
+              f"p99 {r['p99_s'] * 1000:.0f} ms  max {r['max_s'] * 1000:.0f} ms")
+        if args.stream:
+            print(f"  ttft     p50 {r['ttft_p50_s'] * 1000:.0f} ms  p95 {r['ttft_p95_s'] * 1000:.0f} ms  "
+                  f"p99 {r['ttft_p99_s'] * 1000:.0f} ms")
+        print(f"  server peak RSS {r['server_peak_rss_mb']} MB")
+    return finish(SUITE, {out["case"]: r}, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Server-side conversation state, so follow-up turns send the model only what changed.
+
+Each conversation keeps a transcript of earlier turns: the Rentvine parts that turn
+introduced, the question and the answer. A new turn is built as
+
+    transcript (earlier turns, oldest first) + parts whose sha256 is not in it + question
+
+so the prompt is append-only across turns (the server's KV cache covers everything but
+the new tail) and an unchanged entity is never re-sent. When the transcript passes
+CHAT_HISTORY_TOKENS, older turns are folded into a short extractive summary and their
+parts are forgotten, to be re-sent on demand; per-turn prompt size stays bounded
+however long the chat runs.
+
+A turn is only added to the transcript once its answer is complete (Turn.commit), so a
+failed or cancelled generation leaves the conversation as it was. An answer served from
+the answer cache is recorded too (ChatSessions.answered), and the cache is keyed by
+transcript_key so one conversation's follow-up is never answered from another's.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import envConfig  # noqa: F401
+from promptParsing import count_tokens
+
+# Tunables (override in .env)
+CHAT_SESSIONS = int(os.getenv("CHAT_SESSIONS", "1024"))                  # conversations kept in memory (LRU)
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))          # idle seconds before one is forgotten
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "8000"))      # transcript budget before compaction
+CHAT_KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", "2"))                 # recent turns kept verbatim on compaction
+SUMMARY_ANSWER_WORDS = 40                                                # per earlier answer in the summary
+
+
+def conversation_id(data: dict, headers) -> str:
+    """
+    The client's own conversation id (session_id in the body or X-Session-Id), or "".
+    Unlike promptPrefix.session_key there is no page-URL fallback: a transcript holds
+    one user's questions and answers and must not be shared between visitors.
+    """
+    return str(data.get("session_id") or headers.get("X-Session-Id") or "")
+
+
+def part_message(part: dict, i: int, n: int, updated: bool = False) -> dict:
+    label = "UPDATED PART" if updated else "PART"
+    return {"role": "user", "content": f"[{label} {i+1}/{n}] SHA256={part['sha256']}\n{part['content']}"}
+
+
+def question_message(question: str) -> dict:
+    return {"role": "user", "content": f"Here is the customer's question: {question}"}
+
+
+def _message_tokens(messages: list) -> int:
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+def _clip_words(text: str, words: int) -> str:
+    split = text.split()
+    return " ".join(split[:words]) + (" ..." if len(split) > words else "")
+
+
+class _Exchange:
+    """One committed turn: the messages it added (parts, question, answer) and their cost."""
+    __slots__ = ("messages", "tokens", "hashes", "question", "answer")
+
+    def __init__(self, messages: list, hashes: frozenset, question: str, answer: str):
+        self.messages = messages
+        self.tokens = _message_tokens(messages)
+        self.hashes = hashes
+        self.question = question
+        self.answer = answer
+
+
+class _Conversation:
+    __slots__ = ("exchanges", "summary", "summary_tokens", "used", "compactions")
+
+    def __init__(self):
+        self.exchanges = []
+        self.summary = []           # one line per folded-away turn
+        self.summary_tokens = 0
+        self.used = time.monotonic()
+        self.compactions = 0
+
+    def seen(self) -> set:
+        return set().union(*(e.hashes for e in self.exchanges))
+
+    def tokens(self) -> int:
+        return self.summary_tokens + sum(e.tokens for e in self.exchanges)
+
+    def transcript(self) -> list:
+        messages = []
+        if self.summary:
+            messages.append({"role": "user", "content": "Summary of the earlier conversation:\n" + "\n".join(self.summary)})
+        for e in self.exchanges:
+            messages.extend(e.messages)
+        return messages
+
+    def compact(self, budget: int, keep: int):
+        """Over budget: fold all but the last `keep` turns into the summary. Returns whether it did."""
+        if self.tokens() <= budget or len(self.exchanges) <= keep:
+            return False
+        folded, self.exchanges = self.exchanges[:len(self.exchanges) - keep], self.exchanges[len(self.exchanges) - keep:]
+        for e in folded:
+            self.summary.append(f"- Customer asked: {e.question}\n  Assistant answered: "
+                                f"{_clip_words(e.answer, SUMMARY_ANSWER_WORDS)}")
+        # the summary itself is capped at half the budget; its oldest lines go first
+        tokens = [count_tokens(line) for line in self.summary]
+        while len(self.summary) > 1 and sum(tokens) > budget // 2:
+            self.summary.pop(0)
+            tokens.pop(0)
+        self.summary_tokens = sum(tokens)
+        self.compactions += 1
+        return True
+
+
+class Turn:
+    """
+    The messages for one new turn of a conversation. history + context precede the
+    turn's ephemeral material (KB snippets) and the question; commit(answer) records
+    the turn once the answer is known.
+    """
+    __slots__ = ("store", "conversation", "history", "context", "hashes", "question", "stats")
+
+    def __init__(self, store, conversation: str, history: list, context: list, hashes: frozenset,
+                 question: str, stats: dict):
+        self.store = store
+        self.conversation = conversation
+        self.history = history
+        self.context = context
+        self.hashes = hashes
+        self.question = question
+        self.stats = stats
+
+    def commit(self, answer: str):
+        if self.store is not None and answer:
+            self.store.commit(self, answer)
+
+
+class ChatSessions:
+    """LRU of conversations by conversation_id, each expiring after ttl idle seconds."""
+
+    def __init__(self, max_sessions: int = CHAT_SESSIONS, ttl: float = CHAT_SESSION_TTL,
+                 budget: int = CHAT_HISTORY_TOKENS, keep_turns: int = CHAT_KEEP_TURNS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, conversation: str, create: bool):
+        now = time.monotonic()
+        state = self._sessions.get(conversation)
+        if state is not None and now - state.used > self.ttl:
+            del self._sessions[conversation]
+            state = None
+        if state is None and create:
+            state = self._sessions[conversation] = _Conversation()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if state is not None:
+            state.used = now
+            self._sessions.move_to_end(conversation)
+        return state
+
+    def begin(self, conversation: str, parts: list, question: str, client_history: str = "") -> Turn:
+        """
+        Plan the next turn: the stored transcript, then only the parts (ordered by
+        sha256) that it does not already contain. Without a stored transcript, a
+        non-empty client_history (the widget's own copy of the chat) is sent once
+        after the parts, as before sessions existed.
+        """
+        parts = sorted(parts, key=lambda p: p["sha256"])
+        with self._lock:
+            state = self._get(conversation, create=False) if conversation else None
+            compacted = state.compact(self.budget, self.keep_turns) if state is not None else False
+            history = state.transcript() if state is not None else []
+            seen = state.seen() if state is not None else set()
+            turns = len(state.exchanges) if state is not None else 0
+        fresh = [p for p in parts if p["sha256"] not in seen]
+        updated = bool(history)
+        context = [part_message(p, i, len(fresh), updated) for i, p in enumerate(fresh)]
+        if not history and client_history and client_history.strip() not in ("[]", "null"):
+            context.append({"role": "user", "content": f"Here is the chat history: {client_history}"})
+        stats = {
+            "session_turns": turns,
+            "parts_sent": len(fresh),
+            "parts_reused": len(parts) - len(fresh),
+            "history_tokens": _message_tokens(history),
+            "history_compacted": compacted,
+        }
+        return Turn(self if conversation else None, conversation, history, context,
+                    frozenset(p["sha256"] for p in fresh), question, stats)
+
+    def transcript_key(self, conversation: str) -> str:
+        """sha256 of the conversation's stored transcript, or "" when it has none."""
+        if not conversation:
+            return ""
+        with self._lock:
+            state = self._get(conversation, create=False)
+            if state is None or not state.exchanges and not state.summary:
+                return ""
+            digest = hashlib.sha256()
+            for message in state.transcript():
+                digest.update(message["content"].encode("utf-8") + b"\0")
+        return digest.hexdigest()
+
+    def answered(self, conversation: str, question: str, answer: str):
+        """
+        Record a turn answered without the model (an answer-cache hit). It adds only the
+        question and answer; the parts it did not send go out with the next turn.
+        """
+        if conversation:
+            Turn(self, conversation, [], [], frozenset(), question, {}).commit(answer)
+
+    def commit(self, turn: Turn, answer: str):
+        messages = turn.context + [question_message(turn.question), {"role": "assistant", "content": answer}]
+        exchange = _Exchange(messages, turn.hashes, turn.question, answer)
+        with self._lock:
+            self._get(turn.conversation, create=True).exchanges.append(exchange)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(s.exchanges) for s in self._sessions.values()),
+                "transcript_tokens": sum(s.tokens() for s in self._sessions.values()),
+                "compactions": sum(s.compactions for s in self._sessions.values()),
+            }
+
+
+_sessions = None
+_sessions_lock = threading.Lock()
+
+
+def get_chat_sessions() -> ChatSessions:
+    global _sessions
+    if _sessions is None:
+        with _sessions_lock:
+            if _sessions is None:
+                _sessions = ChatSessions()
+    return _sessions
+
+
+def chat_session_stats() -> dict:
+    return get_chat_sessions().stats()
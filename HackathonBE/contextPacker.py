@@ -0,0 +1,195 @@
+import hashlib
+import os
+import re
+
+import envConfig  # noqa: F401
+from jsonCodec import dumps, loads
+from kbIndex import tokenize
+from promptParsing import count_tokens
+
+# Tunables (override in .env)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))    # entity context tokens per request
+CONTEXT_ENCODING = os.getenv("CONTEXT_ENCODING", "compact")              # compact | lines | pretty
+ENCODINGS = ("compact", "lines", "pretty")
+
+# Fields that cost tokens but rarely answer a support question
+_LOW_VALUE_KEY = re.compile(
+    r"^(dateTime(Created|Modified)|created(At|By\w*)|modified(At|By\w*)|updated(At|By\w*)|"
+    r"\w*(Hash|Token|Guid|UUID)|\w+ID)$"
+)
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+PATH_WEIGHT = 3.0       # a question word in the envelope path ("portfolio.ledger") counts triple
+ROOT_BONUS = 1.0        # the entity's own top-level fields are always a little relevant
+
+
+def prune(value, depth: int = 0):
+    """
+    Drop nulls, empty strings/relations and low-value fields (foreign IDs, audit
+    timestamps). The entity's own top-level ID is kept so the model can cite it.
+    """
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if depth > 0 and _LOW_VALUE_KEY.match(str(k)):
+                continue
+            v = prune(v, depth + 1)
+            if v is None or v == "" or v == [] or v == {}:
+                continue
+            out[k] = v
+        return out
+    if isinstance(value, list):
+        items = [prune(v, depth + 1) for v in value]
+        return [v for v in items if v is not None and v != "" and v != [] and v != {}]
+    return value
+
+
+def prune_envelope(path: str, data, roots=()):
+    """
+    prune() one envelope's data. The payload root and the call bodies named in roots
+    (apiRoutes.call_keys) are entities of their own, so each keeps its top-level ID.
+    """
+    if path in roots:
+        return prune(data)
+    if path:
+        return prune(data, depth=1)
+    if not roots or not isinstance(data, dict):
+        return prune(data)
+    out = {}
+    for k, v in data.items():
+        v = prune(v, depth=0 if k in roots else 1)
+        if v is not None and v != "" and v != [] and v != {}:
+            out[k] = v
+    return out
+
+
+def _words(text: str) -> set:
+    return set(tokenize(_CAMEL.sub(" ", text)))
+
+
+def _leaf_text(value, out: list):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            out.append(str(k))
+            _leaf_text(v, out)
+    elif isinstance(value, list):
+        for v in value:
+            _leaf_text(v, out)
+    elif isinstance(value, str):
+        out.append(value)
+
+
+def score_part(path: str, data, question_words: set) -> float:
+    """Overlap between the question and the envelope's path, keys and string values."""
+    if not question_words:
+        return 0.0
+    texts = []
+    _leaf_text(data, texts)
+    content = _words(" ".join(texts))
+    score = PATH_WEIGHT * len(question_words & _words(path.replace(".", " ")))
+    score += len(question_words & content)
+    if "." not in path and "[" not in path:
+        score += ROOT_BONUS
+    return score
+
+
+def _flatten(value, prefix: str, out: list):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(v, f"{prefix}.{k}" if prefix else str(k), out)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            _flatten(v, f"{prefix}[{i}]", out)
+    else:
+        text = value.replace("\n", "\\n") if isinstance(value, str) else dumps(value)
+        out.append(f"{prefix}: {text}" if prefix else text)
+
+
+def render(path: str, data, encoding: str = CONTEXT_ENCODING) -> str:
+    """
+    One pruned envelope as prompt text:
+
+    - "compact": minified {"path", "data"} JSON
+    - "pretty": the same JSON with indent=2
+    - "lines": "@<path>" and then one "<relative.path>: value" line per leaf, with no
+      braces or quotes at all
+    """
+    if encoding == "lines":
+        out = [f"@{path}"] if path else []
+        _flatten(data, "", out)
+        return "\n".join(out)
+    return dumps({"path": path, "data": data}, pretty=encoding == "pretty")
+
+
+def _envelope(part: dict):
+    try:
+        env = loads(part["content"])
+    except (ValueError, TypeError):
+        return None
+    if isinstance(env, dict) and set(env) == {"path", "data"}:
+        return env
+    return None
+
+
+def pack_context(parts: list, question: str, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 encoding: str = CONTEXT_ENCODING, roots=()) -> dict:
+    """
+    Given chunk_for_lm_studio parts (JSON envelopes, produced without overlap), prune
+    each envelope, score it against the question and keep the best ones until the
+    token budget is full. Kept parts retain their original order and are rendered in
+    the given encoding (see render()); pruned_tokens includes what the encoding saves.
+    roots are the payload's call keys on a multi-call page (see prune_envelope).
+
+    Returns:
+        {"parts": [...re-indexed parts...], "kept_tokens", "dropped_tokens",
+         "pruned_tokens", "kept_parts", "dropped_parts"}
+    """
+    question_words = _words(question)
+    candidates = []
+    pruned_tokens = 0
+    for order, part in enumerate(parts):
+        original_tokens = part["end_token"] - part["start_token"] + 1
+        env = _envelope(part)
+        if env is None:
+            # not an envelope (prose fallback): score the raw text
+            content = part["content"]
+            score = len(question_words & _words(content))
+        else:
+            data = prune_envelope(env["path"], env["data"], roots)
+            if data is None or data == [] or data == {}:
+                pruned_tokens += original_tokens
+                continue
+            content = render(env["path"], data, encoding)
+            score = score_part(env["path"], data, question_words)
+        tokens = count_tokens(content)
+        pruned_tokens += max(0, original_tokens - tokens)
+        candidates.append({"order": order, "score": score, "tokens": tokens, "content": content})
+
+    kept, used = [], 0
+    for c in sorted(candidates, key=lambda c: (-c["score"], c["order"])):
+        if used + c["tokens"] <= token_budget:
+            kept.append(c)
+            used += c["tokens"]
+    kept.sort(key=lambda c: c["order"])
+    dropped_tokens = sum(c["tokens"] for c in candidates) - used
+
+    packed, running_tok = [], 0
+    for idx, c in enumerate(kept):
+        packed.append({
+            "index": idx,
+            "total": len(kept),
+            "content": c["content"],
+            "sha256": hashlib.sha256(c["content"].encode("utf-8")).hexdigest(),
+            "start_token": running_tok,
+            "end_token": running_tok + c["tokens"] - 1,
+        })
+        running_tok += c["tokens"]
+
+    return {
+        "parts": packed,
+        "kept_tokens": used,
+        "dropped_tokens": dropped_tokens,
+        "pruned_tokens": pruned_tokens,
+        "kept_parts": len(kept),
+        "dropped_parts": len(candidates) - len(kept),
+    }
@@ -0,0 +1,13 @@
+"""
+Loads HackathonBE/.env into the process environment. Modules read their tunables with
+os.getenv when they are imported, so every module that has one imports this first
+(`import envConfig  # noqa: F401`); that also covers the build CLIs and benchmarks,
+which never import app.py. Variables already set in the environment win over the file.
+"""
+import os
+
+from dotenv import load_dotenv
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+load_dotenv(ENV_PATH)
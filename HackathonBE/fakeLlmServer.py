@@ -0,0 +1,126 @@
+"""
+Minimal OpenAI-compatible stand-in for LM Studio, for local testing and load tests.
+
+    python fakeLlmServer.py --port 1234 --ttft 0.4 --token-delay 0.02
+    python fakeLlmServer.py --port 1234 --count 3 --parallel 2    # three backends, 2 slots each
+
+POST /v1/chat/completions answers with a canned reply that echoes the last user
+message, either as one JSON body or as SSE deltas when "stream": true. With --parallel,
+like a real GPU box, only that many generations run at once and the rest wait.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "This is a canned answer from the fake LLM server. You asked: {question}"
+
+
+class FakeLlmHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ttft = 0.0          # seconds before the first token
+    token_delay = 0.0   # seconds between streamed tokens
+    slots = None        # threading.Semaphore bounding concurrent generations, None = unbounded
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply_tokens(self, messages: list) -> list:
+        question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        return REPLY.format(question=question[:200]).split(" ")
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self.send_error(404)
+            return
+        if self.slots is None:
+            self._generate()
+        else:
+            with self.slots:
+                self._generate()
+
+    def _generate(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        messages = body.get("messages") or []
+        tokens = self._reply_tokens(messages)
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        time.sleep(self.ttft)
+
+        if not body.get("stream"):
+            time.sleep(self.token_delay * len(tokens))
+            payload = json.dumps({
+                "id": "fake-1", "object": "chat.completion", "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(tokens)}}],
+                "usage": usage,
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(obj):
+            data = obj if isinstance(obj, str) else json.dumps(obj)
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for i, tok in enumerate(tokens):
+            send({"object": "chat.completion.chunk",
+                  "choices": [{"index": 0, "delta": {"content": tok if i == 0 else " " + tok}, "finish_reason": None}]})
+            time.sleep(self.token_delay)
+        send({"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send({"object": "chat.completion.chunk", "choices": [], "usage": usage})
+        send("[DONE]")
+        self.close_connection = True
+
+
+def start_fake_llm(port: int = 0, ttft: float = 0.0, token_delay: float = 0.0,
+                   parallel: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the fake server on a daemon thread. port=0 picks a free port; parallel > 0
+    caps the generations it runs at once.
+
+    Returns:
+        The running server; its URL is f"http://127.0.0.1:{server.server_port}/v1/chat/completions".
+    """
+    handler = type("ConfiguredFakeLlmHandler", (FakeLlmHandler,), {
+        "ttft": ttft, "token_delay": token_delay,
+        "slots": threading.Semaphore(parallel) if parallel > 0 else None,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between tokens")
+    parser.add_argument("--parallel", type=int, default=0, help="generations at once per server, 0 = unbounded")
+    parser.add_argument("--count", type=int, default=1, help="servers to start on consecutive ports")
+    args = parser.parse_args()
+    servers = [start_fake_llm(args.port + i, args.ttft, args.token_delay, args.parallel) for i in range(args.count)]
+    urls = [f"http://127.0.0.1:{s.server_port}/v1/chat/completions" for s in servers]
+    for url in urls:
+        print(f"Fake LLM listening on {url}")
+    if len(urls) > 1:
+        print(f"LLM_BACKENDS={','.join(urls)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
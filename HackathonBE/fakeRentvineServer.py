@@ -0,0 +1,122 @@
+"""
+Local stand-in for the Rentvine manager API, serving the recorded fixtures in
+fixtures/rentvine/, for offline development, benchmarks and load tests.
+
+    python fakeRentvineServer.py --port 8765 --latency 0.15
+    # then ask about pages on that host, e.g. "url": "http://127.0.0.1:8765/portfolios/391"
+
+Work orders, portfolios (with their ledger) and accounting diagnostics are served; the
+record's primary ID is rewritten to the requested one, so every ID is a distinct
+payload, and relations are only returned when named in ?includes=. Responses carry an
+ETag and honour If-None-Match, like the real API.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "rentvine")
+
+# (API path pattern, fixture file, field that takes the ID from the path, relations that
+# are only returned when named in ?includes=)
+FIXTURES = [
+    (r"/api/manager/maintenance/work-orders/(\d+)", "workOrder.json", "workOrderID", (
+        "vendor", "vendorTrade", "property", "unit", "bills", "assignees", "portfolio", "portfolioBalances",
+        "owners", "lease", "leaseBalances", "leaseTenants", "inspection", "workOrderProject", "associations",
+        "review",
+    )),
+    (r"/api/manager/portfolios/(\d+)", "portfolio.json", "portfolioID",
+     ("owners", "properties", "posting", "statementSetting", "ledger")),
+    (r"/api/manager/accounting/ledgers/(\d+)", "ledger.json", "ledgerID", ("balances",)),
+    (r"/api/manager/accounting/accounts", "accounts.json", None, ()),
+    (r"/api/manager/accounting/diagnostics", "diagnostics.json", None, ()),
+]
+
+
+def load_fixtures(fixtures_dir: str = FIXTURES_DIR) -> list:
+    """Returns [(compiled pattern, parsed fixture, id field, relations)]."""
+    out = []
+    for pattern, name, id_field, relations in FIXTURES:
+        with open(os.path.join(fixtures_dir, name), encoding="utf-8") as f:
+            out.append((re.compile(pattern + "$"), json.load(f), id_field, frozenset(relations)))
+    return out
+
+
+class FakeRentvineHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0       # seconds per response, like a real round trip plus query time
+    fixtures = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self, path: str, includes: set):
+        for pattern, fixture, id_field, relations in self.fixtures:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            if id_field is None:
+                return fixture
+            # shallow copy: only the ID and the set of included relations change per request
+            body = {k: v for k, v in fixture.items() if k not in relations or k in includes}
+            body[id_field] = int(match.group(1))
+            return body
+        return None
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlsplit(self.path)
+        includes = set(",".join(parse_qs(url.query).get("includes", [])).split(","))
+        body = self._body(url.path.rstrip("/"), includes)
+        if body is None:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode("utf-8")
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_fake_rentvine(port: int = 0, latency: float = 0.0, fixtures_dir: str = FIXTURES_DIR) -> ThreadingHTTPServer:
+    """
+    Start the fake API on a daemon thread. port=0 picks a free port.
+
+    Returns:
+        The running server; page URLs are f"http://127.0.0.1:{server.server_port}/<page path>".
+    """
+    handler = type("ConfiguredFakeRentvineHandler", (FakeRentvineHandler,), {
+        "latency": latency, "fixtures": load_fixtures(fixtures_dir),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Rentvine API serving recorded fixtures")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per response")
+    args = parser.parse_args()
+    server = start_fake_rentvine(args.port, args.latency)
+    print(f"Fake Rentvine API on http://127.0.0.1:{server.server_port} "
+          f"(pages: /maintenance/work-orders/<id>, /portfolios/<id>, /accounting/diagnostics)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,160 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import envConfig  # noqa: F401
+from jsonCodec import loads
+from responseCache import CacheEntry, ResponseCache, get_cache
+from telemetry import observe_fetch
+
+# Rentvine dev hosts use self-signed certificates (same as test.py)
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Tunables (override in .env)
+POOL_SIZE = int(os.getenv("FETCH_POOL_SIZE", "32"))          # keep-alive connections per host
+MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "16"))      # concurrent upstream calls per process
+RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+BACKOFF = float(os.getenv("FETCH_BACKOFF", "0.3"))           # 0.3s, 0.6s, 1.2s ...
+DEFAULT_TIMEOUT = (3.05, 20)                                 # (connect, read) seconds
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        backoff_factor=BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_SIZE, max_retries=retry, pool_block=False)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.verify = False
+    session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+def get_session() -> requests.Session:
+    """Process-wide pooled session; TLS connections are reused across requests."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="rentvine-fetch")
+    return _executor
+
+
+def get_json(url: str, auth: tuple | None = None, timeout=DEFAULT_TIMEOUT, ttl: float = 0):
+    """
+    GET a Rentvine API URL over the shared pool and return the decoded JSON body
+    (decoded from the raw bytes with jsonCodec, which skips requests' charset sniffing).
+    Transient failures (connect errors, 429/5xx) are retried with exponential backoff.
+
+    With ttl > 0 the response is served from responseCache while fresh; once stale it is
+    revalidated with If-None-Match / If-Modified-Since when the upstream sent validators.
+
+    Raises:
+        requests.RequestException if the call still fails after retries.
+    """
+    started, outcome = time.perf_counter(), "error"
+    try:
+        body, outcome = _get_json(url, auth, timeout, ttl)
+        return body
+    finally:
+        observe_fetch(time.perf_counter() - started, outcome)
+
+
+def _get_json(url: str, auth: tuple | None, timeout, ttl: float) -> tuple:
+    """get_json() without timing; returns (body, cache outcome)."""
+    cache = get_cache() if ttl > 0 else None
+    if cache is None:
+        response = get_session().get(url, auth=auth, timeout=timeout)
+        response.raise_for_status()
+        return loads(response.content), "uncached"
+
+    key = ResponseCache.make_key(url, auth)
+    entry = cache.get(key)
+    if entry is not None and entry.fresh:
+        cache.record("hits")
+        return loads(entry.body), "hit"
+
+    headers = entry.validators if entry is not None else {}
+    response = get_session().get(url, auth=auth, timeout=timeout, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        cache.record("revalidated")
+        cache.touch(key, entry, ttl)
+        return loads(entry.body), "revalidated"
+    response.raise_for_status()
+    cache.record("misses")
+
+    if "no-store" not in response.headers.get("Cache-Control", ""):
+        cache.put(key, CacheEntry(
+            response.content,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            time.time() + ttl,
+        ))
+    return loads(response.content), "miss"
+
+
+def fetch_all(urls: list, auth: tuple | None = None, timeout=DEFAULT_TIMEOUT, ttl: float = 0) -> list:
+    """
+    Fetch independent endpoints concurrently.
+
+    Returns:
+        Decoded JSON bodies in the same order as urls. The first failure is re-raised.
+    """
+    if len(urls) == 1:
+        return [get_json(urls[0], auth, timeout, ttl)]
+    # each worker runs in a copy of the caller's context so its timing joins the request trace
+    futures = [get_executor().submit(contextvars.copy_context().run, get_json, u, auth, timeout, ttl)
+               for u in urls]
+    return [f.result() for f in futures]
+
+
+def run_plan(calls: list, build_url, auth: tuple | None = None, timeout=DEFAULT_TIMEOUT, ttl: float = 0) -> dict:
+    """
+    Execute a declarative fetch plan (see routeRegistry.ApiCall). Calls whose .after is
+    None are fetched concurrently; every later wave holds the calls whose dependency has
+    landed. build_url(call, parent_body) returns each call's URL, where parent_body is
+    the response of call.after (None for independent calls).
+
+    Returns:
+        {call.key: decoded JSON body}
+    Raises:
+        ValueError if a call depends on a key that is not in the plan.
+    """
+    results, pending = {}, list(calls)
+    while pending:
+        ready = [c for c in pending if c.after is None or c.after in results]
+        if not ready:
+            raise ValueError(f"Fetch plan cannot run: unresolved dependencies {[c.after for c in pending]}")
+        urls = [build_url(c, results.get(c.after)) for c in ready]
+        for call, body in zip(ready, fetch_all(urls, auth, timeout, ttl)):
+            results[call.key] = body
+        pending = [c for c in pending if c not in ready]
+    return results
@@ -0,0 +1,191 @@
+"""
+HTML to structured text for KB article bodies. The export's bodies are editor HTML
+(<p>&nbsp;</p> spacers, <br> runs, screenshots, nested lists, the odd table); the text
+keeps only what a reader, or the model, needs:
+
+- headings become "## Heading" lines (one "#" per level) and always start a new block;
+- paragraphs are blocks separated by a blank line, so chunk_for_lm_studio's paragraph
+  split sees them; empty ones (spacers, lone images) are dropped;
+- list items are "- item" / "1. item" lines, indented two spaces per nesting level;
+- table rows are "cell | cell" lines;
+- entities are decoded, runs of whitespace collapsed, images, iframes and scripts dropped.
+
+The converter is an incremental HTMLParser: feed() takes the body in any pieces.
+article_text() adds a cache on disk keyed by the sha256 of the HTML, so every build
+step (index, embeddings, store, ingestion) converts an article once per content change.
+"""
+import hashlib
+import os
+import re
+from html.parser import HTMLParser
+
+import envConfig  # noqa: F401
+
+# Default location (override with HTML_CACHE_DIR in .env)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HTML_CACHE_DIR = os.getenv("HTML_CACHE_DIR", os.path.join(BASE_DIR, "index", "html_text"))
+
+CONVERTER_VERSION = 1     # part of the cache key; bump when the output format changes
+
+_BLOCK_TAGS = frozenset({"p", "div", "blockquote", "pre", "section", "article", "header", "footer",
+                         "figure", "figcaption", "caption", "dt", "dd", "hr", "table"})
+_HEADINGS = {f"h{i}": i for i in range(1, 7)}
+_SKIP_TAGS = frozenset({"script", "style", "noscript", "iframe", "svg", "template"})
+_SPACES = re.compile("[ \\t\\r\\f\\v\\xa0\\u200b]+")
+
+
+class HtmlTextConverter(HTMLParser):
+    """Feed HTML in any pieces; close() returns the structured text."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._blocks = []       # (kind, text): kind "li" / "row" blocks join with one newline
+        self._text = []         # pieces of the block being read
+        self._kind = "p"
+        self._prefix = ""
+        self._lists = []        # [ordered, next number] per open list
+        self._items = 0         # open <li> elements; paragraphs inside one stay in its block
+        self._cells = None      # cells of the table row being read
+        self._skip = 0
+
+    # blocks -------------------------------------------------------------------
+
+    def _flush(self):
+        raw = "".join(self._text)
+        self._text = []
+        lines = [_SPACES.sub(" ", line).strip() for line in raw.split("\n")]
+        text = "\n".join(line for line in lines if line)
+        if text:
+            if self._prefix:
+                text = self._prefix + text.replace("\n", "\n" + " " * len(self._prefix))
+            self._blocks.append((self._kind, text))
+        self._kind, self._prefix = "p", ""
+
+    def _start_block(self, kind: str = "p", prefix: str = ""):
+        self._flush()
+        self._kind, self._prefix = kind, prefix
+
+    # parser callbacks ---------------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif self._skip:
+            return
+        elif self._cells is not None and tag not in ("tr", "td", "th", "table"):
+            if tag in _BLOCK_TAGS or tag in ("br", "li"):
+                self._text.append(" ")
+        elif self._items and tag in _BLOCK_TAGS and tag != "table":
+            self._text.append("\n")
+        elif tag in _HEADINGS:
+            self._start_block("h", "#" * _HEADINGS[tag] + " ")
+        elif tag in ("ul", "ol"):
+            self._flush()
+            self._lists.append([tag == "ol", 1])
+        elif tag == "li":
+            depth = max(len(self._lists), 1)
+            marker = "- "
+            if self._lists and self._lists[-1][0]:
+                marker = f"{self._lists[-1][1]}. "
+                self._lists[-1][1] += 1
+            self._start_block("li", "  " * (depth - 1) + marker)
+            self._items += 1
+        elif tag == "tr":
+            self._flush()
+            self._cells = []
+        elif tag == "br":
+            self._text.append("\n")
+        elif tag in _BLOCK_TAGS:
+            self._start_block()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif self._skip:
+            return
+        elif tag in ("td", "th") and self._cells is not None:
+            cell = _SPACES.sub(" ", " ".join("".join(self._text).split())).strip()
+            self._text = []
+            self._cells.append(cell)
+        elif tag == "tr" and self._cells is not None:
+            cells, self._cells = self._cells, None
+            if any(cells):
+                self._blocks.append(("row", " | ".join(cells)))
+        elif self._cells is not None:
+            return
+        elif tag in ("ul", "ol"):
+            self._flush()
+            if self._lists:
+                self._lists.pop()
+            if not self._lists:
+                self._blocks.append(("end", ""))    # the next list is a separate block
+        elif tag == "li":
+            self._flush()
+            self._items = max(self._items - 1, 0)
+        elif self._items and tag in _BLOCK_TAGS and tag != "table":
+            self._text.append("\n")
+        elif tag in _HEADINGS or tag in _BLOCK_TAGS:
+            self._flush()
+            if tag == "table":
+                self._blocks.append(("end", ""))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ("br", "hr", "img"):
+            self.handle_endtag(tag)
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._text.append(data)
+
+    def close(self) -> str:
+        super().close()
+        self._flush()
+        out = []
+        previous = None
+        for kind, text in self._blocks:
+            if not text:
+                previous = kind
+                continue
+            if out:
+                out.append("\n" if kind == previous and kind in ("li", "row") else "\n\n")
+            out.append(text)
+            previous = kind
+        return "".join(out)
+
+
+def html_to_text(html: str) -> str:
+    """Convert one KB 'Article body' HTML cell to structured text (see module docstring)."""
+    if not html:
+        return ""
+    converter = HtmlTextConverter()
+    converter.feed(html)
+    return converter.close()
+
+
+def _cache_path(cache_dir: str, sha: str) -> str:
+    return os.path.join(cache_dir, sha[:2], sha + ".txt")
+
+
+def article_text(html: str, cache_dir: str | None = HTML_CACHE_DIR) -> str:
+    """
+    html_to_text with a content-addressed cache in cache_dir (None disables it). Safe
+    to call from several processes at once: entries are written to a temp name and
+    renamed, and two writers of one entry write the same text.
+    """
+    if not html or cache_dir is None:
+        return html_to_text(html)
+    sha = hashlib.sha256(f"{CONVERTER_VERSION}\0{html}".encode("utf-8")).hexdigest()
+    path = _cache_path(cache_dir, sha)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    text = html_to_text(html)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return text
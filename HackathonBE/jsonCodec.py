@@ -0,0 +1,47 @@
+"""
+JSON encoding and decoding for the request path (Rentvine bodies, cached responses,
+payload fingerprints, context envelopes), backed by orjson when it is installed and
+the standard library otherwise. Output is the same text either way (up to how tiny or
+huge floats spell their exponent): compact dumps use no whitespace, pretty dumps
+indent=2, and non-ASCII characters are kept as they are.
+
+    pip install orjson      # optional; several times faster on large ledgers
+"""
+import json
+import os
+
+import envConfig  # noqa: F401
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Tunables (override in .env)
+if os.getenv("JSON_FAST", "1") == "0":    # force the standard library, e.g. to compare
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _COMPACT = orjson.OPT_NON_STR_KEYS
+    _PRETTY = orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2
+
+
+def loads(data):
+    """Decode a JSON document from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value, pretty: bool = False) -> str:
+    """Compact JSON (or indent=2 with pretty) as a str."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=_PRETTY if pretty else _COMPACT).decode("utf-8")
+        except TypeError:
+            pass    # a type orjson does not serialize (e.g. an int subclass); the slow path does
+    if pretty:
+        return json.dumps(value, ensure_ascii=False, indent=2)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
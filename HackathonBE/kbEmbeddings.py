@@ -0,0 +1,314 @@
+import glob
+import hashlib
+import json
+import math
+import os
+import sys
+import zlib
+
+import numpy as np
+
+import envConfig  # noqa: F401
+from htmlText import article_text
+from kbIndex import BASE_DIR, KB_CSV_PATH, iter_kb_rows, tokenize
+from telemetry import get_logger
+
+# Artifacts live next to the BM25 index (override with EMBEDDINGS_DIR in .env)
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", os.path.join(BASE_DIR, "index"))
+TRAINING_DIR = os.path.join(BASE_DIR, "..", "TrainingData", "IndividualData")
+LOCAL_MODEL = os.getenv("EMBEDDINGS_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+MATRIX_FILE = "embeddings.npy"
+SCALES_FILE = "embeddings_scales.npy"
+MANIFEST_FILE = "embeddings.json"
+
+BATCH_SIZE = 64
+MAX_DOC_CHARS = 4000      # articles are truncated before embedding; the head carries the topic
+SNIPPET_CHARS = 320
+TOPIC_FIELDS = ("explanation", "examples", "solution", "best_practices", "key_points")
+
+log = get_logger("kbEmbeddings")
+
+
+class HashingEmbedder:
+    """
+    Deterministic, dependency-free embedder: signed feature hashing of unigrams and
+    bigrams, log-scaled and L2-normalised. Uses crc32 (not hash()) so vectors are stable
+    across processes and machines, which keeps it usable for offline builds and tests.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> dict:
+        toks = tokenize(text)
+        feats = {}
+        for i, t in enumerate(toks):
+            for f in (t, toks[i - 1] + " " + t) if i else (t,):
+                h = zlib.crc32(f.encode("utf-8"))
+                col = h % self.dim
+                sign = 1.0 if (h >> 31) & 1 else -1.0
+                feats[col] = feats.get(col, 0.0) + sign
+        return feats
+
+    def embed(self, texts: list) -> np.ndarray:
+        rows, cols, vals = [], [], []
+        for r, text in enumerate(texts):
+            for c, v in self._features(text).items():
+                rows.append(r); cols.append(c)
+                vals.append(math.copysign(1 + math.log(abs(v)), v) if v else 0.0)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        out[rows, cols] = vals
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+class LocalEmbedder:
+    """CPU-only sentence-transformers backend (optional dependency)."""
+
+    def __init__(self, model_name: str = LOCAL_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = f"local:{model_name}"
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list) -> np.ndarray:
+        vecs = self.model.encode(texts, batch_size=BATCH_SIZE, normalize_embeddings=True,
+                                 convert_to_numpy=True, show_progress_bar=False)
+        return np.ascontiguousarray(vecs, dtype=np.float32)
+
+
+def get_embedder(backend: str = "auto"):
+    """
+    Return an embedder for 'local', 'hashing' or 'auto' (local when sentence-transformers
+    is installed, hashing otherwise).
+    """
+    if backend in ("local", "auto") or backend.startswith("local:"):
+        try:
+            model = backend.split(":", 1)[1] if backend.startswith("local:") else LOCAL_MODEL
+            return LocalEmbedder(model)
+        except ImportError:
+            if backend != "auto":
+                raise
+            log.warning("sentence-transformers not installed; using hashing embedder")
+    return HashingEmbedder()
+
+
+def iter_documents(csv_path: str = KB_CSV_PATH, training_dir: str = TRAINING_DIR):
+    """
+    Yield every retrievable document as a dict with id, source, title, url, text.
+    KB articles are keyed by URL; TrainingData topics by file and topic name.
+    """
+    for row in iter_kb_rows(csv_path):
+        url = (row.get("Article URL") or "").strip()
+        title = (row.get("Article title") or "").strip()
+        body = article_text(row.get("Article body") or "")
+        text = "\n".join(p for p in (title, row.get("Article subtitle") or "", body) if p)
+        yield {"id": f"kb:{url}", "source": "kb", "title": title, "url": url, "text": text[:MAX_DOC_CHARS]}
+    yield from iter_training_topics(training_dir)
+
+
+def _topic_values(topic: dict, field: str) -> list:
+    """A list field of a topic; a few topics hold a single string instead of a list."""
+    values = topic.get(field) or []
+    return [values] if isinstance(values, str) else values
+
+
+def topic_outline(topic: dict) -> str:
+    """
+    A TrainingData topic as "#"-heading text for section-aware chunking
+    (chunk_for_lm_studio(sections=True)): the topic and its explanation, then one
+    sub-section per list field.
+    """
+    parts = [f"# {topic.get('topic', '')}", topic.get("explanation", "")]
+    for field in TOPIC_FIELDS[1:]:
+        values = _topic_values(topic, field)
+        if values:
+            parts.append(f"## {field.replace('_', ' ').title()}")
+            parts.append("\n".join(f"- {v}" for v in values))
+    return "\n\n".join(p for p in parts if p)
+
+
+def iter_training_topics(training_dir: str = TRAINING_DIR):
+    """
+    Yield the TrainingData topics as documents (see iter_documents); ids are
+    td:<domain file>:<topic>, and "outline" holds the topic_outline() text.
+    """
+    for path in sorted(glob.glob(os.path.join(training_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        domain = os.path.splitext(os.path.basename(path))[0]
+        for section in data.values():
+            for topic in section.get("topics", []):
+                lines = [topic.get("topic", ""), topic.get("explanation", "")]
+                for field in TOPIC_FIELDS[1:]:
+                    values = _topic_values(topic, field)
+                    if values:
+                        lines.append(f"{field.replace('_', ' ').title()}: " + " ".join(map(str, values)))
+                yield {
+                    "id": f"td:{domain}:{topic.get('topic', '')}",
+                    "source": "training",
+                    "title": topic.get("topic", ""),
+                    "url": "",
+                    "text": "\n".join(l for l in lines if l),
+                    "outline": topic_outline(topic),
+                }
+
+
+def _quantize(matrix: np.ndarray):
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def _load_existing(out_dir: str):
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None, None
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    matrix = np.load(os.path.join(out_dir, MATRIX_FILE), mmap_mode="r")
+    if manifest.get("dtype") == "int8":
+        scales = np.load(os.path.join(out_dir, SCALES_FILE))
+        matrix = matrix.astype(np.float32) * scales[:, None]
+    return manifest, matrix
+
+
+def build_embeddings(out_dir: str = EMBEDDINGS_DIR, backend: str = "auto", quantize: bool = False,
+                     csv_path: str = KB_CSV_PATH, training_dir: str = TRAINING_DIR) -> dict:
+    """
+    Embed all KB articles and TrainingData topics into a contiguous matrix.
+
+    The build is incremental: rows whose document id and content hash match the
+    previous manifest (same embedder, same dim) are copied over, and only new or
+    changed documents are embedded, in batches of BATCH_SIZE.
+
+    Returns:
+        Counts of total, reused and embedded documents.
+    """
+    embedder = get_embedder(backend)
+    docs = list(iter_documents(csv_path, training_dir))
+    for d in docs:
+        d["hash"] = hashlib.sha256(d["text"].encode("utf-8")).hexdigest()
+
+    old_manifest, old_matrix = _load_existing(out_dir)
+    previous = {}
+    if old_manifest and old_manifest.get("embedder") == embedder.name and old_manifest.get("dim") == embedder.dim:
+        previous = {(e["id"], e["hash"]): i for i, e in enumerate(old_manifest["entries"])}
+
+    matrix = np.empty((len(docs), embedder.dim), dtype=np.float32)
+    todo = []
+    for i, d in enumerate(docs):
+        row = previous.get((d["id"], d["hash"]))
+        if row is None:
+            todo.append(i)
+        else:
+            matrix[i] = old_matrix[row]
+    for start in range(0, len(todo), BATCH_SIZE):
+        batch = todo[start:start + BATCH_SIZE]
+        matrix[batch] = embedder.embed([docs[i]["text"] for i in batch])
+    del old_matrix
+
+    os.makedirs(out_dir, exist_ok=True)
+    if quantize:
+        stored, scales = _quantize(matrix)
+        np.save(os.path.join(out_dir, SCALES_FILE + ".tmp.npy"), scales)
+        os.replace(os.path.join(out_dir, SCALES_FILE + ".tmp.npy"), os.path.join(out_dir, SCALES_FILE))
+    else:
+        stored = matrix
+    np.save(os.path.join(out_dir, MATRIX_FILE + ".tmp.npy"), stored)
+    os.replace(os.path.join(out_dir, MATRIX_FILE + ".tmp.npy"), os.path.join(out_dir, MATRIX_FILE))
+
+    manifest = {
+        "embedder": embedder.name,
+        "dim": embedder.dim,
+        "dtype": "int8" if quantize else "float32",
+        "entries": [
+            {
+                "id": d["id"], "hash": d["hash"], "source": d["source"], "title": d["title"], "url": d["url"],
+                "snippet": " ".join(d["text"].split())[:SNIPPET_CHARS],
+            }
+            for d in docs
+        ],
+    }
+    tmp = os.path.join(out_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST_FILE))
+    return {"total": len(docs), "reused": len(docs) - len(todo), "embedded": len(todo)}
+
+
+class EmbeddingIndex:
+    """
+    Query-time view of a build_embeddings() output. The matrix is memory-mapped, so
+    workers share the OS page cache; scoring is one matrix-vector product.
+    """
+
+    def __init__(self, out_dir: str = EMBEDDINGS_DIR, embedder=None):
+        with open(os.path.join(out_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.entries = manifest["entries"]
+        self.sources = np.array([e["source"] for e in self.entries])
+        self.matrix = np.load(os.path.join(out_dir, MATRIX_FILE), mmap_mode="r")
+        self.scales = np.load(os.path.join(out_dir, SCALES_FILE)) if manifest["dtype"] == "int8" else None
+        if embedder is None:
+            name = manifest["embedder"]
+            embedder = HashingEmbedder(manifest["dim"]) if name == "hashing" else get_embedder(name)
+        if embedder.dim != manifest["dim"]:
+            raise ValueError(f"Embedder dim {embedder.dim} does not match index dim {manifest['dim']}")
+        self.embedder = embedder
+
+    def search(self, question: str, k: int = 5, source: str | None = None) -> list:
+        """
+        Returns:
+            Up to k entries (id, source, title, url, snippet, score), best first.
+            source restricts results to 'kb' or 'training'.
+        """
+        n = len(self.entries)
+        if not n:
+            return []
+        q = self.embedder.embed([question])[0]
+        scores = self.matrix @ q
+        if self.scales is not None:
+            scores = scores * self.scales
+        if source:
+            scores = np.where(self.sources == source, scores, -np.inf)
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.entries[i], score=round(float(scores[i]), 4)) for i in top if np.isfinite(scores[i])]
+
+
+_index = None
+
+
+def get_embedding_index():
+    """Lazily open the shared embedding index; None if it has not been built."""
+    global _index
+    if _index is None:
+        if not os.path.exists(os.path.join(EMBEDDINGS_DIR, MANIFEST_FILE)):
+            log.warning("Embedding index not found in %s; run `python kbEmbeddings.py build`", EMBEDDINGS_DIR)
+            _index = False
+        else:
+            _index = EmbeddingIndex(EMBEDDINGS_DIR)
+    return _index or None
+
+
+def search_semantic(question: str, k: int = 5, source: str | None = None) -> list:
+    index = get_embedding_index()
+    return index.search(question, k, source) if index else []
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "build":
+        backend = next((a.split("=", 1)[1] for a in args if a.startswith("--backend=")), "auto")
+        stats = build_embeddings(backend=backend, quantize="--int8" in args)
+        print(f"Embeddings: {stats['total']} docs ({stats['reused']} reused, {stats['embedded']} embedded) -> {EMBEDDINGS_DIR}")
+    else:
+        question = " ".join(args) or "why is there an escrow mismatch"
+        for hit in search_semantic(question, k=5):
+            print(f"{hit['score']:7.3f}  [{hit['source']}] {hit['title']}  {hit['url']}")
@@ -0,0 +1,267 @@
+import csv
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import heapq
+from array import array
+
+import envConfig  # noqa: F401
+from htmlText import article_text
+from telemetry import get_logger
+
+# Default locations (override with KB_CSV_PATH / KB_INDEX_PATH in .env)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KB_CSV_PATH = os.getenv("KB_CSV_PATH", os.path.join(BASE_DIR, "..", "KB20251012.csv"))
+KB_INDEX_PATH = os.getenv("KB_INDEX_PATH", os.path.join(BASE_DIR, "index", "kb.idx"))
+
+log = get_logger("kbIndex")
+
+# On-disk layout:
+#   header  : magic, byte order, doc/term counts, avgdl, then (offset, length) per section
+#   sections: every array is written in native byte order and 4-byte aligned so the
+#             reader can memoryview.cast() straight over the mmap without copying
+MAGIC = b"KBX1"
+SECTIONS = ("doc_len", "str_bounds", "strings", "term_bounds", "terms", "post_bounds", "post_docs", "post_tfs")
+HEADER = struct.Struct("<4sBxxxIId" + "II" * len(SECTIONS))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_BOOST = 3          # title tokens are counted this many times
+SNIPPET_CHARS = 320
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my no not of on or so than that the their then there these this to up was we what
+when where which who why will with you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase alphanumeric tokens with stopwords and single characters removed."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def iter_kb_rows(csv_path: str = KB_CSV_PATH, published_only: bool = True):
+    """
+    Stream rows from a KB export CSV, yielding only Published, non-archived articles
+    unless published_only is False. Bodies can be far larger than the csv module's
+    default field limit.
+    """
+    csv.field_size_limit(sys.maxsize)
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            if not published_only:
+                yield row
+                continue
+            if (row.get("Status") or "").strip().upper() != "PUBLISHED":
+                continue
+            if (row.get("Archived") or "").strip().lower() == "true":
+                continue
+            yield row
+
+
+def _snippet(subtitle: str, body_text: str) -> str:
+    text = subtitle.strip() or body_text
+    text = " ".join(text.split())
+    if len(text) <= SNIPPET_CHARS:
+        return text
+    return text[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "..."
+
+
+def _write_aligned(f, data: bytes) -> tuple:
+    pad = (-f.tell()) % 4
+    if pad:
+        f.write(b"\0" * pad)
+    offset = f.tell()
+    f.write(data)
+    return offset, len(data)
+
+
+def build_index(csv_path: str = KB_CSV_PATH, index_path: str = KB_INDEX_PATH) -> int:
+    """
+    Given a KB export CSV, strip every article body once and write a BM25 inverted index
+    to index_path. The file is written to a temp name and renamed so running workers never
+    see a half-written index.
+
+    Returns:
+        Number of indexed articles.
+    """
+    doc_len = array("I")
+    strings = []
+    postings = {}   # term -> list of (doc_id, tf)
+
+    for doc_id, row in enumerate(iter_kb_rows(csv_path)):
+        title = (row.get("Article title") or "").strip()
+        subtitle = row.get("Article subtitle") or ""
+        body_text = article_text(row.get("Article body") or "")
+
+        tokens = tokenize(title) * TITLE_BOOST
+        tokens += tokenize(subtitle) + tokenize(row.get("Keywords") or "") + tokenize(body_text)
+        tfs = {}
+        for t in tokens:
+            tfs[t] = tfs.get(t, 0) + 1
+        for t, tf in tfs.items():
+            postings.setdefault(t, []).append((doc_id, min(tf, 0xFFFF)))
+
+        doc_len.append(len(tokens))
+        strings.extend((title, (row.get("Article URL") or "").strip(), _snippet(subtitle, body_text)))
+
+    n_docs = len(doc_len)
+    avgdl = (sum(doc_len) / n_docs) if n_docs else 0.0
+
+    str_bounds, blob = array("I", [0]), bytearray()
+    for s in strings:
+        blob += s.encode("utf-8")
+        str_bounds.append(len(blob))
+
+    terms = sorted(postings, key=lambda t: t.encode("utf-8"))
+    term_bounds, term_blob = array("I", [0]), bytearray()
+    post_bounds, post_docs, post_tfs = array("I", [0]), array("I"), array("H")
+    for t in terms:
+        term_blob += t.encode("utf-8")
+        term_bounds.append(len(term_blob))
+        for d, tf in postings[t]:
+            post_docs.append(d)
+            post_tfs.append(tf)
+        post_bounds.append(len(post_docs))
+
+    payloads = {
+        "doc_len": doc_len.tobytes(),
+        "str_bounds": str_bounds.tobytes(),
+        "strings": bytes(blob),
+        "term_bounds": term_bounds.tobytes(),
+        "terms": bytes(term_blob),
+        "post_bounds": post_bounds.tobytes(),
+        "post_docs": post_docs.tobytes(),
+        "post_tfs": post_tfs.tobytes(),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        spans = []
+        for name in SECTIONS:
+            spans.extend(_write_aligned(f, payloads[name]))
+        f.seek(0)
+        byte_order = 0 if sys.byteorder == "little" else 1
+        f.write(HEADER.pack(MAGIC, byte_order, n_docs, len(terms), avgdl, *spans))
+    os.replace(tmp_path, index_path)
+    return n_docs
+
+
+class KbIndex:
+    """
+    Read-only view over an index written by build_index().
+    Every section is a zero-copy memoryview into one shared mmap, so any number of
+    workers can open the same file and the OS page cache holds a single copy.
+    """
+
+    def __init__(self, index_path: str = KB_INDEX_PATH):
+        self.path = index_path
+        with open(index_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = HEADER.unpack_from(self._mm, 0)
+        magic, byte_order, self.n_docs, self.n_terms, self.avgdl = fields[:5]
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} is not a KB index (bad magic)")
+        if byte_order != (0 if sys.byteorder == "little" else 1):
+            raise ValueError(f"{index_path} was built on a different byte order; rebuild it")
+
+        view = memoryview(self._mm)
+        spans = fields[5:]
+        formats = {"strings": None, "terms": None, "post_tfs": "H"}
+        for i, name in enumerate(SECTIONS):
+            off, length = spans[2 * i], spans[2 * i + 1]
+            section = view[off:off + length]
+            fmt = formats.get(name, "I")
+            setattr(self, "_" + name, section.cast(fmt) if fmt else section)
+
+    def _string(self, i: int) -> str:
+        return bytes(self._strings[self._str_bounds[i]:self._str_bounds[i + 1]]).decode("utf-8")
+
+    def _find_term(self, term: bytes) -> int:
+        lo, hi = 0, self.n_terms
+        bounds, terms = self._term_bounds, self._terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = terms[bounds[mid]:bounds[mid + 1]]
+            if cur == term:
+                return mid
+            if bytes(cur) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def document(self, doc_id: int) -> dict:
+        return {
+            "title": self._string(3 * doc_id),
+            "url": self._string(3 * doc_id + 1),
+            "snippet": self._string(3 * doc_id + 2),
+        }
+
+    def search(self, question: str, k: int = 3) -> list:
+        """
+        Score the question against the index with Okapi BM25.
+
+        Returns:
+            Up to k dicts with title, url, snippet and score, best first.
+        """
+        if not self.n_docs:
+            return []
+        scores = {}
+        doc_len, avgdl = self._doc_len, self.avgdl or 1.0
+        for term in set(tokenize(question)):
+            t = self._find_term(term.encode("utf-8"))
+            if t < 0:
+                continue
+            start, end = self._post_bounds[t], self._post_bounds[t + 1]
+            idf = math.log(1 + (self.n_docs - (end - start) + 0.5) / ((end - start) + 0.5))
+            for i in range(start, end):
+                d, tf = self._post_docs[i], self._post_tfs[i]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[d] / avgdl)
+                scores[d] = scores.get(d, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [dict(self.document(d), score=round(s, 4)) for d, s in top]
+
+
+_index = None
+
+
+def get_kb_index():
+    """
+    Lazily open the shared KB index. Returns None (and logs once) if it has not been
+    built yet so /api/query keeps working without knowledge base sources.
+    """
+    global _index
+    if _index is None:
+        if not os.path.exists(KB_INDEX_PATH):
+            log.warning("KB index not found at %s; run `python kbIndex.py build`", KB_INDEX_PATH)
+            _index = False
+        else:
+            _index = KbIndex(KB_INDEX_PATH)
+    return _index or None
+
+
+def search_kb(question: str, k: int = 3) -> list:
+    index = get_kb_index()
+    return index.search(question, k) if index else []
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else KB_CSV_PATH
+        index_path = sys.argv[3] if len(sys.argv) > 3 else KB_INDEX_PATH
+        n = build_index(csv_path, index_path)
+        print(f"Indexed {n} articles -> {index_path} ({os.path.getsize(index_path)} bytes)")
+    else:
+        question = " ".join(sys.argv[1:]) or "how do I create a new portfolio"
+        for hit in search_kb(question, k=5):
+            print(f"{hit['score']:8.3f}  {hit['title']}  {hit['url']}")
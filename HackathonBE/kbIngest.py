@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import envConfig  # noqa: F401
+from htmlText import CONVERTER_VERSION, article_text
+from kbEmbeddings import TRAINING_DIR, iter_training_topics
+from kbIndex import BASE_DIR, KB_CSV_PATH, iter_kb_rows
+from promptParsing import chunk_for_lm_studio
+
+# Pre-chunked article shards (override with KB_SHARDS_DIR / KB_CHUNK_TOKENS / KB_CHUNK_SECTIONS in .env)
+KB_SHARDS_DIR = os.getenv("KB_SHARDS_DIR", os.path.join(BASE_DIR, "index", "kb_shards"))
+CHUNK_TOKENS = int(os.getenv("KB_CHUNK_TOKENS", "800"))
+# Articles and topics are chunked on their headings (chunk_for_lm_studio(sections=True)),
+# each chunk carrying its parent headings; KB_CHUNK_SECTIONS=0 restores the paragraph split
+CHUNK_SECTIONS = os.getenv("KB_CHUNK_SECTIONS", "1") != "0"
+# chunk_for_lm_studio trims an overlapped chunk back to the cap, which cuts its tail,
+# so paragraph-split articles are chunked without overlap unless asked for
+CHUNK_OVERLAP = 0
+
+MANIFEST_FILE = "manifest.json"
+POOL_THRESHOLD = 64       # exports with fewer changed articles are chunked in-process
+BATCH_SIZE = 256          # rows handed to the pool at a time, so the CSV is never fully in memory
+
+# On-disk layout:
+#   <dir>/manifest.json         url (td:<domain>:<topic> for TrainingData topics)
+#                               -> {title, modified, hash, chunks: [{sha256, tokens}, ...]}
+#   <dir>/ab/abcdef...0123.txt  one chunk, named by the sha256 chunk_for_lm_studio computed
+# Identical chunks (shared boilerplate, unchanged articles) are stored once.
+
+
+def _row_hash(row: dict) -> str:
+    raw = "\0".join(row.get(f) or "" for f in ("Article title", "Article subtitle", "Article body"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _shard_path(out_dir: str, sha: str) -> str:
+    return os.path.join(out_dir, sha[:2], sha + ".txt")
+
+
+def _chunk_article(job: tuple) -> tuple:
+    """
+    Pool worker: HTML -> text (cached by content hash) -> chunks; body_html None means
+    subtitle already holds the text (a TrainingData topic outline).
+    Returns (url, [(sha256, tokens, content), ...]).
+    """
+    url, title, subtitle, body_html, max_tokens, overlap, sections = job
+    if body_html is None:
+        text = subtitle
+    else:
+        # in section mode the title is the top heading, so it leads every chunk's breadcrumb
+        head = f"# {title}" if sections and title else title
+        text = "\n\n".join(p for p in (head, subtitle.strip(), article_text(body_html)) if p)
+    parts = chunk_for_lm_studio(text, max_tokens, overlap_tokens=overlap, sections=sections) if text else []
+    return url, [(p["sha256"], p["end_token"] - p["start_token"] + 1, p["content"]) for p in parts]
+
+
+def _load_manifest(out_dir: str) -> dict:
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_shard(out_dir: str, sha: str, content: str) -> bool:
+    path = _shard_path(out_dir, sha)
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+    return True
+
+
+def _batches(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_kb(csv_path: str = KB_CSV_PATH, out_dir: str = KB_SHARDS_DIR, max_tokens: int = CHUNK_TOKENS,
+              overlap_tokens: int = CHUNK_OVERLAP, workers: int | None = None, sections: bool = CHUNK_SECTIONS,
+              training_dir: str | None = TRAINING_DIR) -> dict:
+    """
+    Stream a KB export, and the TrainingData topics in training_dir (None skips them),
+    into content-addressed chunk shards under out_dir.
+
+    Only Published, non-archived rows are kept (kbIndex.iter_kb_rows). An article is
+    re-chunked when its Last modified date or content hash differs from the previous
+    manifest, or when the chunk settings changed; everything else is carried over.
+    Shards no longer referenced by any article are deleted at the end.
+
+    Returns:
+        Counts of articles, topics, processed, unchanged, removed, chunks_written,
+        chunks_reused and shards_deleted.
+    """
+    previous = _load_manifest(out_dir)
+    settings = {"max_tokens": max_tokens, "overlap_tokens": overlap_tokens, "converter": CONVERTER_VERSION,
+                "sections": sections}
+    old_articles = previous.get("articles", {}) if previous.get("settings") == settings else {}
+
+    articles, meta = {}, {}
+    stats = {"articles": 0, "topics": 0, "processed": 0, "unchanged": 0, "removed": 0,
+             "chunks_written": 0, "chunks_reused": 0, "shards_deleted": 0}
+
+    def changed_jobs():
+        for row in iter_kb_rows(csv_path):
+            url = (row.get("Article URL") or "").strip()
+            if not url or url in meta:
+                continue
+            stats["articles"] += 1
+            modified = (row.get("Last modified date") or "").strip()
+            content_hash = _row_hash(row)
+            meta[url] = {"title": (row.get("Article title") or "").strip(), "modified": modified,
+                         "hash": content_hash}
+            old = old_articles.get(url)
+            if old and old["modified"] == modified and old["hash"] == content_hash:
+                articles[url] = old
+                stats["unchanged"] += 1
+                continue
+            yield (url, meta[url]["title"], row.get("Article subtitle") or "", row.get("Article body") or "",
+                   max_tokens, overlap_tokens, sections)
+        for doc in (iter_training_topics(training_dir) if training_dir else ()):
+            if doc["id"] in meta:
+                continue
+            stats["topics"] += 1
+            content_hash = hashlib.sha256(doc["outline"].encode("utf-8")).hexdigest()
+            meta[doc["id"]] = {"title": doc["title"], "modified": "", "hash": content_hash}
+            old = old_articles.get(doc["id"])
+            if old and old["hash"] == content_hash:
+                articles[doc["id"]] = old
+                stats["unchanged"] += 1
+                continue
+            yield doc["id"], doc["title"], doc["outline"], None, max_tokens, overlap_tokens, sections
+
+    def store(url: str, chunks: list):
+        for sha, _, content in chunks:
+            if _write_shard(out_dir, sha, content):
+                stats["chunks_written"] += 1
+            else:
+                stats["chunks_reused"] += 1
+        articles[url] = dict(meta[url], chunks=[{"sha256": sha, "tokens": n} for sha, n, _ in chunks])
+        stats["processed"] += 1
+
+    os.makedirs(out_dir, exist_ok=True)
+    pool = None
+    try:
+        for batch in _batches(changed_jobs(), BATCH_SIZE):
+            if pool is None and workers != 1 and (workers is not None or len(batch) >= POOL_THRESHOLD):
+                pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+            results = pool.map(_chunk_article, batch, chunksize=8) if pool else map(_chunk_article, batch)
+            for url, chunks in results:
+                store(url, chunks)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    stats["removed"] = len(set(old_articles) - set(articles))
+    manifest = {"source": os.path.basename(csv_path), "settings": settings, "articles": articles}
+    tmp = os.path.join(out_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST_FILE))
+
+    # garbage-collect shards from removed or rewritten articles
+    live = {c["sha256"] for a in articles.values() for c in a["chunks"]}
+    for sub in os.listdir(out_dir):
+        sub_dir = os.path.join(out_dir, sub)
+        if len(sub) != 2 or not os.path.isdir(sub_dir):
+            continue
+        for name in os.listdir(sub_dir):
+            if name.endswith(".txt") and name[:-4] not in live:
+                os.remove(os.path.join(sub_dir, name))
+                stats["shards_deleted"] += 1
+    return stats
+
+
+def read_chunk(sha: str, out_dir: str = KB_SHARDS_DIR) -> str:
+    with open(_shard_path(out_dir, sha), encoding="utf-8") as f:
+        return f.read()
+
+
+def article_chunks(url: str, out_dir: str = KB_SHARDS_DIR) -> list:
+    """LLM-ready chunks of one article (or td:<domain>:<topic> topic), in order, as {sha256, tokens, content} dicts."""
+    article = _load_manifest(out_dir).get("articles", {}).get(url)
+    if not article:
+        return []
+    return [dict(c, content=read_chunk(c["sha256"], out_dir)) for c in article["chunks"]]
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    csv_path = args[0] if args else KB_CSV_PATH
+    out_dir = opts.get("out", KB_SHARDS_DIR)
+    stats = ingest_kb(csv_path, out_dir, max_tokens=int(opts.get("max-tokens", CHUNK_TOKENS)),
+                      workers=int(opts["workers"]) if "workers" in opts else None,
+                      sections=opts.get("sections", "1" if CHUNK_SECTIONS else "0") != "0")
+    print(f"Ingested {stats['articles']} articles from {csv_path} and {stats['topics']} training topics -> {out_dir}: "
+          f"{stats['processed']} chunked, {stats['unchanged']} unchanged, {stats['removed']} removed; "
+          f"{stats['chunks_written']} shards written, {stats['chunks_reused']} reused, "
+          f"{stats['shards_deleted']} deleted")
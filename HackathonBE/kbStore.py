@@ -0,0 +1,299 @@
+"""
+Columnar, memory-mapped store of the whole KB export, for code that needs article
+metadata or text outside a search (pageContext, ad-hoc filtering) without every worker
+holding the rows as dicts.
+
+    python kbStore.py build                     # ../KB20251012.csv -> index/kb.store
+    python kbStore.py build ../KB20251101.csv
+    python kbStore.py Maintenance               # published articles in a category
+
+Every row of the export is kept, drafts and archived ones included, as:
+- fixed-width columns (category, subcategory, status, archived, modified) with the
+  text labels interned once, so filtering compares small integers;
+- a string table with each article's title, subtitle, URL and keywords;
+- one blob of article bodies, already converted from HTML to text. A body (or part of
+  one) is only decoded when it is asked for.
+
+Like kbIndex, every section is a zero-copy memoryview over one shared mmap: opening the
+store reads the header only, and workers share a single copy in the OS page cache, so
+startup time and per-worker memory do not grow with the export.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+
+import envConfig  # noqa: F401
+from htmlText import article_text
+from kbIndex import BASE_DIR, KB_CSV_PATH, iter_kb_rows
+from telemetry import get_logger
+
+# Default location (override with KB_STORE_PATH in .env)
+KB_STORE_PATH = os.getenv("KB_STORE_PATH", os.path.join(BASE_DIR, "index", "kb.store"))
+
+log = get_logger("kbStore")
+
+# On-disk layout, as in kbIndex: header (magic, byte order, counts, a digest of the
+# bodies, then (offset, length) per section) and 4-byte aligned native-order sections
+MAGIC = b"KBS1"
+SECTIONS = ("category", "subcategory", "status", "archived", "modified", "str_bounds", "strings",
+            "label_bounds", "labels", "url_order", "body_bounds", "bodies")
+HEADER = struct.Struct("<4sBxxxII16s" + "II" * len(SECTIONS))
+FIELDS = ("title", "subtitle", "url", "keywords")    # string table entries per article
+PUBLISHED = "PUBLISHED"
+
+
+def _write_aligned(f, data: bytes) -> tuple:
+    pad = (-f.tell()) % 4
+    if pad:
+        f.write(b"\0" * pad)
+    offset = f.tell()
+    f.write(data)
+    return offset, len(data)
+
+
+def _timestamp(value: str) -> int:
+    """'Last modified date' (ISO 8601) as Unix seconds; 0 when missing or unparseable."""
+    try:
+        return int(datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return 0
+
+
+def build_store(csv_path: str = KB_CSV_PATH, store_path: str = KB_STORE_PATH) -> int:
+    """
+    Given a KB export CSV, convert every body to text once and write the store to
+    store_path (via a temp name, so running workers never see a half-written file).
+    Bodies are streamed to the file as they are read; only the metadata is held.
+
+    Returns:
+        Number of stored articles.
+    """
+    labels, label_ids = [], {}
+
+    def label(value: str) -> int:
+        value = (value or "").strip()
+        if value not in label_ids:
+            label_ids[value] = len(labels)
+            labels.append(value)
+        return label_ids[value]
+
+    columns = {name: array(code) for name, code in
+               (("category", "H"), ("subcategory", "H"), ("status", "H"), ("archived", "B"), ("modified", "I"))}
+    str_bounds, strings = array("I", [0]), bytearray()
+    body_bounds = array("I", [0])
+    urls = []
+    digest = hashlib.sha256()
+
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    tmp_path = store_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        bodies_offset = f.tell()
+        for row in iter_kb_rows(csv_path, published_only=False):
+            body = article_text(row.get("Article body") or "").encode("utf-8")
+            f.write(body)
+            digest.update(body)
+            body_bounds.append(body_bounds[-1] + len(body))
+
+            columns["category"].append(label(row.get("Category")))
+            columns["subcategory"].append(label(row.get("Subcategory")))
+            columns["status"].append(label((row.get("Status") or "").upper()))
+            columns["archived"].append((row.get("Archived") or "").strip().lower() == "true")
+            columns["modified"].append(_timestamp(row.get("Last modified date") or ""))
+            url = (row.get("Article URL") or "").strip()
+            urls.append(url)
+            for value in ((row.get("Article title") or "").strip(), (row.get("Article subtitle") or "").strip(),
+                          url, (row.get("Keywords") or "").strip()):
+                strings += value.encode("utf-8")
+                str_bounds.append(len(strings))
+
+        label_bounds, label_blob = array("I", [0]), bytearray()
+        for value in labels:
+            label_blob += value.encode("utf-8")
+            label_bounds.append(len(label_blob))
+        url_order = array("I", sorted(range(len(urls)), key=lambda i: urls[i].encode("utf-8")))
+
+        payloads = {name: col.tobytes() for name, col in columns.items()}
+        payloads.update({
+            "str_bounds": str_bounds.tobytes(),
+            "strings": bytes(strings),
+            "label_bounds": label_bounds.tobytes(),
+            "labels": bytes(label_blob),
+            "url_order": url_order.tobytes(),
+            "body_bounds": body_bounds.tobytes(),
+        })
+        spans = []
+        for name in SECTIONS:
+            spans.extend((bodies_offset, body_bounds[-1]) if name == "bodies" else _write_aligned(f, payloads[name]))
+        f.seek(0)
+        byte_order = 0 if sys.byteorder == "little" else 1
+        f.write(HEADER.pack(MAGIC, byte_order, len(urls), len(labels), digest.digest()[:16], *spans))
+    os.replace(tmp_path, store_path)
+    return len(urls)
+
+
+class KbRecord:
+    """One article of a KbStore; every field is read from the store when accessed."""
+    __slots__ = ("store", "doc_id")
+
+    def __init__(self, store, doc_id: int):
+        self.store = store
+        self.doc_id = doc_id
+
+    title = property(lambda self: self.store.string(self.doc_id, "title"))
+    subtitle = property(lambda self: self.store.string(self.doc_id, "subtitle"))
+    url = property(lambda self: self.store.string(self.doc_id, "url"))
+    keywords = property(lambda self: self.store.string(self.doc_id, "keywords"))
+    category = property(lambda self: self.store.label(self.store._category[self.doc_id]))
+    subcategory = property(lambda self: self.store.label(self.store._subcategory[self.doc_id]))
+    status = property(lambda self: self.store.label(self.store._status[self.doc_id]))
+    archived = property(lambda self: bool(self.store._archived[self.doc_id]))
+    modified = property(lambda self: self.store._modified[self.doc_id])
+
+    @property
+    def body(self) -> str:
+        return self.store.body(self.doc_id)
+
+    def __repr__(self):
+        return f"KbRecord({self.doc_id}, {self.title!r})"
+
+
+class KbStore:
+    """Read-only view over a file written by build_store()."""
+
+    def __init__(self, store_path: str = KB_STORE_PATH):
+        self.path = store_path
+        with open(store_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = HEADER.unpack_from(self._mm, 0)
+        magic, byte_order, self.n_docs, self.n_labels, digest = fields[:5]
+        if magic != MAGIC:
+            raise ValueError(f"{store_path} is not a KB store (bad magic)")
+        if byte_order != (0 if sys.byteorder == "little" else 1):
+            raise ValueError(f"{store_path} was built on a different byte order; rebuild it")
+        self.digest = digest.hex()
+
+        view = memoryview(self._mm)
+        spans = fields[5:]
+        formats = {"category": "H", "subcategory": "H", "status": "H", "archived": "B",
+                   "strings": None, "labels": None, "bodies": None}
+        for i, name in enumerate(SECTIONS):
+            off, length = spans[2 * i], spans[2 * i + 1]
+            section = view[off:off + length]
+            fmt = formats.get(name, "I")
+            setattr(self, "_" + name, section.cast(fmt) if fmt else section)
+        self._label_cache = [None] * self.n_labels
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def __getitem__(self, doc_id: int) -> KbRecord:
+        if not 0 <= doc_id < self.n_docs:
+            raise IndexError(doc_id)
+        return KbRecord(self, doc_id)
+
+    def label(self, label_id: int) -> str:
+        value = self._label_cache[label_id]
+        if value is None:
+            value = self._label_cache[label_id] = bytes(
+                self._labels[self._label_bounds[label_id]:self._label_bounds[label_id + 1]]).decode("utf-8")
+        return value
+
+    def _label_id(self, value: str) -> int:
+        for i in range(self.n_labels):
+            if self.label(i) == value:
+                return i
+        return -1
+
+    def string(self, doc_id: int, field: str) -> str:
+        i = len(FIELDS) * doc_id + FIELDS.index(field)
+        return bytes(self._strings[self._str_bounds[i]:self._str_bounds[i + 1]]).decode("utf-8")
+
+    def body(self, doc_id: int, start: int = 0, end: int | None = None) -> str:
+        """An article's text, or the [start, end) byte range of it; decoded on each call."""
+        lo, hi = self._body_bounds[doc_id], self._body_bounds[doc_id + 1]
+        end = hi - lo if end is None else min(end, hi - lo)
+        return bytes(self._bodies[lo + start:lo + end]).decode("utf-8", errors="ignore")
+
+    def find(self, url: str) -> int:
+        """Doc id of the article with this URL, or -1."""
+        target = url.strip().encode("utf-8")
+        lo, hi = 0, self.n_docs
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = self.string(self._url_order[mid], "url").encode("utf-8")
+            if cur == target:
+                return self._url_order[mid]
+            if cur < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def filter(self, category: str | None = None, subcategory: str | None = None,
+               status: str | None = PUBLISHED, archived: bool | None = False) -> list:
+        """
+        Doc ids matching every given field (None matches anything); by default the
+        Published, non-archived articles, as kbIndex.iter_kb_rows yields them.
+        """
+        wanted = []
+        for column, value in ((self._category, category), (self._subcategory, subcategory),
+                              (self._status, status and status.upper())):
+            if value is not None:
+                label_id = self._label_id(value.strip())
+                if label_id < 0:
+                    return []
+                wanted.append((column, label_id))
+        ids = range(self.n_docs)
+        for column, label_id in wanted:
+            ids = [d for d in ids if column[d] == label_id]
+        if archived is not None:
+            flags = self._archived
+            ids = [d for d in ids if bool(flags[d]) == archived]
+        return list(ids)
+
+    def counts(self, column: str = "category") -> dict:
+        """{label: articles} for the category, subcategory or status column."""
+        out = {}
+        for label_id in getattr(self, "_" + column):
+            name = self.label(label_id)
+            out[name] = out.get(name, 0) + 1
+        return out
+
+
+_store = None
+
+
+def get_kb_store():
+    """Lazily open the shared KB store; None (logged once) if it has not been built."""
+    global _store
+    if _store is None:
+        if not os.path.exists(KB_STORE_PATH):
+            log.warning("KB store not found at %s; run `python kbStore.py build`", KB_STORE_PATH)
+            _store = False
+        else:
+            _store = KbStore(KB_STORE_PATH)
+    return _store or None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else KB_CSV_PATH
+        store_path = sys.argv[3] if len(sys.argv) > 3 else KB_STORE_PATH
+        n = build_store(csv_path, store_path)
+        print(f"Stored {n} articles -> {store_path} ({os.path.getsize(store_path)} bytes)")
+    else:
+        store = get_kb_store()
+        if store is None:
+            sys.exit(1)
+        if len(sys.argv) < 2:
+            for name, n in sorted(store.counts().items(), key=lambda kv: -kv[1]):
+                print(f"{n:5d}  {name or '(none)'}")
+        else:
+            for doc_id in store.filter(category=" ".join(sys.argv[1:])):
+                record = store[doc_id]
+                print(f"{record.subcategory or '-':28s} {record.title}  {record.url}")
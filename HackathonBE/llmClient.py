@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+
+import requests
+
+import envConfig  # noqa: F401
+
+# LM Studio's OpenAI-compatible server (override in .env)
+LM_STUDIO_URL = os.getenv("LM_STUDIO_URL", "http://localhost:1234/v1/chat/completions")
+LM_STUDIO_MODEL = os.getenv("LM_STUDIO_MODEL", "openai/gpt-oss-20b")
+LM_STUDIO_TIMEOUT = (3.05, float(os.getenv("LM_STUDIO_READ_TIMEOUT", "300")))
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": "Bearer lm-studio"
+}
+
+# Pooled keep-alive connections for the async client (asgiApp.py)
+ASYNC_MAX_CONNECTIONS = int(os.getenv("LM_STUDIO_MAX_CONNECTIONS", "64"))
+
+_session = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = requests.Session()
+                _session.headers.update(HEADERS)
+    return _session
+
+
+def _get_async_client():
+    # httpx is only needed by the ASGI server; the client is bound to the running event loop
+    global _async_client
+    if _async_client is None:
+        import httpx
+        _async_client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(LM_STUDIO_TIMEOUT[1], connect=LM_STUDIO_TIMEOUT[0]),
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=ASYNC_MAX_CONNECTIONS),
+        )
+    return _async_client
+
+
+def _payload(messages: list, stream: bool, **options) -> dict:
+    payload = {
+        "model": LM_STUDIO_MODEL,
+        "messages": messages,
+        "temperature": 0.5,
+    }
+    payload.update(options)
+    if stream:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+
+def chat_completion(messages: list, url: str = LM_STUDIO_URL, **options) -> dict:
+    """
+    Blocking chat completion.
+
+    Returns:
+        {"content": <assistant reply>, "usage": <usage dict or None>}
+    Raises:
+        requests.RequestException if LM Studio is unreachable or returns an error.
+    """
+    response = _get_session().post(url, json=_payload(messages, False, **options), timeout=LM_STUDIO_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    return {
+        "content": data["choices"][0]["message"]["content"],
+        "usage": data.get("usage"),
+    }
+
+
+def _parse_event(line: bytes | str):
+    """Decode one SSE line; returns None for comments/blank lines, "[DONE]" at the end."""
+    if isinstance(line, str):
+        line = line.encode("utf-8")
+    if not line.startswith(b"data:"):
+        return None
+    data = line[5:].strip()
+    if data == b"[DONE]":
+        return "[DONE]"
+    return json.loads(data)
+
+
+def stream_chat_completion(messages: list, url: str = LM_STUDIO_URL, **options):
+    """
+    Streaming chat completion over the OpenAI SSE protocol.
+
+    Yields:
+        ("delta", text) for every content fragment as it arrives, then exactly one
+        ("done", {"usage": ..., "finish_reason": ...}) when the upstream stream ends.
+    Raises:
+        requests.RequestException if LM Studio is unreachable or returns an error.
+    """
+    usage, finish_reason = None, None
+    with _get_session().post(url, json=_payload(messages, True, **options), timeout=LM_STUDIO_TIMEOUT,
+                             stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=False):
+            event = _parse_event(line)
+            if event is None:
+                continue
+            if event == "[DONE]":
+                break
+            if event.get("usage"):
+                usage = event["usage"]
+            for choice in event.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield "delta", text
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+    yield "done", {"usage": usage, "finish_reason": finish_reason}
+
+
+async def achat_completion(messages: list, url: str = LM_STUDIO_URL, **options) -> dict:
+    """
+    Awaitable chat_completion() for the ASGI server.
+
+    Raises:
+        httpx.HTTPError if LM Studio is unreachable or returns an error.
+    """
+    response = await _get_async_client().post(url, json=_payload(messages, False, **options))
+    response.raise_for_status()
+    data = response.json()
+    return {
+        "content": data["choices"][0]["message"]["content"],
+        "usage": data.get("usage"),
+    }
+
+
+async def astream_chat_completion(messages: list, url: str = LM_STUDIO_URL, **options):
+    """
+    Async generator twin of stream_chat_completion(): yields ("delta", text) pairs and
+    then one ("done", {"usage": ..., "finish_reason": ...}).
+
+    Raises:
+        httpx.HTTPError if LM Studio is unreachable or returns an error.
+    """
+    usage, finish_reason = None, None
+    async with _get_async_client().stream("POST", url, json=_payload(messages, True, **options)) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            event = _parse_event(line)
+            if event is None:
+                continue
+            if event == "[DONE]":
+                break
+            if event.get("usage"):
+                usage = event["usage"]
+            for choice in event.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    yield "delta", text
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+    yield "done", {"usage": usage, "finish_reason": finish_reason}
@@ -0,0 +1,588 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+
+import envConfig  # noqa: F401
+from llmClient import LM_STUDIO_URL, astream_chat_completion, stream_chat_completion
+from telemetry import current_trace, observe_llm, record_stage
+
+# Tunables (override in .env)
+LLM_BACKENDS = [u.strip() for u in os.getenv("LLM_BACKENDS", LM_STUDIO_URL).split(",") if u.strip()]
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))       # generations per backend at once
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))             # waiting requests before 429
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))   # seconds a request may wait for a slot
+LLM_STALL_TIMEOUT = float(os.getenv("LLM_STALL_TIMEOUT", "120"))   # seconds a coalesced caller waits for a new event
+
+PRIORITY_INTERACTIVE = 0     # a person is waiting on the answer
+PRIORITY_BACKGROUND = 10     # prefetch / batch work, served when nobody else is waiting
+
+# Options that only steer server-side caching; they do not change the answer, so they
+# are left out of the coalescing key
+_AFFINITY_OPTIONS = ("user", "id_slot", "cache_prompt")
+
+
+class Saturated(Exception):
+    """Every slot is busy and the queue is full (or the wait timed out)."""
+
+    def __init__(self, message: str, position: int, retry_after: int):
+        super().__init__(message)
+        self.position = position
+        self.retry_after = retry_after
+
+
+class _Signal:
+    """One-shot wake-up that threads and event loops can both wait on."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def set(self):
+        self._event.set()
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for loop, future in futures:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(True))
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._event.wait(timeout)
+
+    async def wait_async(self, timeout: float | None = None) -> bool:
+        if self._event.is_set():
+            return True
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._futures.append((loop, future))
+        if self._event.is_set():
+            return True
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class _Flight:
+    """
+    Events of one upstream generation, replayed to every coalesced caller. followers
+    counts the coalesced callers still reading and handoff holds the generation an owner
+    left behind for one of them to carry on; both change under the scheduler's lock.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.followers = 0
+        self.handoff = None
+        self._lock = threading.Lock()
+        self._changed = _Signal()
+
+    def publish(self, event: tuple, final: bool = False):
+        with self._lock:
+            if self.done:
+                return
+            self.events.append(event)
+            self.done = final
+            changed, self._changed = self._changed, _Signal()
+        changed.set()
+
+    def nudge(self):
+        """Wake the followers without an event (a handoff is waiting)."""
+        with self._lock:
+            changed, self._changed = self._changed, _Signal()
+        changed.set()
+
+    def _snapshot(self, start: int) -> tuple:
+        with self._lock:
+            return self.events[start:], self.done, self._changed
+
+
+class _Handoff:
+    """A generation whose owner went away while others were following it."""
+    __slots__ = ("ticket", "upstream", "pending", "started", "asynchronous")
+
+    def __init__(self, ticket, upstream, pending, started: float, asynchronous: bool):
+        self.ticket = ticket
+        self.upstream = upstream          # the upstream event iterator, None if never started
+        self.pending = pending            # async only: the in-flight read of the next event
+        self.started = started
+        self.asynchronous = asynchronous
+
+
+class _Backend:
+    __slots__ = ("url", "limit", "outstanding", "served")
+
+    def __init__(self, url: str, limit: int):
+        self.url = url
+        self.limit = limit
+        self.outstanding = 0
+        self.served = 0
+
+
+class _Ticket:
+    __slots__ = ("sort_key", "client", "backend", "granted", "enqueued", "retired")
+
+    def __init__(self, sort_key: tuple, client: str):
+        self.sort_key = sort_key
+        self.client = client
+        self.backend = None
+        self.granted = _Signal()
+        self.enqueued = time.time()
+        self.retired = False     # left the queue or gave back its slot; only ever happens once
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+
+def client_id(data: dict, headers, remote_addr: str | None) -> str:
+    """Who a request counts against for fair queuing: the user field / X-User-Id header, else the caller's address."""
+    return str(data.get("user") or headers.get("X-User-Id") or remote_addr or "")
+
+
+def _flight_key(messages: list, options: dict) -> str:
+    relevant = {k: v for k, v in options.items() if k not in _AFFINITY_OPTIONS}
+    raw = json.dumps({"messages": messages, "options": relevant}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _unwrap(event: tuple):
+    if event[0] == "error":
+        raise RuntimeError(event[1])
+    return event
+
+
+async def _anext(upstream):
+    try:
+        return await upstream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+class LlmCall:
+    """
+    Handle for one scheduled chat completion. Iterate stream()/astream() for
+    ("delta", text) ... ("done", {...}) events or call result()/aresult() for the whole
+    answer. A coalesced call replays the events of the identical call already in flight.
+    Queue wait, time to first token and total time are recorded on the caller's trace.
+
+    The call's queue place or slot is given back when its events end, fail, or are
+    abandoned (generator closed, task cancelled); a caller that goes away before reading
+    any event must call close(). When the owner of a generation goes away while coalesced
+    callers still follow it, one of them takes the generation over instead.
+    """
+
+    def __init__(self, scheduler, key: str, flight: _Flight, ticket: _Ticket | None,
+                 messages: list, options: dict):
+        self.scheduler = scheduler
+        self.key = key
+        self.coalesced = ticket is None
+        self._flight = flight
+        self._ticket = ticket
+        self._messages = messages
+        self._options = options
+        self._trace = current_trace()
+        self._started = False
+
+    def close(self):
+        """Give up a call whose events were never read; a no-op once they are."""
+        if self._started:
+            return
+        self._started = True
+        if self.coalesced:
+            self.scheduler._leave(self.key, self._flight)
+        else:
+            self.scheduler._finish(self.key, self._flight, _Handoff(self._ticket, None, None, time.time(), False),
+                                   "abandoned")
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    @property
+    def position(self) -> int:
+        """1-based place in the queue, 0 once running (or coalesced)."""
+        return self.scheduler.position(self._ticket) if self._ticket else 0
+
+    def _timed_out(self):
+        """Give up the queued ticket, unless it was granted while the wait timed out."""
+        position = self.position
+        if self.scheduler._cancel(self.key, self._ticket):
+            self._flight.publish(("error", "Timed out waiting for an LLM slot"), final=True)
+            raise Saturated("Timed out waiting for an LLM slot", position, self.scheduler.retry_after(position))
+
+    def _granted(self):
+        record_stage("llm_queue", time.time() - self._ticket.enqueued, self._trace)
+
+    def stream(self):
+        started, first, finish = time.perf_counter(), None, "error"
+        try:
+            for event in self._events():
+                if first is None:
+                    first = time.perf_counter()
+                if event[0] == "done":
+                    finish = event[1].get("finish_reason")
+                yield event
+        finally:
+            observe_llm(first and first - started, time.perf_counter() - started, finish, self._trace)
+
+    async def astream(self):
+        started, first, finish = time.perf_counter(), None, "error"
+        try:
+            async for event in self._aevents():
+                if first is None:
+                    first = time.perf_counter()
+                if event[0] == "done":
+                    finish = event[1].get("finish_reason")
+                yield event
+        finally:
+            observe_llm(first and first - started, time.perf_counter() - started, finish, self._trace)
+
+    def _follow_timeout(self) -> float:
+        # the owner may wait for a slot before its first event
+        return self.scheduler.queue_timeout + LLM_STALL_TIMEOUT
+
+    def _begin(self):
+        if self._started:
+            raise RuntimeError("LlmCall events can only be read once")
+        self._started = True
+
+    def _events(self):
+        self._begin()
+        if not self.coalesced:
+            yield from self._drive(_Handoff(self._ticket, None, None, time.time(), False))
+            return
+        # replay the flight; should its owner leave, carry the generation on from where it stopped
+        i, handoff = 0, None
+        try:
+            while True:
+                batch, done, changed = self._flight._snapshot(i)
+                for event in batch:
+                    yield _unwrap(event)
+                i += len(batch)
+                if done:
+                    return
+                if batch:
+                    continue
+                handoff = self.scheduler._claim(self._flight, asynchronous=False)
+                if handoff is not None:
+                    break
+                if not changed.wait(self._follow_timeout()):
+                    raise TimeoutError("Timed out waiting for the shared LLM generation")
+        finally:
+            if handoff is None:
+                self.scheduler._leave(self.key, self._flight)
+        self._ticket = handoff.ticket
+        yield from self._drive(handoff, self._flight._snapshot(i)[0])
+
+    def _drive(self, handoff: _Handoff, replay: list = ()):
+        """Run (or carry on) the upstream generation, publishing each event to the flight."""
+        outcome = "abandoned"
+        try:
+            yield from replay
+            if handoff.upstream is None:
+                if not self._ticket.granted.wait(self.scheduler.queue_timeout):
+                    self._timed_out()
+                self._granted()
+                handoff.started = time.time()
+                handoff.upstream = stream_chat_completion(self._messages, url=self._ticket.backend.url,
+                                                          **self._options)
+            for event in handoff.upstream:
+                self._flight.publish(event, final=event[0] == "done")
+                yield event
+            outcome = "completed"
+        except Exception as e:
+            outcome = "errors"
+            self._flight.publish(("error", str(e)), final=True)
+            raise
+        finally:
+            # also reached on GeneratorExit (client went away) while queued or generating
+            self.scheduler._finish(self.key, self._flight, handoff, outcome)
+
+    async def _aevents(self):
+        self._begin()
+        if not self.coalesced:
+            async for event in self._adrive(_Handoff(self._ticket, None, None, time.time(), True)):
+                yield event
+            return
+        i, handoff = 0, None
+        try:
+            while True:
+                batch, done, changed = self._flight._snapshot(i)
+                for event in batch:
+                    yield _unwrap(event)
+                i += len(batch)
+                if done:
+                    return
+                if batch:
+                    continue
+                handoff = self.scheduler._claim(self._flight, asynchronous=True)
+                if handoff is not None:
+                    break
+                if not await changed.wait_async(self._follow_timeout()):
+                    raise TimeoutError("Timed out waiting for the shared LLM generation")
+        finally:
+            if handoff is None:
+                self.scheduler._leave(self.key, self._flight)
+        self._ticket = handoff.ticket
+        async for event in self._adrive(handoff, self._flight._snapshot(i)[0]):
+            yield event
+
+    async def _adrive(self, handoff: _Handoff, replay: list = ()):
+        outcome = "abandoned"
+        handoff.asynchronous = True
+        try:
+            for event in replay:
+                yield event
+            if handoff.upstream is None:
+                if not await self._ticket.granted.wait_async(self.scheduler.queue_timeout):
+                    self._timed_out()
+                self._granted()
+                handoff.started = time.time()
+                handoff.upstream = astream_chat_completion(self._messages, url=self._ticket.backend.url,
+                                                           **self._options)
+            while True:
+                if handoff.pending is None:
+                    handoff.pending = asyncio.ensure_future(_anext(handoff.upstream))
+                # shielded: a cancelled caller leaves the read running for whoever takes over
+                event = await asyncio.shield(handoff.pending)
+                handoff.pending = None
+                if event is None:
+                    break
+                self._flight.publish(event, final=event[0] == "done")
+                yield event
+            outcome = "completed"
+        except Exception as e:
+            outcome = "errors"
+            self._flight.publish(("error", str(e)), final=True)
+            raise
+        finally:
+            # also reached on CancelledError / aclose() while queued or generating
+            self.scheduler._finish(self.key, self._flight, handoff, outcome)
+
+    @staticmethod
+    def _collect(events: list) -> dict:
+        content = "".join(v for k, v in events if k == "delta")
+        done = next((v for k, v in events if k == "done"), {})
+        return {"content": content, "usage": done.get("usage")}
+
+    def result(self) -> dict:
+        """Blocking completion: {"content", "usage"}, like llmClient.chat_completion."""
+        return self._collect(list(self.stream()))
+
+    async def aresult(self) -> dict:
+        return self._collect([event async for event in self.astream()])
+
+
+class LlmScheduler:
+    """
+    Admission control in front of one or more OpenAI-compatible backends.
+
+    - At most max_in_flight generations run per backend; a new call goes to the backend
+      with the fewest outstanding requests.
+    - Others wait in a priority queue ordered by (priority, the client's outstanding
+      calls, arrival), so one client's burst cannot starve everybody else.
+    - Identical requests (same messages and options) share one upstream generation.
+    - With max_queue requests already waiting, request() raises Saturated with the
+      position the call would have had and a Retry-After estimate.
+    """
+
+    def __init__(self, backends: list = LLM_BACKENDS, max_in_flight: int = LLM_MAX_IN_FLIGHT,
+                 max_queue: int = LLM_MAX_QUEUE, queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.backends = [_Backend(url, max_in_flight) for url in backends]
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._queue = []                 # heap of _Ticket
+        self._flights = {}               # flight key -> _Flight
+        self._client_load = {}           # client -> queued + running calls
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._service_time = 10.0        # moving average of a generation, seconds
+        self.counters = {"admitted": 0, "queued": 0, "coalesced": 0, "rejected": 0,
+                         "timeouts": 0, "completed": 0, "errors": 0, "abandoned": 0, "handoffs": 0}
+
+    @property
+    def capacity(self) -> int:
+        return sum(b.limit for b in self.backends)
+
+    def _free_backend(self):
+        free = [b for b in self.backends if b.outstanding < b.limit]
+        return min(free, key=lambda b: b.outstanding) if free else None
+
+    def _grant(self, ticket: _Ticket, backend: _Backend):
+        backend.outstanding += 1
+        ticket.backend = backend
+        self.counters["admitted"] += 1
+        ticket.granted.set()
+
+    def retry_after(self, position: int) -> int:
+        return max(1, math.ceil(self._service_time * position / max(1, self.capacity)))
+
+    def position(self, ticket: _Ticket) -> int:
+        with self._lock:
+            if ticket.backend is not None:
+                return 0
+            return 1 + sum(1 for t in self._queue if t.sort_key < ticket.sort_key)
+
+    def request(self, messages: list, client: str = "", priority: int = PRIORITY_INTERACTIVE,
+                **options) -> LlmCall:
+        """
+        Admit a chat completion. Returns an LlmCall immediately (running, queued or
+        coalesced); raises Saturated when the queue is full.
+        """
+        key = _flight_key(messages, options)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.counters["coalesced"] += 1
+                flight.followers += 1
+                return LlmCall(self, key, flight, None, messages, options)
+
+            rank = self._client_load.get(client, 0)
+            ticket = _Ticket((priority, rank, next(self._seq)), client)
+            backend = None if self._queue else self._free_backend()
+            if backend is not None:
+                self._grant(ticket, backend)
+            elif len(self._queue) >= self.max_queue:
+                self.counters["rejected"] += 1
+                position = len(self._queue) + 1
+                raise Saturated("LLM queue is full", position, self.retry_after(position))
+            else:
+                heapq.heappush(self._queue, ticket)
+                self.counters["queued"] += 1
+            self._client_load[client] = rank + 1
+            flight = self._flights[key] = _Flight()
+        return LlmCall(self, key, flight, ticket, messages, options)
+
+    def _forget(self, key: str, ticket: _Ticket):
+        self._flights.pop(key, None)
+        load = self._client_load.get(ticket.client, 1) - 1
+        if load > 0:
+            self._client_load[ticket.client] = load
+        else:
+            self._client_load.pop(ticket.client, None)
+
+    def _retire_locked(self, key: str, ticket: _Ticket, duration: float, outcome: str):
+        if ticket.retired:
+            return
+        ticket.retired = True
+        self._forget(key, ticket)
+        self.counters[outcome] += 1
+        if ticket.backend is None:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            return
+        ticket.backend.outstanding -= 1
+        ticket.backend.served += 1
+        if outcome == "completed":
+            self._service_time = 0.8 * self._service_time + 0.2 * duration
+        while self._queue:
+            backend = self._free_backend()
+            if backend is None:
+                break
+            self._grant(heapq.heappop(self._queue), backend)
+
+    def _retire(self, key: str, ticket: _Ticket, duration: float, outcome: str):
+        """
+        Take a ticket out of the scheduler, once: out of the queue if it is still waiting,
+        else give back its slot to the next waiter. outcome is the counter to bump
+        (completed, errors, abandoned).
+        """
+        with self._lock:
+            self._retire_locked(key, ticket, duration, outcome)
+
+    @staticmethod
+    def _abandon(flight: _Flight, handoff: _Handoff):
+        """Nobody wants the generation any more: stop reading it and fail anyone late to it."""
+        flight.publish(("error", "upstream call was cancelled"), final=True)
+        if handoff.pending is not None:
+            handoff.pending.cancel()
+        elif handoff.upstream is not None and not handoff.asynchronous:
+            handoff.upstream.close()
+
+    def _finish(self, key: str, flight: _Flight, handoff: _Handoff, outcome: str):
+        """
+        The caller driving a generation is done with it. An abandoned generation that
+        others still follow is left in flight.handoff for one of them; otherwise the
+        ticket is retired.
+        """
+        with self._lock:
+            handed = outcome == "abandoned" and flight.followers > 0 and not flight.done and not handoff.ticket.retired
+            if handed:
+                flight.handoff = handoff
+            else:
+                self._retire_locked(key, handoff.ticket, time.time() - handoff.started, outcome)
+        if handed:
+            flight.nudge()
+        elif outcome == "abandoned":
+            self._abandon(flight, handoff)
+        else:
+            flight.publish(("error", "upstream call was cancelled"), final=True)   # no-op after "done"
+
+    def _claim(self, flight: _Flight, asynchronous: bool):
+        """A follower takes over the generation its owner left, if there is one it can drive."""
+        with self._lock:
+            handoff = flight.handoff
+            if handoff is None or handoff.upstream is not None and handoff.asynchronous != asynchronous:
+                return None
+            flight.handoff = None
+            flight.followers -= 1
+            self.counters["handoffs"] += 1
+            return handoff
+
+    def _leave(self, key: str, flight: _Flight):
+        """A follower stops reading; the last one out retires a generation nobody took over."""
+        with self._lock:
+            flight.followers -= 1
+            handoff = flight.handoff if flight.followers == 0 else None
+            if handoff is not None:
+                flight.handoff = None
+                self._retire_locked(key, handoff.ticket, time.time() - handoff.started, "abandoned")
+        if handoff is not None:
+            self._abandon(flight, handoff)
+
+    def _cancel(self, key: str, ticket: _Ticket) -> bool:
+        """Drop a ticket that is still queued; False when it has already been granted."""
+        with self._lock:
+            if ticket.backend is not None:
+                return False
+            self._retire_locked(key, ticket, 0.0, "timeouts")
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self.counters,
+                queue=len(self._queue),
+                in_flight=sum(b.outstanding for b in self.backends),
+                capacity=self.capacity,
+                service_time=round(self._service_time, 3),
+                backends=[{"url": b.url, "outstanding": b.outstanding, "limit": b.limit, "served": b.served}
+                          for b in self.backends],
+            )
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LlmScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LlmScheduler()
+    return _scheduler
+
+
+def scheduler_stats() -> dict:
+    return get_scheduler().stats()
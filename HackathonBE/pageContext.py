@@ -0,0 +1,240 @@
+"""
+Page-scoped help material. For every page type in apiRoutes.ROUTES, a ranked set of KB
+article chunks and TrainingData topics is chosen once at build time and stored in
+index/page_context.json. At query time the page's route (already resolved for the fetch)
+is a dict lookup into that file instead of a BM25 and an embedding search per request,
+and the material is identical for every question on the same page type, which also
+keeps that stretch of the prompt stable for the server's prefix cache.
+
+    python pageContext.py build                  # index/kb.store + TrainingData -> index/page_context.json
+    python pageContext.py build ../KB20251101.csv   # rebuild the KB store from a new export first
+    python pageContext.py /portfolios/5          # what a page gets
+
+Ranking follows each route's "kb" spec:
+- articles score SECTION_WEIGHT when their Category (or Category/Subcategory) is one of
+  the route's sections, plus one point per route term in their Keywords column and
+  TITLE_WEIGHT per term in their title; the run of whole lines (up to CHUNK_TOKENS)
+  sharing the most terms represents the article;
+- topics from the route's TrainingData domains score by the route terms they contain.
+
+Articles are read from the KB store (kbStore.py) and the file only records each chunk
+as a byte range of its article's body there; the text is decoded from the store's mmap
+when a query uses it. Routes without a "kb" spec, and every page when either file is
+missing or the store was rebuilt since, fall back to searching per request
+(app.build_messages).
+"""
+import json
+import os
+import sys
+
+import envConfig  # noqa: F401
+from apiRoutes import ROUTES, resolve_route
+from kbEmbeddings import SNIPPET_CHARS, TRAINING_DIR, iter_training_topics
+from kbIndex import BASE_DIR, KB_CSV_PATH, tokenize
+from kbStore import KB_STORE_PATH, KbStore, build_store, get_kb_store
+from promptParsing import count_tokens
+from telemetry import get_logger
+
+log = get_logger("pageContext")
+
+# Default location (override with PAGE_CONTEXT_PATH in .env)
+PAGE_CONTEXT_PATH = os.getenv("PAGE_CONTEXT_PATH", os.path.join(BASE_DIR, "index", "page_context.json"))
+
+# Tunables (override in .env)
+PAGE_CONTEXT_ENABLED = os.getenv("PAGE_CONTEXT", "1") != "0"   # 0 = always search per request
+
+PAGE_ARTICLES = 3        # per page, as many as search_kb returns per request
+PAGE_TOPICS = 2
+CHUNK_TOKENS = 200       # an article is represented by one run of lines of about this size
+SECTION_WEIGHT = 3.0
+TITLE_WEIGHT = 0.5
+
+
+def _route_specs() -> dict:
+    """{route name: kb spec} for the routes that have one (names as RouteRegistry assigns them)."""
+    return {spec.get("name") or spec["template"]: spec["kb"] for spec in ROUTES if spec.get("kb")}
+
+
+def _in_sections(category: str, subcategory: str, sections: tuple) -> bool:
+    return category in sections or f"{category}/{subcategory}" in sections
+
+
+def best_span(body: str, terms: set, max_tokens: int = CHUNK_TOKENS) -> tuple:
+    """
+    The [start, end) byte range of body covering the run of whole lines, within
+    max_tokens, that shares the most terms; the earliest run on ties (articles open with
+    their summary). A single longer line is cut at about max_tokens.
+    """
+    lines = body.split("\n")
+    offsets, pos = [], 0
+    for line in lines:
+        size = len(line.encode("utf-8"))
+        offsets.append((pos, pos + size))
+        pos += size + 1
+    line_terms = [set(tokenize(line)) for line in lines]
+    line_tokens = [count_tokens(line) for line in lines]
+    best, best_score = (0, 0), -1
+    for i in range(len(lines)):
+        j, tokens, shared = i, 0, set()
+        while j < len(lines) and (j == i or tokens + line_tokens[j] <= max_tokens):
+            tokens += line_tokens[j]
+            shared |= terms & line_terms[j]
+            j += 1
+        if len(shared) > best_score:
+            best, best_score = (offsets[i][0], offsets[j - 1][1]), len(shared)
+    start, end = best
+    return start, min(end, start + max_tokens * 4)
+
+
+def _rank_articles(store: KbStore, kb: dict, k: int) -> list:
+    sections = tuple(kb.get("sections", ()))
+    terms = set(tokenize(kb.get("terms", "")))
+    scored = []
+    for doc_id in store.filter():
+        record = store[doc_id]
+        score = SECTION_WEIGHT if _in_sections(record.category, record.subcategory, sections) else 0.0
+        score += len(terms.intersection(tokenize(record.keywords)))
+        score += TITLE_WEIGHT * len(terms.intersection(tokenize(record.title)))
+        if score > 0:
+            scored.append((score, record.title, doc_id))
+    scored.sort(key=lambda s: (-s[0], s[1]))
+    out = []
+    for score, title, doc_id in scored[:k]:
+        record = store[doc_id]
+        out.append({
+            "title": title,
+            "url": record.url,
+            "span": best_span(record.body, terms),
+            "score": round(score, 2),
+        })
+    return out
+
+
+def _rank_topics(topics: list, kb: dict, k: int) -> list:
+    domains = set(kb.get("training", ()))
+    terms = set(tokenize(kb.get("terms", "")))
+    scored = []
+    for topic in topics:
+        if topic["domain"] not in domains:
+            continue
+        scored.append((len(terms & topic["terms"]), topic))
+    scored.sort(key=lambda st: (-st[0], st[1]["title"]))
+    return [{
+        "title": topic["title"],
+        "snippet": " ".join(topic["text"].split())[:SNIPPET_CHARS],
+        "score": score,
+    } for score, topic in scored[:k]]
+
+
+def build_page_context(store_path: str = KB_STORE_PATH, out_path: str = PAGE_CONTEXT_PATH,
+                       training_dir: str = TRAINING_DIR, articles: int = PAGE_ARTICLES,
+                       topics: int = PAGE_TOPICS) -> dict:
+    """
+    Rank help material for every route with a "kb" spec and write it to out_path
+    (via a temp file, so running workers never read a half-written one).
+
+    Returns:
+        {route name: {"articles": n, "topics": n}}
+    """
+    store = KbStore(store_path)
+    training = []
+    for doc in iter_training_topics(training_dir):
+        domain = doc["id"].split(":", 2)[1]
+        training.append(dict(doc, domain=domain, terms=set(tokenize(doc["text"]))))
+
+    pages = {}
+    for name, kb in _route_specs().items():
+        pages[name] = {"articles": _rank_articles(store, kb, articles), "topics": _rank_topics(training, kb, topics)}
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp = out_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"store": store.digest, "pages": pages}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, out_path)
+    return {name: {"articles": len(p["articles"]), "topics": len(p["topics"])} for name, p in pages.items()}
+
+
+class PageContext:
+    """
+    Read-only view over a build_page_context() output, keyed by route name. Article
+    chunks are decoded from the KB store each time they are used.
+    """
+
+    def __init__(self, store: KbStore, path: str = PAGE_CONTEXT_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("store") != store.digest:
+            raise ValueError(f"{path} was built from a different KB store; rebuild it")
+        self.store = store
+        self.pages = {}
+        for name, page in data["pages"].items():
+            articles = [(a["title"], a["url"], store.find(a["url"]), tuple(a["span"])) for a in page["articles"]]
+            self.pages[name] = ([a for a in articles if a[2] >= 0], page["topics"])
+
+    def for_route(self, name: str):
+        """(kb_hits, topic_hits) shaped like search_kb / search_semantic results, or None."""
+        page = self.pages.get(name)
+        if page is None:
+            return None
+        articles, topics = page
+        hits = [{"title": title, "url": url, "snippet": self.store.body(doc_id, *span)}
+                for title, url, doc_id, span in articles]
+        return hits, topics
+
+
+_context = None
+
+
+def get_page_context():
+    """Lazily load the page context file; None (logged once) if it has not been built."""
+    global _context
+    if _context is None:
+        if not PAGE_CONTEXT_ENABLED:
+            _context = False
+        elif not os.path.exists(PAGE_CONTEXT_PATH) or get_kb_store() is None:
+            log.warning("Page context not found at %s; run `python pageContext.py build`", PAGE_CONTEXT_PATH)
+            _context = False
+        else:
+            try:
+                _context = PageContext(get_kb_store(), PAGE_CONTEXT_PATH)
+            except ValueError as e:
+                log.warning("%s", e)
+                _context = False
+    return _context or None
+
+
+def page_material(webpage_url: str):
+    """
+    The precomputed help material for the page a URL points at.
+
+    Returns:
+        (kb_hits, topic_hits), or None when there is none and the caller should search.
+    """
+    context = get_page_context()
+    if context is None:
+        return None
+    try:
+        _, route, _ = resolve_route(webpage_url)
+    except ValueError:
+        return None
+    return context.for_route(route.name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        if len(sys.argv) > 2 or not os.path.exists(KB_STORE_PATH):
+            csv_path = sys.argv[2] if len(sys.argv) > 2 else KB_CSV_PATH
+            print(f"Stored {build_store(csv_path, KB_STORE_PATH)} articles -> {KB_STORE_PATH}")
+        for name, counts in build_page_context(KB_STORE_PATH).items():
+            print(f"{name:36s} {counts['articles']} articles, {counts['topics']} topics")
+        print(f"-> {PAGE_CONTEXT_PATH}")
+    else:
+        path = sys.argv[1] if len(sys.argv) > 1 else "/maintenance/work-orders/1"
+        material = page_material("https://example.rentvine.com" + path)
+        if material is None:
+            print("No page context for", path)
+        else:
+            for hit in material[0]:
+                print(f"{hit['title']}  {hit['url']}\n    {hit['snippet'][:160]!r}")
+            for hit in material[1]:
+                print(f"[training] {hit['title']}")
@@ -0,0 +1,206 @@
+"""
+Warm start for page context. The widget calls /api/prefetch with the page URL as soon
+as it opens; the page's Rentvine data is fetched (full plan) and chunked on a small
+background pool, so the first /api/query finds it ready instead of waiting on Rentvine.
+
+- Deduplication: one job per page; repeated prefetches (and queries) for a page that is
+  in flight or still fresh join it instead of starting another.
+- Cancellation: each client (the widget's tab) has at most one prefetch it wants. When
+  it moves to another page, its previous prefetch is dropped unless someone else still
+  wants it: a queued job never starts, a running one stops before chunking.
+- Queries adopt a prefetch that is ready, or wait up to PREFETCH_WAIT for one in
+  flight. The full payload is narrowed to the question's projection (apiRoutes); when
+  nothing is trimmed the prefetched chunks are used as well.
+
+Entries live for the route's cache_ttl, like the response cache.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import envConfig  # noqa: F401
+from apiRoutes import project_payload, resolve_route
+from telemetry import get_logger, span
+
+log = get_logger("prefetch")
+
+# Tunables (override in .env)
+PREFETCH_ENABLED = os.getenv("PREFETCH", "1") != "0"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))          # pages fetched in the background at once
+PREFETCH_MAX_ENTRIES = int(os.getenv("PREFETCH_MAX_ENTRIES", "256"))
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", "10"))              # seconds a query waits for one in flight
+
+
+def page_key(webpage_url: str) -> str:
+    """Pages are the same when scheme, host and path match; the query string is ignored, as by the routes."""
+    parsed = urlparse(webpage_url.strip())
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path.rstrip('/')}"
+
+
+class _Entry:
+    __slots__ = ("key", "url", "future", "clients", "waiters", "payload", "parts", "expires", "cancelled")
+
+    def __init__(self, key: str, url: str, ttl: float):
+        self.key = key
+        self.url = url
+        self.future = None
+        self.clients = set()
+        self.waiters = 0        # queries in take() right now
+        self.payload = None
+        self.parts = None
+        self.expires = time.monotonic() + ttl
+        self.cancelled = False
+
+    @property
+    def fresh(self) -> bool:
+        return not self.cancelled and time.monotonic() < self.expires
+
+
+class Prefetcher:
+    """
+    fetch(url) returns a page's decoded payload (full plan) and chunk(payload) its parts;
+    both run on the background pool.
+    """
+
+    def __init__(self, fetch, chunk, workers: int = PREFETCH_WORKERS, max_entries: int = PREFETCH_MAX_ENTRIES):
+        self._fetch = fetch
+        self._chunk = chunk
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._by_client = {}
+        self._lock = threading.Lock()
+        self._counters = {"started": 0, "joined": 0, "cancelled": 0, "hits": 0, "waits": 0,
+                          "misses": 0, "errors": 0}
+
+    def _release(self, client: str, keep: str):
+        """Forget what client wanted before (unless it is keep); drop entries nobody wants any more."""
+        previous = self._by_client.get(client)
+        if previous is None or previous.key == keep:
+            return
+        previous.clients.discard(client)
+        self._drop_unwanted(previous)
+
+    def _drop_unwanted(self, entry: _Entry):
+        """Cancel an entry in flight that no client wants and no query waits on."""
+        if entry.clients or entry.waiters or entry.future.done():
+            return
+        entry.cancelled = True
+        entry.future.cancel()    # only succeeds while still queued
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        self._counters["cancelled"] += 1
+
+    def start(self, webpage_url: str, client: str = "") -> str:
+        """
+        Begin (or join) the background fetch of a page for client.
+
+        Returns:
+            "started", "pending" (already in flight) or "ready" (already fetched).
+        Raises:
+            ValueError if the URL path is unsupported.
+        """
+        _, route, _ = resolve_route(webpage_url)
+        key = page_key(webpage_url)
+        with self._lock:
+            self._release(client, key)
+            entry = self._entries.get(key)
+            if entry is not None and entry.fresh:
+                entry.clients.add(client)
+                self._by_client[client] = entry
+                self._entries.move_to_end(key)
+                self._counters["joined"] += 1
+                return "ready" if entry.future.done() else "pending"
+            entry = _Entry(key, webpage_url.strip(), route.cache_ttl)
+            entry.clients.add(client)
+            self._entries[key] = entry
+            self._by_client[client] = entry
+            self._evict()
+            entry.future = self._executor.submit(self._run, entry)
+            self._counters["started"] += 1
+        return "started"
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries.values()))
+            if not oldest.future or not oldest.future.done():
+                break   # never drop work in flight; the next start() tries again
+            self._entries.popitem(last=False)
+        for client in [c for c, e in self._by_client.items() if e.key not in self._entries]:
+            del self._by_client[client]
+
+    def _run(self, entry: _Entry):
+        try:
+            payload = self._fetch(entry.url)
+            if entry.cancelled:
+                return
+            entry.parts = self._chunk(payload)
+            entry.payload = payload
+        except Exception as e:
+            with self._lock:
+                self._counters["errors"] += 1
+                if self._entries.get(entry.key) is entry:
+                    del self._entries[entry.key]
+            log.warning("Prefetch of %s failed: %s", entry.url, e)
+            raise
+
+    def take(self, webpage_url: str, question: str | None = None):
+        """
+        The prefetched context for a query, waiting up to PREFETCH_WAIT for one in flight.
+
+        Returns:
+            (payload, parts) with payload narrowed to the question's projection and parts
+            None when it was narrowed (the caller chunks), or None without a usable
+            prefetch.
+        """
+        key = page_key(webpage_url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.fresh:
+                self._counters["misses"] += 1
+                return None
+            entry.waiters += 1      # a waiting query keeps it from being cancelled
+            waiting = not entry.future.done()
+            self._counters["waits" if waiting else "hits"] += 1
+        try:
+            if waiting:
+                with span("prefetch_wait"):
+                    entry.future.result(timeout=PREFETCH_WAIT)
+            else:
+                entry.future.result(timeout=0)
+        except Exception:
+            return None     # cancelled, timed out or failed (_run logged it)
+        finally:
+            with self._lock:
+                entry.waiters -= 1
+                self._drop_unwanted(entry)     # its client moved on while we waited
+        if entry.payload is None:
+            return None
+        payload, omitted = project_payload(entry.url, entry.payload, question)
+        return payload, (None if omitted else entry.parts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(1 for e in self._entries.values() if not e.future.done())
+            return {**self._counters, "entries": len(self._entries), "pending": pending}
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher(fetch=None, chunk=None):
+    """Process-wide Prefetcher; the first caller supplies fetch and chunk. None when PREFETCH=0."""
+    global _prefetcher
+    if _prefetcher is None and PREFETCH_ENABLED and fetch is not None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = Prefetcher(fetch, chunk)
+    return _prefetcher
+
+
+def prefetch_stats() -> dict:
+    return _prefetcher.stats() if _prefetcher is not None else {}
@@ -1,4 +1,446 @@
-import hashlib, math, re, json
+import hashlib, math, os, re, json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name: str = "cl100k_base"):
+    """
+    Process-wide tiktoken encoder, or None if tiktoken (or its BPE file) is unavailable.
+    The failure is cached too, so callers never retry the download per call.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return None
+
+def _estimate_tokens(words: int, chars: int) -> int:
+    # words / 0.75 holds for prose; minified JSON has almost no whitespace, so ~4 chars per
+    # token bounds it from the other side
+    return math.ceil(max(words / 0.75, chars / 4))
+
+def count_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
+    """
+    Token count with the same rules chunk_for_lm_studio uses: tiktoken when it is
+    installed, otherwise a conservative estimate (words / 0.75 or chars / 4, whichever
+    is larger).
+    """
+    enc = get_encoder(encoding_name)
+    if enc is not None:
+        return len(enc.encode(text))
+    return _estimate_tokens(len(text.split()), len(text)) if text else 0
+
+# ------------- JSON PACKING ENGINE -------------
+# Envelopes are {"path": <str>, "data": <partial JSON>}, byte-identical to
+# json.dumps(envelope, ensure_ascii=False, indent=2) (or compact separators).
+# Every child value is serialized once; the byte size of a tentative envelope is
+# tracked arithmetically instead of re-dumping it per element. Re-indenting a
+# serialized value only inserts ASCII spaces after each newline, so its size at any
+# depth is bytes + newlines * indent.
+_PRETTY_ENVELOPE = ('{\n  "path": ', ',\n  "data": ', '\n}')
+_COMPACT_ENVELOPE = ('{"path":', ',"data":', '}')
+_ITEM_INDENT = "\n    "   # items of "data" sit two levels deep in a pretty envelope
+_DATA_INDENT = "\n  "     # "data" itself sits one level deep
+
+def _size_bytes(s: str) -> int:
+    return len(s.encode("utf-8", "replace"))
+
+def _dump(value, pretty: bool) -> str:
+    if pretty:
+        return json.dumps(value, ensure_ascii=False, indent=2)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _wrap(path: str, payload, pretty: bool) -> str:
+    return _dump({"path": path, "data": payload}, pretty)
+
+def _envelope(path_json: str, data_text: str, pretty: bool) -> str:
+    pre, mid, post = _PRETTY_ENVELOPE if pretty else _COMPACT_ENVELOPE
+    return pre + path_json + mid + data_text + post
+
+def _envelope_overhead(path_json: str, pretty: bool) -> int:
+    pre, mid, post = _PRETTY_ENVELOPE if pretty else _COMPACT_ENVELOPE
+    return len(pre) + _size_bytes(path_json) + len(mid) + len(post)
+
+def _key_json(key) -> str:
+    if isinstance(key, str):
+        return json.dumps(key, ensure_ascii=False)
+    # json coerces int/float/bool/None keys to strings; let it do the coercion
+    return json.dumps({key: 0}, ensure_ascii=False, separators=(",", ":"))[1:-3]
+
+def _larger_than(value, limit: int) -> bool:
+    """
+    True if value's serialized size certainly exceeds limit. Walks a cheap lower bound
+    (characters, braces, separators) and stops as soon as it passes limit, so asking
+    about a huge sub-tree costs O(limit), not O(sub-tree).
+    """
+    total, stack = 0, [value]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, str):
+            total += len(v) + 2
+        elif isinstance(v, dict):
+            total += 2 + max(0, len(v) - 1)
+            for k, item in v.items():
+                total += (len(k) + 3) if isinstance(k, str) else 2
+                stack.append(item)
+        elif isinstance(v, list):
+            total += 2 + max(0, len(v) - 1)
+            stack.extend(v)
+        else:
+            total += 1
+        if total > limit:
+            return True
+    return False
+
+def _byte_chunks_fallback(raw: str, max_bytes: int, path: str, pretty: bool):
+    bs = raw.encode("utf-8", "replace")
+    out = []
+    i = 0
+    # keep some headroom for the {"path":..,"data":..} envelope
+    overhead = 64 + len(path.encode("utf-8", "replace"))
+    while i < len(bs):
+        j = min(len(bs), i + max(1024, max_bytes - overhead))
+        if j < len(bs):
+            # back up to a likely boundary
+            back = 0
+            while j - back > i and bs[j - back:j - back + 1] not in b", \n\r\t}]":
+                back += 1
+            if j - back <= i:
+                back = 0
+            j -= back
+        chunk = bs[i:j].decode("utf-8", "replace")
+        out.append(_wrap(path, chunk, pretty))
+        i = j
+    return out
+
+def _split_any(obj, max_bytes: int, path: str, pretty: bool):
+    if isinstance(obj, (dict, list)):
+        return _pack_container(obj, max_bytes, path, pretty)
+    s = _wrap(path, obj, pretty)
+    if _size_bytes(s) <= max_bytes:
+        return [s]
+    # extremely long primitive (usually a huge string)
+    raw = json.dumps(obj, ensure_ascii=False)
+    return _byte_chunks_fallback(raw, max_bytes, path, pretty)
+
+def _pack_container(obj, max_bytes: int, path: str, pretty: bool):
+    """
+    Greedily pack the children of a dict/list into as few envelopes as fit max_bytes.
+    A child that does not fit next to the buffer is flushed on its own envelope
+    (path.key / path[idx]); a child too big for any envelope is split recursively.
+    """
+    is_dict = isinstance(obj, dict)
+    open_b, close_b = ("{", "}") if is_dict else ("[", "]")
+    key_sep = ": " if pretty else ":"
+    path_json = json.dumps(path, ensure_ascii=False)
+    head = _envelope_overhead(path_json, pretty)
+
+    out = []
+    buf, buf_bytes = [], 0    # buffered item texts (already at item depth) and their summed size
+
+    def data_size(n: int, items_bytes: int) -> int:
+        # pretty: "{" + ("\n    " + item) joined by "," + "\n  }"; compact: "{" + items joined by "," + "}"
+        if pretty:
+            return 6 * n + items_bytes + 4
+        return 2 + items_bytes + (n - 1)
+
+    def flush():
+        nonlocal buf, buf_bytes
+        if not buf:
+            return
+        if pretty:
+            data_text = open_b + _ITEM_INDENT + ("," + _ITEM_INDENT).join(buf) + _DATA_INDENT + close_b
+        else:
+            data_text = open_b + ",".join(buf) + close_b
+        out.append(_envelope(path_json, data_text, pretty))
+        buf, buf_bytes = [], 0
+
+    for k, v in (obj.items() if is_dict else enumerate(obj)):
+        if isinstance(v, (dict, list)) and _larger_than(v, max_bytes):
+            # cannot fit in any envelope: skip serializing it whole and split it directly
+            sub_path = (f"{path}.{k}" if path else k) if is_dict else f"{path}[{k}]"
+            flush()
+            out.extend(_split_any(v, max_bytes, sub_path, pretty))
+            continue
+
+        text = _dump(v, pretty)
+        v_bytes = _size_bytes(text)
+        v_lines = text.count("\n") if pretty else 0
+        if is_dict:
+            kj = _key_json(k)
+            prefix = kj + key_sep
+            item_bytes = _size_bytes(kj) + len(key_sep) + v_bytes + 4 * v_lines
+        else:
+            prefix = ""
+            item_bytes = v_bytes + 4 * v_lines
+
+        if head + data_size(len(buf) + 1, buf_bytes + item_bytes) <= max_bytes:
+            buf.append(prefix + (text.replace("\n", _ITEM_INDENT) if v_lines else text))
+            buf_bytes += item_bytes
+            continue
+
+        sub_path = (f"{path}.{k}" if path else k) if is_dict else f"{path}[{k}]"
+        sub_path_json = json.dumps(sub_path, ensure_ascii=False)
+        if _envelope_overhead(sub_path_json, pretty) + v_bytes + 2 * v_lines <= max_bytes:
+            flush()
+            out.append(_envelope(sub_path_json, text.replace("\n", _DATA_INDENT) if v_lines else text, pretty))
+        else:
+            flush()
+            out.extend(_split_any(v, max_bytes, sub_path, pretty))
+    flush()
+    return out
+
+def pack_json(obj, max_bytes: int, pretty: bool = True) -> list:
+    """
+    Split a parsed JSON value into envelope strings of at most max_bytes (UTF-8) each,
+    without breaking objects/arrays mid-key. Linear in the payload size.
+    """
+    return _split_any(obj, max_bytes, "", pretty)
+
+
+# ------------- TOKEN HELPERS -------------
+class _Tokens:
+    """
+    One interface over tiktoken ids or, without tiktoken, whitespace words counted
+    conservatively (see count_tokens). Text is encoded once into "units"; counting,
+    slicing and decoding then work on the unit list.
+    """
+    def __init__(self, encoding_name: str):
+        self.enc = get_encoder(encoding_name)
+
+    def encode(self, s: str) -> list:
+        if self.enc is not None:
+            return self.enc.encode(s, disallowed_special=())
+        return s.split()
+
+    def count(self, units: list) -> int:
+        if self.enc is not None:
+            return len(units)
+        return _estimate_tokens(len(units), sum(map(len, units)) + len(units) - 1) if units else 0
+
+    def fit(self, tokens: int, units: list | None = None) -> int:
+        """
+        How many units fit in a budget of `tokens`: an upper bound, or with `units`, how
+        many of its leading units do under count()'s estimate (long words hit chars / 4
+        before words / 0.75).
+        """
+        if self.enc is not None:
+            return tokens
+        n = max(1, math.floor(tokens * 0.75))
+        if units is None:
+            return n
+        chars = -1
+        for i, unit in enumerate(units[:n]):
+            chars += len(unit) + 1
+            if chars > tokens * 4:
+                return max(1, i)
+        return n
+
+    def decode(self, units: list) -> str:
+        if self.enc is not None:
+            return self.enc.decode(units)
+        return " ".join(units)
+
+    def pair(self, s: str) -> tuple:
+        return s, self.encode(s)
+
+    def prefix(self, units: list, cap: int) -> tuple:
+        """
+        Longest prefix of units that still fits in cap tokens once decoded and
+        re-encoded (BPE merges can shift at the cut). Returns (text, units, used).
+        """
+        def attempt(cut: int) -> tuple:
+            text = self.decode(units[:cut]).strip()
+            return text, self.encode(text), cut
+
+        hi = min(len(units), self.fit(cap, units))
+        best = attempt(hi)
+        if self.count(best[1]) <= cap or hi <= 1:
+            return best
+        # the fit estimate overshot (merges shifted at the cut): binary search below it
+        best, lo, hi = None, 1, hi - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            candidate = attempt(mid)
+            if self.count(candidate[1]) <= cap:
+                best, lo = candidate, mid + 1
+            else:
+                hi = mid - 1
+        return best or attempt(1)
+
+def _with_overlap(chunks: list, overlap_tokens: int, hard_cap: int, tok: _Tokens) -> list:
+    """Prefix every chunk after the first with the last overlap_tokens of its predecessor."""
+    if overlap_tokens <= 0 or len(chunks) < 2:
+        return chunks
+    tail_len = tok.fit(overlap_tokens)
+    out = [chunks[0]]
+    for text, units in chunks[1:]:
+        prev_units = out[-1][1]
+        tail = tok.decode(prev_units[-min(len(prev_units), tail_len):])
+        candidate, cand_units = tok.pair((tail + "\n" + text).strip())
+        if tok.count(cand_units) > hard_cap:
+            candidate, cand_units, _ = tok.prefix(cand_units, hard_cap)
+        out.append((candidate, cand_units))
+    return out
+
+def _package(chunks: list, tok: _Tokens) -> list:
+    result, running_tok = [], 0
+    total = len(chunks)
+    for idx, (c, units) in enumerate(chunks):
+        ctoks = tok.count(units)
+        sha = hashlib.sha256(c.encode("utf-8")).hexdigest()
+        result.append({
+            "index": idx,
+            "total": total,
+            "content": c,
+            "sha256": sha,
+            "start_token": running_tok,
+            "end_token": running_tok + ctoks - 1
+        })
+        running_tok += ctoks
+    return result
+
+def _split_paragraph(para: str, hard_cap: int, tok: _Tokens) -> list:
+    """An oversized paragraph as (text, units) pieces: whole sentences, hard-sliced on tokens when one is too long."""
+    chunks = []
+    sent_sep_toks = tok.count(tok.encode(" "))
+    sentences = re.split(r"(?<=[.!?])\s+(?=[A-Z0-9\"'])", para.strip())
+    buf, buf_tokens = [], 0
+    for sent in sentences:
+        sunits = tok.encode(sent)
+        stoks = tok.count(sunits)
+        if stoks <= hard_cap:
+            if buf and buf_tokens + sent_sep_toks + stoks <= hard_cap:
+                buf.append(sent); buf_tokens += sent_sep_toks + stoks
+            else:
+                if buf:
+                    chunks.append(tok.pair(" ".join(buf).strip()))
+                buf, buf_tokens = [sent], stoks
+        else:
+            if buf:
+                chunks.append(tok.pair(" ".join(buf).strip())); buf, buf_tokens = [], 0
+            # hard-slice on token offsets of the already-encoded sentence
+            step, i = tok.fit(hard_cap), 0
+            while tok.count(sunits[i:i + step + 1]) > hard_cap:
+                piece, ids, used = tok.prefix(sunits[i:i + step], hard_cap)
+                chunks.append((piece, ids))
+                i += used
+            rest = tok.decode(sunits[i:]).strip()
+            if rest:
+                chunks.append(tok.pair(rest))
+    if buf:
+        chunks.append(tok.pair(" ".join(buf).strip()))
+    return chunks
+
+# ------------- SECTION-AWARE PROSE -------------
+# Text with "#" heading lines (htmlText's output, kbEmbeddings.topic_outline) is read
+# as a heading tree. A section that fits the cap (with its breadcrumb) stays whole;
+# one that does not is opened up: its own paragraphs and its sub-sections become
+# pieces under a breadcrumb naming it. Consecutive pieces under the same breadcrumb are
+# packed together (a piece from a section opened inside the chunk's own one joins it
+# with its heading lines), and every chunk starts with its breadcrumb ("Title >
+# Section"), so a chunk carries its parent headings instead of a token overlap.
+_HEADING = re.compile(r"(#{1,6})[ \t]+(\S.*)")
+BREADCRUMB_SEP = " > "
+
+class _Section:
+    __slots__ = ("level", "title", "heading", "blocks", "children", "tokens")
+
+    def __init__(self, level: int, title: str = "", heading: str = ""):
+        self.level = level
+        self.title = title
+        self.heading = heading
+        self.blocks = []        # (text, tokens) of the section's own paragraphs
+        self.children = []
+        self.tokens = 0         # whole section, heading and sub-sections included
+
+    def render(self) -> str:
+        parts = [self.heading] if self.heading else []
+        parts += [b for b, _ in self.blocks]
+        parts += [c.render() for c in self.children]
+        return "\n\n".join(parts)
+
+def _section_tree(text: str, tok: _Tokens, sep_toks: int) -> _Section:
+    root = _Section(0)
+    stack = [root]
+    for block in re.split(r"\n{2,}", text):
+        block = block.strip()
+        if not block:
+            continue
+        first, _, rest = block.partition("\n")
+        m = _HEADING.fullmatch(first.strip())
+        if m:
+            level = len(m.group(1))
+            while stack[-1].level >= level:
+                stack.pop()
+            node = _Section(level, m.group(2).strip(), first.strip())
+            stack[-1].children.append(node)
+            stack.append(node)
+            block = rest.strip()
+            if not block:
+                continue
+        stack[-1].blocks.append((block, tok.count(tok.encode(block))))
+
+    def total(node: _Section) -> int:
+        sizes = [tok.count(tok.encode(node.heading))] if node.heading else []
+        sizes += [n for _, n in node.blocks]
+        sizes += [total(c) for c in node.children]
+        node.tokens = sum(sizes) + sep_toks * max(0, len(sizes) - 1)
+        return node.tokens
+
+    total(root)
+    return root
+
+def _section_chunks(text: str, hard_cap: int, tok: _Tokens) -> list:
+    sep_toks = tok.count(tok.encode("\n\n"))
+    crumbs = {}     # path (tuple of opened sections) -> (breadcrumb line, tokens it costs a chunk)
+
+    def crumb(path: tuple) -> tuple:
+        if path not in crumbs:
+            if not path:
+                crumbs[path] = ("", 0)
+            else:
+                line, units = tok.pair(BREADCRUMB_SEP.join(node.title for node in path))
+                if tok.count(units) > hard_cap // 4:     # deep or long headings: keep most of the cap for text
+                    line, units, _ = tok.prefix(units, hard_cap // 4)
+                crumbs[path] = (line, tok.count(units) + sep_toks)
+        return crumbs[path]
+
+    def pieces(node: _Section, path: tuple):
+        if node.tokens + crumb(path)[1] <= hard_cap:
+            yield path, node.render(), node.tokens
+            return
+        inner = path + (node,) if node.title else path
+        budget = hard_cap - crumb(inner)[1]
+        for block, n in node.blocks:
+            if n <= budget:
+                yield inner, block, n
+            else:
+                for piece, units in _split_paragraph(block, budget, tok):
+                    yield inner, piece, tok.count(units)
+        for child in node.children:
+            yield from pieces(child, inner)
+
+    chunks = []
+    current, current_tokens, current_path = [], 0, None
+
+    def flush_current():
+        if current:
+            line = crumb(current_path)[0]
+            chunks.append(tok.pair("\n\n".join([line] + current if line else current)))
+
+    for path, piece, n in pieces(_section_tree(text, tok, sep_toks), ()):
+        if current and path[:len(current_path)] == current_path:
+            # same section, or one opened inside it: the latter's headings go in the text
+            headings = [node.heading for node in path[len(current_path):]]
+            extra = sum(tok.count(tok.encode(h)) + sep_toks for h in headings)
+            if current_tokens + extra + sep_toks + n <= hard_cap - crumb(current_path)[1]:
+                current.extend(headings + [piece]); current_tokens += extra + sep_toks + n
+                continue
+        flush_current()
+        current, current_tokens, current_path = [piece], n, path
+    flush_current()
+    return chunks
 
 def chunk_for_lm_studio(
     text: str,
@@ -8,11 +450,15 @@ def chunk_for_lm_studio(
     reserve_tokens: int = 0,
     detect_json: bool = True,
     json_max_bytes: int | None = None,    # optional hard byte cap per JSON chunk; if None, derived from max_tokens
-    pretty_json: bool = True              # indent JSON envelopes for readability
+    pretty_json: bool = True,             # indent JSON envelopes for readability
+    sections: bool = False                # prose: split on "#" headings, breadcrumbs instead of overlap
 ):
     """
     Token-safe chunker with JSON awareness.
 
+    - text may also be an already-parsed JSON value (dict/list), which is packed into
+      envelopes directly.
+
     - If the input looks like JSON (and detect_json=True), it splits structure-aware into
       multiple VALID JSON documents, each wrapped as:
         {"path": "<pointer-ish>", "data": <partial JSON>}
@@ -21,279 +467,103 @@ def chunk_for_lm_studio(
 
     - Otherwise, it uses a token-based strategy (paragraph -> sentence -> word) with overlap.
 
+    - sections=True reads prose as a tree of "#" heading lines instead: whole sections
+      are packed up to the cap, and each chunk opens with the breadcrumb of its parent
+      headings in place of overlap (overlap_tokens is ignored).
+
+    The encoder is cached per process (get_encoder) and each piece of input is tokenized
+    once; use chunk_many() to chunk a batch of documents.
+
     Returns: List[dict] with: index, total, content, sha256, start_token, end_token
     """
 
-    # --- tokenizer helpers (tiktoken optional) ---
-    try:
-        import tiktoken
-        enc = tiktoken.get_encoding(encoding_name)
-        def count_tokens(s: str) -> int: return len(enc.encode(s))
-        def trim_to_tokens(s: str, target: int) -> str:
-            ids = enc.encode(s)
-            if len(ids) <= target: return s
-            return enc.decode(ids[:target])
-    except Exception:
-        enc = None
-        def count_tokens(s: str) -> int:
-            # conservative over-estimate: tokens ~ words / 0.75
-            return math.ceil(len(s.split()) / 0.75) if s else 0
-        def trim_to_tokens(s: str, target: int) -> str:
-            words = s.split()
-            n = max(1, math.floor(target * 0.75))
-            return " ".join(words[:n])
+    tok = _Tokens(encoding_name)
 
     hard_cap = max_tokens - max(0, reserve_tokens)
     if hard_cap <= 0:
         raise ValueError("max_tokens must be greater than reserve_tokens")
 
     # ------------- JSON-AWARE BRANCH -------------
-    def _size_bytes(s: str) -> int:
-        return len(s.encode("utf-8", "replace"))
+    # derive a byte ceiling from tokens if explicit json_max_bytes not set
+    if json_max_bytes is None:
+        # crude mapping: ~4 chars per token + envelope headroom
+        approx_chars = hard_cap * 4
+        json_max_bytes = max(16_000, min(256_000, approx_chars))
 
-    def _wrap(path: str, payload, pretty: bool) -> str:
-        if pretty:
-            return json.dumps({"path": path, "data": payload}, ensure_ascii=False, indent=2)
-        return json.dumps({"path": path, "data": payload}, ensure_ascii=False, separators=(",", ":"))
-
-    def _byte_chunks_fallback(raw: str, max_bytes: int, path: str, pretty: bool):
-        bs = raw.encode("utf-8", "replace")
-        out = []
-        i = 0
-        # keep some headroom for the {"path":..,"data":..} envelope
-        overhead = 64 + len(path.encode("utf-8", "replace"))
-        while i < len(bs):
-            j = min(len(bs), i + max(1024, max_bytes - overhead))
-            if j < len(bs):
-                # back up to a likely boundary
-                back = 0
-                while j - back > i and bs[j - back:j - back + 1] not in b", \n\r\t}]":
-                    back += 1
-                if j - back <= i:
-                    back = 0
-                j -= back
-            chunk = bs[i:j].decode("utf-8", "replace")
-            out.append(_wrap(path, chunk, pretty))
-            i = j
-        return out
-
-    def _split_any(obj, max_bytes: int, path: str, pretty: bool):
-        if isinstance(obj, dict):
-            return _pack_dict(obj, max_bytes, path, pretty)
-        if isinstance(obj, list):
-            return _pack_list(obj, max_bytes, path, pretty)
-        s = _wrap(path, obj, pretty)
-        if _size_bytes(s) <= max_bytes:
-            return [s]
-        # extremely long primitive (usually a huge string)
-        raw = json.dumps(obj, ensure_ascii=False)
-        return _byte_chunks_fallback(raw, max_bytes, path, pretty)
-
-    def _pack_dict(d: dict, max_bytes: int, path: str, pretty: bool):
-        out, current = [], {}
-        for k, v in d.items():
-            tentative = dict(current); tentative[k] = v
-            if _size_bytes(_wrap(path, tentative, pretty)) <= max_bytes:
-                current = tentative
-                continue
-            single = _wrap(f"{path}.{k}" if path else k, v, pretty)
-            if _size_bytes(single) <= max_bytes:
-                if current:
-                    out.append(_wrap(path, current, pretty)); current = {}
-                out.append(single)
-            else:
-                if current:
-                    out.append(_wrap(path, current, pretty)); current = {}
-                out.extend(_split_any(v, max_bytes, f"{path}.{k}" if path else k, pretty))
-        if current:
-            out.append(_wrap(path, current, pretty))
-        return out
-
-    def _pack_list(arr: list, max_bytes: int, path: str, pretty: bool):
-        out, buf = [], []
-        for idx, item in enumerate(arr):
-            tentative = list(buf); tentative.append(item)
-            if _size_bytes(_wrap(path, tentative, pretty)) <= max_bytes:
-                buf = tentative
-                continue
-            single = _wrap(f"{path}[{idx}]", item, pretty)
-            if _size_bytes(single) <= max_bytes:
-                if buf:
-                    out.append(_wrap(path, buf, pretty)); buf = []
-                out.append(single)
-            else:
-                if buf:
-                    out.append(_wrap(path, buf, pretty)); buf = []
-                out.extend(_split_any(item, max_bytes, f"{path}[{idx}]", pretty))
-        if buf:
-            out.append(_wrap(path, buf, pretty))
-        return out
+    if not isinstance(text, str):
+        # already parsed (e.g. apiRoutes.fetch_api_data): no serialize/parse round-trip
+        chunks = [(c, tok.encode(c)) for c in pack_json(text, json_max_bytes, pretty=pretty_json)]
+        return _package(_with_overlap(chunks, overlap_tokens, hard_cap, tok), tok)
 
     looks_like_json = detect_json and text.strip()[:1] in "{[" and text.strip()[-1:] in "}]"
     if looks_like_json:
         try:
             obj = json.loads(text)
-            # derive a byte ceiling from tokens if explicit json_max_bytes not set
-            if json_max_bytes is None:
-                # crude mapping: ~4 chars per token + envelope headroom
-                approx_chars = hard_cap * 4
-                json_max_bytes = max(16_000, min(256_000, approx_chars))
-            json_chunks = _split_any(obj, json_max_bytes, path="", pretty=pretty_json)
-
-            # convert json chunks -> standardized result with metadata
-            result = []
-            running_tok = 0
-            total = len(json_chunks)
-            for idx, c in enumerate(json_chunks):
-                ctoks = count_tokens(c)
-                sha = hashlib.sha256(c.encode("utf-8")).hexdigest()
-                result.append({
-                    "index": idx,
-                    "total": total,
-                    "content": c,
-                    "sha256": sha,
-                    "start_token": running_tok,
-                    "end_token": running_tok + ctoks - 1
-                })
-                running_tok += ctoks
-
-            # Optional: add small overlap (by tokens) to aid continuity
-            if overlap_tokens > 0 and len(result) > 1:
-                overlapped = []
-                for i, part in enumerate(result):
-                    c = part["content"]
-                    if i == 0:
-                        overlapped.append(part)
-                        continue
-                    prev = overlapped[-1]["content"]
-                    if enc:
-                        prev_ids = enc.encode(prev)
-                        tail_ids = prev_ids[-min(len(prev_ids), overlap_tokens):]
-                        tail = enc.decode(tail_ids)
-                    else:
-                        prev_words = prev.split()
-                        tail = " ".join(prev_words[-max(1, math.floor(overlap_tokens * 0.75)):])
-                    candidate = (tail + "\n" + c).strip()
-                    if count_tokens(candidate) > hard_cap:
-                        candidate = trim_to_tokens(candidate, hard_cap)
-                    # refresh metadata
-                    ctoks = count_tokens(candidate)
-                    sha = hashlib.sha256(candidate.encode("utf-8")).hexdigest()
-                    part = part.copy()
-                    part["content"] = candidate
-                    part["sha256"] = sha
-                    part["start_token"] = overlapped[-1]["end_token"] + 1
-                    part["end_token"] = part["start_token"] + ctoks - 1
-                    overlapped.append(part)
-                result = overlapped
-
-            # normalize indexes/total
-            for i, r in enumerate(result):
-                r["index"], r["total"] = i, len(result)
-            return result
+            json_chunks = pack_json(obj, json_max_bytes, pretty=pretty_json)
+
+            # each envelope is tokenized once; overlap and metadata reuse the ids
+            chunks = [(c, tok.encode(c)) for c in json_chunks]
+            return _package(_with_overlap(chunks, overlap_tokens, hard_cap, tok), tok)
 
         except Exception:
             # parsing failed -> fall through to prose splitter
             pass
 
     # ------------- PROSE/TEXT BRANCH (token-based) -------------
+    # Paragraphs (and sentences of oversized paragraphs) are tokenized once for planning;
+    # each emitted chunk is encoded once more so its metadata counts the exact text.
     text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if sections:
+        return _package(_section_chunks(text, hard_cap, tok), tok)
     paragraphs = re.split(r"\n{2,}", text)
+    para_sep_toks = tok.count(tok.encode("\n\n"))
 
-    chunks, current, current_tokens = [], [], 0
+    chunks = []                                   # (text, units)
+    current, current_tokens = [], 0
 
     def flush_current():
-        nonlocal chunks, current, current_tokens
+        nonlocal current, current_tokens
         if not current: return
-        chunk_text = "\n\n".join(current).strip()
-        chunks.append(chunk_text)
+        chunks.append(tok.pair("\n\n".join(current).strip()))
         current, current_tokens = [], 0
 
     for para in paragraphs:
-        ptoks = count_tokens(para)
+        punits = tok.encode(para)
+        ptoks = tok.count(punits)
         if ptoks <= hard_cap:
-            sep_toks = count_tokens("\n\n") if current else 0
-            if current_tokens + sep_toks + ptoks <= hard_cap:
-                if current:
-                    current.append(para); current_tokens += sep_toks + ptoks
-                else:
-                    current = [para]; current_tokens = ptoks
+            if current and current_tokens + para_sep_toks + ptoks <= hard_cap:
+                current.append(para); current_tokens += para_sep_toks + ptoks
             else:
                 flush_current()
-                current = [para]; current_tokens = ptoks
+                current, current_tokens = [para], ptoks
         else:
             flush_current()
-            sentences = re.split(r"(?<=[.!?])\s+(?=[A-Z0-9\"'])", para.strip())
-            buf, buf_tokens = [], 0
-            for sent in sentences:
-                stoks = count_tokens(sent)
-                if stoks <= hard_cap:
-                    sep = count_tokens(" ") if buf else 0
-                    if buf_tokens + sep + stoks <= hard_cap:
-                        if buf:
-                            buf.append(sent); buf_tokens += sep + stoks
-                        else:
-                            buf = [sent]; buf_tokens = stoks
-                    else:
-                        if buf:
-                            chunks.append(" ".join(buf).strip()); buf, buf_tokens = [], 0
-                        buf = [sent]; buf_tokens = stoks
-                else:
-                    if buf:
-                        chunks.append(" ".join(buf).strip()); buf, buf_tokens = [], 0
-                    big = sent
-                    while count_tokens(big) > hard_cap:
-                        slice_text = trim_to_tokens(big, hard_cap)
-                        chunks.append(slice_text.strip())
-                        if enc:
-                            used_ids = enc.encode(slice_text)
-                            remaining_ids = enc.encode(big)[len(used_ids):]
-                            big = enc.decode(remaining_ids)
-                        else:
-                            used_words = len(slice_text.split())
-                            big = " ".join(big.split()[used_words:])
-                    if big.strip():
-                        chunks.append(big.strip())
-            if buf:
-                chunks.append(" ".join(buf).strip())
-            current, current_tokens = [], 0
+            chunks.extend(_split_paragraph(para, hard_cap, tok))
 
     flush_current()
 
-    # apply overlap to prose chunks
-    if overlap_tokens > 0 and len(chunks) > 1:
-        overlapped = []
-        for i, c in enumerate(chunks):
-            if i == 0:
-                overlapped.append(c); continue
-            prev = overlapped[-1]
-            if enc:
-                prev_ids = enc.encode(prev)
-                tail_ids = prev_ids[-min(len(prev_ids), overlap_tokens):]
-                tail = enc.decode(tail_ids)
-            else:
-                prev_words = prev.split()
-                tail = " ".join(prev_words[-max(1, math.floor(overlap_tokens * 0.75)):])
-            candidate = (tail + "\n" + c).strip()
-            if count_tokens(candidate) > hard_cap:
-                candidate = trim_to_tokens(candidate, hard_cap)
-            overlapped.append(candidate)
-        chunks = overlapped
-
-    # package metadata for prose
-    result, running_tok = [], 0
-    total = len(chunks)
-    for idx, c in enumerate(chunks):
-        ctoks = count_tokens(c)
-        sha = hashlib.sha256(c.encode("utf-8")).hexdigest()
-        result.append({
-            "index": idx,
-            "total": total,
-            "content": c,
-            "sha256": sha,
-            "start_token": running_tok,
-            "end_token": running_tok + ctoks - 1
-        })
-        running_tok += ctoks
+    return _package(_with_overlap(chunks, overlap_tokens, hard_cap, tok), tok)
 
-    return result
+def chunk_many(
+    texts: list,
+    max_tokens: int,
+    workers: int | None = None,
+    **options
+) -> list:
+    """
+    Chunk many documents with the same options (see chunk_for_lm_studio).
+
+    Small batches run in-process; large ones are spread over a process pool, where each
+    worker keeps its own cached encoder. workers=None picks os.cpu_count() for batches
+    of 64+ documents.
+
+    Returns: one chunk list per input text, in input order.
+    """
+    texts = list(texts)
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(texts) >= 64 else 1
+    if workers <= 1 or len(texts) < 2:
+        return [chunk_for_lm_studio(t, max_tokens, **options) for t in texts]
+    job = partial(chunk_for_lm_studio, max_tokens=max_tokens, **options)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(job, texts, chunksize=max(1, len(texts) // (workers * 4))))
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import envConfig  # noqa: F401
+from promptParsing import count_tokens
+
+# Tunables (override in .env)
+PREFIX_SESSIONS = int(os.getenv("PREFIX_SESSIONS", "1024"))   # sessions whose last prompt is remembered
+LLM_SLOTS = int(os.getenv("LLM_SLOTS", "0"))                  # llama.cpp-style KV slots; 0 = let the server pick
+
+
+def session_key(data: dict, headers) -> str:
+    """
+    The conversation a request belongs to: the client's session_id (body or X-Session-Id
+    header) or, failing that, the page URL, so repeated turns on one page share a key.
+    """
+    session = data.get("session_id") or headers.get("X-Session-Id") or (data.get("url") or "").strip()
+    return str(session)
+
+
+def affinity_options(session: str) -> dict:
+    """
+    Extra chat-completion fields that keep a session on the same server-side prompt cache.
+    "user" is the standard OpenAI field; with LLM_SLOTS set, servers that expose KV slots
+    (llama.cpp) are also pinned to one slot per session.
+    """
+    if not session:
+        return {}
+    options = {"user": hashlib.sha256(session.encode("utf-8")).hexdigest()[:16]}
+    if LLM_SLOTS > 0:
+        options["id_slot"] = int(options["user"], 16) % LLM_SLOTS
+        options["cache_prompt"] = True
+    return options
+
+
+class PrefixTracker:
+    """
+    Remembers the last prompt of each session as (message hash, token count) pairs and
+    reports how many leading prompt tokens a new turn shares with it, which is what a
+    server with prefix caching can skip in prefill.
+    """
+
+    def __init__(self, max_sessions: int = PREFIX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(messages: list) -> list:
+        out = []
+        for m in messages:
+            content = m["content"]
+            digest = hashlib.sha256(f"{m['role']}\0{content}".encode("utf-8")).digest()
+            out.append((digest, count_tokens(content)))
+        return out
+
+    def observe(self, session: str, messages: list) -> dict:
+        """
+        Returns:
+            {"prompt_tokens", "prefill_tokens_saved"} for this turn of the session.
+        """
+        current = self._fingerprint(messages)
+        with self._lock:
+            previous = self._sessions.pop(session, None) or []
+            self._sessions[session] = current
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        saved = 0
+        for (a, tokens), (b, _) in zip(current, previous):
+            if a != b:
+                break
+            saved += tokens
+        return {"prompt_tokens": sum(t for _, t in current), "prefill_tokens_saved": saved}
+
+
+_tracker = PrefixTracker()
+
+
+def observe_prefix(session: str, messages: list) -> dict:
+    return _tracker.observe(session, messages)
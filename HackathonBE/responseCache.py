@@ -0,0 +1,226 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import envConfig  # noqa: F401
+
+# Tunables (override in .env)
+CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_PATH = os.getenv("FETCH_CACHE_PATH", "")        # e.g. index/fetch_cache.sqlite to share across workers
+CACHE_DISK_MAX_BYTES = int(os.getenv("FETCH_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))   # SQLite tier bodies
+CACHE_STALE_TTL = float(os.getenv("FETCH_CACHE_STALE_TTL", "86400"))   # seconds a stale row is kept for revalidation
+CACHE_ENABLED = os.getenv("FETCH_CACHE", "1") != "0"
+USED_RESOLUTION = 60.0      # seconds; a shared row's access time is only rewritten when older than this
+
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "last_modified", "expires")
+
+    def __init__(self, body: bytes, etag: str | None, last_modified: str | None, expires: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    @property
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class _SqliteStore:
+    """
+    Optional second tier shared by every worker on the box (one row per cache key).
+    Bodies are capped at max_bytes, least recently used rows going first, and rows
+    stale for longer than stale_ttl are purged: they are past any useful revalidation.
+    """
+
+    def __init__(self, path: str, max_bytes: int = CACHE_DISK_MAX_BYTES, stale_ttl: float = CACHE_STALE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, body BLOB, etag TEXT, last_modified TEXT, expires REAL,"
+            " size INTEGER NOT NULL DEFAULT 0, used REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(responses)")}
+        try:
+            if "size" not in columns:     # a store written before the budget existed
+                conn.execute("ALTER TABLE responses ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE responses SET size = length(body)")
+            if "used" not in columns:
+                conn.execute("ALTER TABLE responses ADD COLUMN used REAL NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass    # another worker migrated it first
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT body, etag, last_modified, expires, used FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[4] > USED_RESOLUTION:     # LRU order only needs coarse times; most reads stay reads
+            conn.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+        return CacheEntry(*row[:4])
+
+    def put(self, key: str, entry: CacheEntry) -> tuple:
+        """Store entry, then purge and trim the table. Returns (rows purged, rows evicted)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, expires, size, used)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, entry.body, entry.etag, entry.last_modified, entry.expires, len(entry.body), now),
+        )
+        purged = conn.execute("DELETE FROM responses WHERE expires < ?", (now - self.stale_ttl,)).rowcount
+        evicted = 0
+        if conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] > self.max_bytes:
+            # keep the most recently used rows that fit in the budget
+            evicted = conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM"
+                " (SELECT key, SUM(size) OVER (ORDER BY used DESC, key) AS running FROM responses)"
+                " WHERE running > ?)", (self.max_bytes,)
+            ).rowcount
+        return purged, evicted
+
+
+class ResponseCache:
+    """
+    LRU response cache for Rentvine GETs with a byte budget, per-entry TTL and
+    validators for conditional revalidation. Entries past their TTL are kept (while
+    the budget allows) so a 304 can refresh them without re-downloading the body.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, path: str = CACHE_PATH):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._store = _SqliteStore(path) if path else None
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0, "stores": 0, "shared_hits": 0,
+                         "shared_purged": 0, "shared_evictions": 0}
+
+    @staticmethod
+    def make_key(url: str, auth: tuple | None) -> str:
+        # Credentials are part of the key (different users may see different data) but never stored
+        who = hashlib.sha256("\0".join(auth).encode("utf-8")).hexdigest()[:16] if auth else "anon"
+        return f"{who}:{url}"
+
+    def record(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key: str):
+        """
+        Return the entry for key (fresh or stale) or None. A local entry that is stale is
+        checked against the shared tier first, since another worker may have refreshed it;
+        shared hits are promoted into memory.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if self._store is None or entry is not None and entry.fresh:
+            return entry
+        shared = self._store.get(key)
+        if shared is not None and (entry is None or shared.expires > entry.expires):
+            self.record("shared_hits")
+            self._put_local(key, shared)
+            return shared
+        return entry
+
+    def _put_local(self, key: str, entry: CacheEntry):
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self.counters["evictions"] += 1
+
+    def put(self, key: str, entry: CacheEntry):
+        self._put_local(key, entry)
+        purged = evicted = 0
+        if self._store is not None:
+            purged, evicted = self._store.put(key, entry)
+        with self._lock:
+            self.counters["stores"] += 1
+            self.counters["shared_purged"] += purged
+            self.counters["shared_evictions"] += evicted
+
+    def touch(self, key: str, entry: CacheEntry, ttl: float):
+        """A 304 came back: extend the existing entry instead of replacing the body."""
+        entry.expires = time.time() + ttl
+        self.put(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(
+                self.counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                hit_rate=round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                shared=bool(self._store),
+            )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache, or None when FETCH_CACHE=0."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def cache_stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache else {"enabled": False}
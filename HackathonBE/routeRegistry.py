@@ -0,0 +1,214 @@
+from functools import lru_cache
+
+MEMO_SIZE = 4096      # recently resolved paths kept per registry
+INCLUDES_SEP = "%2C"  # includes strings are stored pre-encoded
+
+
+class ApiCall:
+    """
+    One Rentvine API call in a route's fetch plan.
+
+    path is a template: "{id}" is the page's numeric ID. A call with after="portfolio"
+    runs once the "portfolio" call has landed, and "{value}" in its path is filled from
+    the dotted field (e.g. "ledger.ledgerID") of that response.
+
+    projections maps question intents to the relations (comma-separated names from
+    includes) each needs; "core" relations are always fetched. A call with `when` is
+    only made for questions with one of those intents. See project().
+    """
+    __slots__ = ("key", "path", "includes", "after", "field", "projections", "when")
+
+    def __init__(self, path: str, includes: str = "", key: str | None = None,
+                 after: str | None = None, field: str | None = None,
+                 projections: dict | None = None, when: tuple = ()):
+        if (after is None) != (field is None):
+            raise ValueError(f"{path}: 'after' and 'field' must be given together")
+        self.key = key
+        self.path = path
+        self.includes = includes
+        self.after = after
+        self.field = field
+        self.projections = {}
+        if projections:
+            available = set(includes.split(INCLUDES_SEP))
+            for intent, names in projections.items():
+                relations = tuple(n.strip() for n in names.split(",") if n.strip())
+                unknown = set(relations) - available
+                if unknown:
+                    raise ValueError(f"{path}: projection {intent!r} names relations not in includes: {sorted(unknown)}")
+                self.projections[intent] = relations
+        self.when = frozenset(when)
+
+    def project(self, intents: frozenset):
+        """
+        Returns:
+            (call, omitted): a copy of this call whose includes are the core relations
+            plus those of the matched intents (in includes order), and the relations left
+            out. Unchanged, with nothing omitted, when no intent has a projection here.
+        """
+        matched = [self.projections[i] for i in intents if i in self.projections]
+        if not matched:
+            return self, ()
+        keep = set(self.projections.get("core", ())).union(*matched)
+        relations = list(dict.fromkeys(self.includes.split(INCLUDES_SEP)))
+        kept = [r for r in relations if r in keep]
+        omitted = tuple(r for r in relations if r not in keep)
+        if not omitted:
+            return self, ()
+        call = ApiCall(self.path, INCLUDES_SEP.join(kept), self.key, self.after, self.field)
+        return call, omitted
+
+    def url(self, base: str, params: dict, parent=None) -> str:
+        values = dict(params)
+        if self.after is not None:
+            value = parent
+            for part in self.field.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            if not value:
+                raise ValueError(f"Could not find {self.field} in {self.after} response.")
+            values["value"] = value
+        api = base + self.path.format(**values)
+        if self.includes:
+            api += f"?includes={self.includes}"
+        return api
+
+
+class Route:
+    """A resolved page type: its fetch plan plus per-route timeout and cache TTL."""
+    __slots__ = ("name", "template", "calls", "timeout", "cache_ttl")
+
+    def __init__(self, name: str, template: str, calls: list, timeout, cache_ttl: float):
+        keys = [c.key for c in calls]
+        if len(calls) > 1 and (None in keys or len(set(keys)) != len(keys)):
+            raise ValueError(f"{template}: calls of a multi-call route need unique keys")
+        self.name = name
+        self.template = template
+        self.calls = calls
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+
+    @property
+    def first_calls(self) -> list:
+        """Calls that do not depend on another response."""
+        return [c for c in self.calls if c.after is None]
+
+    def project(self, intents: frozenset):
+        """
+        The fetch plan for a question with these intents (see ApiCall.project). Calls
+        restricted by `when` are dropped when the question has none of their intents,
+        unless another call depends on them. An empty intents set means the full plan.
+
+        Returns:
+            (calls, omitted) where omitted lists "key.relation" (or "relation" on
+            single-call routes, "key" for dropped calls) that were not fetched.
+        """
+        if not intents:
+            return self.calls, []
+        needed = {c.after for c in self.calls if c.after is not None}
+        calls, omitted = [], []
+        for c in self.calls:
+            if c.when and not (c.when & intents) and c.key not in needed:
+                omitted.append(c.key)
+                continue
+            call, left_out = c.project(intents)
+            calls.append(call)
+            prefix = f"{c.key}." if len(self.calls) > 1 else ""
+            omitted.extend(prefix + r for r in left_out)
+        return calls, omitted
+
+    def trim(self, payload, omitted: list):
+        """
+        Drop what a projected plan would not have fetched (project()'s omitted list) from
+        a payload fetched with the full plan, without mutating it; relations are the
+        top-level keys of each call's body.
+        """
+        if not omitted or not isinstance(payload, dict):
+            return payload
+        if len(self.calls) == 1:
+            drop = set(omitted)
+            return {k: v for k, v in payload.items() if k not in drop}
+        out = dict(payload)
+        for name in omitted:
+            key, _, relation = name.partition(".")
+            if not relation:
+                out.pop(key, None)
+            elif isinstance(out.get(key), dict) and relation in out[key]:
+                out[key] = {k: v for k, v in out[key].items() if k != relation}
+        return out
+
+    def combine(self, results: dict):
+        """Single-call routes return the body itself; others a dict keyed by call key."""
+        if len(self.calls) == 1:
+            return results[self.calls[0].key]
+        return {c.key: results[c.key] for c in self.calls if c.key in results}
+
+
+class _Node:
+    __slots__ = ("children", "param", "param_node", "route")
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.param_node = None
+        self.route = None
+
+
+def _segments(path: str) -> list:
+    path = path.strip("/")
+    return path.split("/") if path else []
+
+
+class RouteRegistry:
+    """
+    Compiles route templates ("/portfolios/{id}") into a prefix trie of path segments.
+    Resolving walks the trie once, so lookup cost is O(path length) however many page
+    types are registered; "{name}" segments match numeric IDs only. Recent resolutions
+    are memoized.
+    """
+
+    def __init__(self, routes: list, default_timeout, default_ttl: float, memo_size: int = MEMO_SIZE):
+        self._root = _Node()
+        self.routes = []
+        for spec in routes:
+            self.add(Route(
+                spec.get("name") or spec["template"],
+                spec["template"],
+                spec["calls"],
+                spec.get("timeout", default_timeout),
+                spec.get("cache_ttl", default_ttl),
+            ))
+        self.resolve = lru_cache(maxsize=memo_size)(self._resolve)
+
+    def add(self, route: Route):
+        node = self._root
+        for seg in _segments(route.template):
+            if seg.startswith("{") and seg.endswith("}"):
+                name = seg[1:-1]
+                if node.param_node is None:
+                    node.param, node.param_node = name, _Node()
+                elif node.param != name:
+                    raise ValueError(f"{route.template}: '{{{name}}}' conflicts with '{{{node.param}}}'")
+                node = node.param_node
+            else:
+                node = node.children.setdefault(seg, _Node())
+        if node.route is not None:
+            raise ValueError(f"Duplicate route template: {route.template}")
+        node.route = route
+        self.routes.append(route)
+
+    def _resolve(self, path: str):
+        """
+        Returns:
+            (Route, params) for a URL path (no scheme/host/query), or (None, {}) when
+            no route matches. params is shared by the memo and must not be mutated.
+        """
+        node, params = self._root, {}
+        for seg in _segments(path):
+            child = node.children.get(seg)
+            if child is None and node.param_node is not None and seg.isdecimal():
+                params[node.param] = seg
+                child = node.param_node
+            if child is None:
+                return None, {}
+            node = child
+        return node.route, params
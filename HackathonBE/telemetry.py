@@ -0,0 +1,288 @@
+"""
+Per-request stage timings, Prometheus metrics and logging for the query pipeline.
+
+    with span("fetch"):
+        api_data = fetch_page_data(data)
+
+Every span is observed in the vinny_stage_seconds histogram (scraped from /metrics) and
+added to the current request's Trace, whose stage breakdown is logged for a sample of
+requests (LOG_SAMPLE_RATE) and, when OTEL_EXPORTER_OTLP_ENDPOINT is set and the
+opentelemetry SDK is installed, exported as OpenTelemetry spans.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import envConfig  # noqa: F401
+
+# Tunables (override in .env)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))   # share of requests whose stage timings are logged
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+OTEL_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "vinny-backend")
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _configure_logging() -> logging.Logger:
+    root = logging.getLogger("vinny")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root
+
+
+_root_logger = _configure_logging()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Levelled logger under "vinny"; pass arguments %-style so disabled levels cost nothing."""
+    return _root_logger.getChild(name)
+
+
+log = get_logger("telemetry")
+request_log = get_logger("request")
+
+
+def _label_text(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{k}="{v}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    __slots__ = ("name", "help", "buckets", "labelnames", "_series", "_lock")
+
+    def __init__(self, name: str, help: str, buckets: tuple = DURATION_BUCKETS, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series = {}      # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _label_text(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            inf = _label_text(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {counts[-2]:.6f}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {counts[-1]}")
+        return lines
+
+
+class Counter:
+    __slots__ = ("name", "help", "labelnames", "_values", "_lock")
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("vinny_stage_seconds", "Time spent per query pipeline stage.", labelnames=("stage",))
+FETCH_SECONDS = Histogram("vinny_upstream_fetch_seconds", "Rentvine API calls by cache outcome.",
+                          labelnames=("outcome",))
+LLM_TTFT_SECONDS = Histogram("vinny_llm_ttft_seconds", "LLM time to first token, queue wait included.")
+LLM_SECONDS = Histogram("vinny_llm_seconds", "LLM generation wall time by finish reason.",
+                        labelnames=("finish_reason",))
+RESPONSE_BYTES = Histogram("vinny_response_bytes", "Response body size.", SIZE_BUCKETS, labelnames=("kind",))
+REQUEST_SECONDS = Histogram("vinny_request_seconds", "End-to-end request time.", labelnames=("endpoint", "status"))
+REQUESTS = Counter("vinny_requests_total", "Requests by endpoint and status.", labelnames=("endpoint", "status"))
+
+_METRICS = [STAGE_SECONDS, FETCH_SECONDS, LLM_TTFT_SECONDS, LLM_SECONDS, RESPONSE_BYTES, REQUEST_SECONDS, REQUESTS]
+_gauge_sources = []     # (prefix, fn() -> flat dict of numbers)
+
+
+def add_gauge_source(prefix: str, fn):
+    """Export the numeric fields of fn() (e.g. cache_stats) as vinny_<prefix>_<field> gauges."""
+    _gauge_sources.append((prefix, fn))
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for prefix, fn in _gauge_sources:
+        try:
+            stats = fn()
+        except Exception as e:
+            log.warning("Gauge source %s failed: %s", prefix, e)
+            continue
+        for key, value in sorted(stats.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = f"vinny_{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_tracer = None          # None: not set up yet, False: export unavailable
+_tracer_lock = threading.Lock()
+
+
+def _get_tracer():
+    """OpenTelemetry tracer exporting over OTLP, or None when not configured / not installed."""
+    global _tracer
+    if not OTEL_ENDPOINT or _tracer is False:
+        return None
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                try:
+                    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                    from opentelemetry.sdk.resources import Resource
+                    from opentelemetry.sdk.trace import TracerProvider
+                    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                except ImportError:
+                    log.warning("opentelemetry SDK not installed; OTLP export disabled")
+                    _tracer = False
+                    return None
+                provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                _tracer = provider.get_tracer("vinny")
+    return _tracer
+
+
+class Trace:
+    """Stage timings of one request; see start_trace()."""
+    __slots__ = ("name", "started", "stages", "sampled", "finished", "_otel", "_lock")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.sampled = request_log.isEnabledFor(logging.INFO) and random.random() < LOG_SAMPLE_RATE
+        self.finished = False
+        self._lock = threading.Lock()
+        tracer = _get_tracer()
+        self._otel = tracer.start_span(name) if tracer else None
+
+    def record(self, stage: str, seconds: float, start: float | None = None):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self._otel is not None:
+            from opentelemetry import trace
+            end_ns = time.time_ns()
+            child = _get_tracer().start_span(stage, context=trace.set_span_in_context(self._otel),
+                                             start_time=end_ns - int(seconds * 1e9))
+            child.end(end_time=end_ns)
+
+    def finish(self, status: int, size: int | None = None, kind: str = "json"):
+        """Close the request: observe totals, log the breakdown if sampled, end the OTel span."""
+        if self.finished:
+            return
+        self.finished = True
+        elapsed = time.perf_counter() - self.started
+        if METRICS_ENABLED:
+            REQUEST_SECONDS.observe(elapsed, self.name, str(status))
+            REQUESTS.inc(self.name, str(status))
+            if size is not None:
+                RESPONSE_BYTES.observe(size, kind)
+        if self.sampled:
+            with self._lock:
+                stages = " ".join(f"{k}={v * 1000:.1f}ms" for k, v in self.stages.items())
+            request_log.info("%s %s %.1fms %s bytes=%s", self.name, status, elapsed * 1000, stages, size)
+        if self._otel is not None:
+            self._otel.set_attribute("http.status_code", status)
+            if size is not None:
+                self._otel.set_attribute("http.response.body.size", size)
+            self._otel.end()
+
+
+_current = contextvars.ContextVar("vinny_trace", default=None)
+
+
+def start_trace(name: str) -> Trace:
+    """Begin timing a request; spans opened in this context (and in copied contexts) join it."""
+    trace = Trace(name)
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def record_stage(stage: str, seconds: float, trace: Trace | None = None):
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+@contextmanager
+def span(stage: str, trace: Trace | None = None):
+    """Time a block as one pipeline stage."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, trace)
+
+
+def observe_fetch(seconds: float, outcome: str):
+    """One Rentvine API call: outcome is hit, revalidated, miss, uncached or error."""
+    if not METRICS_ENABLED:
+        return
+    FETCH_SECONDS.observe(seconds, outcome)
+    record_stage("upstream_fetch", seconds)
+
+
+def observe_llm(ttft: float | None, total: float, finish_reason, trace: Trace | None = None):
+    if not METRICS_ENABLED:
+        return
+    if ttft is not None:
+        LLM_TTFT_SECONDS.observe(ttft)
+        record_stage("llm_ttft", ttft, trace)
+    LLM_SECONDS.observe(total, str(finish_reason))
+    record_stage("llm_total", total, trace)
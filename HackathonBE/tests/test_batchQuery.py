@@ -0,0 +1,120 @@
+"""
+Tests for batchQuery.BatchRunner with stub fetch/chunk/build and a stub LLM scheduler.
+
+    python -m unittest discover -s tests        # from HackathonBE/
+"""
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batchQuery  # noqa: E402
+from batchQuery import BatchRunner  # noqa: E402
+from llmScheduler import Saturated  # noqa: E402
+
+SITE = "https://abchomes.rentvinedev.com"
+PAGE = SITE + "/portfolios/5"
+OTHER = SITE + "/portfolios/6"
+BROKEN = SITE + "/portfolios/404"
+
+
+class StubCall:
+    def __init__(self, scheduler, messages):
+        self.scheduler = scheduler
+        self.messages = messages
+
+    def result(self) -> dict:
+        with self.scheduler.lock:
+            if self.scheduler.saturations:
+                self.scheduler.saturations -= 1
+                raise Saturated("LLM queue is full", 3, 0)
+        return {"content": "answer to " + self.messages[-1]["content"], "usage": None}
+
+
+class StubScheduler:
+    """Answers every request; the first `saturations` results raise Saturated."""
+
+    def __init__(self, saturations: int = 0):
+        self.saturations = saturations
+        self.lock = threading.Lock()
+
+    def request(self, messages, client="", priority=0, **options):
+        return StubCall(self, messages)
+
+
+class BatchRunnerTests(unittest.TestCase):
+    def setUp(self):
+        self.fetches = []
+        self.lock = threading.Lock()
+        self.scheduler = StubScheduler()
+        patch = mock.patch.object(batchQuery, "get_scheduler", lambda: self.scheduler)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.runner = BatchRunner(self.fetch, self.chunk, self.build, fetch_workers=4, chunk_workers=0,
+                                  concurrency=4)
+
+    def fetch(self, data: dict):
+        with self.lock:
+            self.fetches.append(data["url"])
+        if data["url"] == BROKEN:
+            raise RuntimeError("404 Client Error")
+        return {"portfolio": {"portfolioID": int(data["url"].rsplit("/", 1)[1].split("?")[0])}}
+
+    def chunk(self, payload) -> list:
+        return [{"content": str(payload)}]
+
+    def build(self, data, question, session, api_data, parts, conversation):
+        return [{"role": "user", "content": question}], [], {}, None
+
+    def run_items(self, items: list) -> dict:
+        results = list(self.runner.run(items))
+        self.assertEqual(sorted(r["index"] for r in results), list(range(len(items))))
+        return {r["index"]: r for r in results}
+
+    def test_one_fetch_per_page(self):
+        items = [{"url": PAGE, "question": "Who are the owners?"},
+                 {"url": PAGE + "?tab=ledger", "question": "What is the balance?"},
+                 {"url": PAGE, "question": "Who are the owners?"},
+                 {"url": OTHER, "question": "Who are the owners?"}]
+        results = self.run_items(items)
+        self.assertEqual(sorted(self.fetches), [PAGE, OTHER])
+        self.assertEqual(results[1]["answer"], "answer to What is the balance?")
+        self.assertEqual(self.runner.stats()["fetches_saved"], 2)
+
+    def test_every_item_gets_one_line(self):
+        items = [{"url": PAGE, "question": "Who are the owners?", "id": "ok"},
+                 "not an object",
+                 None,
+                 {"url": PAGE},
+                 {"url": 5, "question": "Who?"},
+                 {"url": SITE + "/nope/1", "question": "Who?", "id": "unsupported"},
+                 {"url": BROKEN, "question": "Who?", "id": "broken"},
+                 {"url": BROKEN, "question": "Why?"}]
+        results = self.run_items(items)
+        self.assertEqual(results[0]["id"], "ok")
+        self.assertIn("answer", results[0])
+        self.assertEqual([i for i, r in results.items() if "error" in r], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(results[6]["id"], "broken")
+        self.assertIn("404", results[7]["error"])
+        self.assertEqual(self.fetches.count(BROKEN), 1)
+
+    def test_saturated_is_retried(self):
+        self.scheduler.saturations = 2
+        with mock.patch.object(batchQuery, "BATCH_LLM_RETRIES", 2):
+            results = self.run_items([{"url": PAGE, "question": "Who are the owners?"}])
+        self.assertIn("answer", results[0])
+        self.assertEqual(self.runner.stats()["retries"], 2)
+
+    def test_saturated_past_the_retries_fails_the_item(self):
+        self.scheduler.saturations = 3
+        with mock.patch.object(batchQuery, "BATCH_LLM_RETRIES", 2):
+            results = self.run_items([{"url": PAGE, "question": "Who are the owners?"}])
+        self.assertEqual(results[0]["error"], "LLM queue is full")
+        self.assertEqual(self.runner.stats()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
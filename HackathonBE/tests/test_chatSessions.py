@@ -0,0 +1,49 @@
+"""
+Regression tests for how stored conversations key the answer cache.
+
+    python -m unittest discover -s tests        # from HackathonBE/
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answerCache import payload_fingerprint  # noqa: E402
+from chatSessions import ChatSessions  # noqa: E402
+
+PARTS = [{"sha256": "a" * 64, "content": '{"portfolioID": 5}'}]
+PAYLOAD = {"portfolio": {"portfolioID": 5}}
+
+
+class TranscriptKeyTests(unittest.TestCase):
+    def setUp(self):
+        self.sessions = ChatSessions()
+
+    def fingerprint(self, conversation: str) -> str:
+        return payload_fingerprint(PAYLOAD, self.sessions.transcript_key(conversation))
+
+    def answer(self, conversation: str, question: str, answer: str):
+        self.sessions.begin(conversation, PARTS, question).commit(answer)
+
+    def test_follow_ups_in_different_conversations_do_not_share_a_key(self):
+        self.answer("a", "What is the balance?", "It is $100.")
+        self.answer("b", "Any late fees?", "None.")
+        self.assertNotEqual(self.fingerprint("a"), self.fingerprint("b"))
+
+    def test_new_conversation_keys_on_the_payload_alone(self):
+        self.assertEqual(self.sessions.transcript_key("new"), "")
+        self.assertEqual(self.fingerprint("new"), payload_fingerprint(PAYLOAD))
+
+    def test_cached_answer_is_recorded(self):
+        before = self.fingerprint("a")
+        self.sessions.answered("a", "What is the balance?", "It is $100.")
+        self.assertNotEqual(self.fingerprint("a"), before)
+        turn = self.sessions.begin("a", PARTS, "And the owners?")
+        self.assertEqual(turn.stats["session_turns"], 1)
+        self.assertEqual(turn.stats["parts_sent"], 1)    # the cached turn never sent them
+        self.assertIn("It is $100.", [m["content"] for m in turn.history])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Regression tests for contextPacker pruning on multi-call pages.
+
+    python -m unittest discover -s tests        # from HackathonBE/
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contextPacker import pack_context, prune_envelope  # noqa: E402
+from jsonCodec import dumps  # noqa: E402
+from promptParsing import chunk_for_lm_studio  # noqa: E402
+
+ROOTS = ("portfolio", "ledger")
+PAYLOAD = {
+    "portfolio": {"portfolioID": 5, "name": "ABC Holdings", "owners": [{"contactID": 1, "name": "Owner 1"}]},
+    "ledger": {"ledgerID": 976, "name": "ABC Holdings", "balances": [{"ledgerEntryID": 1, "amount": "10.00"}]},
+}
+
+
+class MultiCallPruneTests(unittest.TestCase):
+    def test_root_envelope_keeps_each_call_id(self):
+        data = prune_envelope("", PAYLOAD, ROOTS)
+        self.assertEqual(data["portfolio"]["portfolioID"], 5)
+        self.assertEqual(data["ledger"]["ledgerID"], 976)
+        self.assertNotIn("contactID", data["portfolio"]["owners"][0])
+
+    def test_call_envelope_is_pruned_as_a_root(self):
+        self.assertEqual(prune_envelope("ledger", PAYLOAD["ledger"], ROOTS)["ledgerID"], 976)
+        self.assertNotIn("ledgerID", prune_envelope("ledger", PAYLOAD["ledger"]))
+        self.assertEqual(prune_envelope("ledger.balances", PAYLOAD["ledger"]["balances"], ROOTS),
+                         [{"amount": "10.00"}])
+
+    def test_packed_context_cites_both_entities(self):
+        parts = chunk_for_lm_studio(dumps(PAYLOAD), max_tokens=40, reserve_tokens=0, overlap_tokens=0)
+        text = "\n".join(p["content"] for p in pack_context(parts, "balance", roots=ROOTS)["parts"])
+        self.assertIn('"portfolioID":5', text)
+        self.assertIn('"ledgerID":976', text)
+        self.assertNotIn("ledgerEntryID", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
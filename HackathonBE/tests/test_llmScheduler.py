@@ -0,0 +1,163 @@
+"""
+Regression tests for llmScheduler slot accounting when callers go away.
+
+    python -m unittest discover -s tests        # from HackathonBE/
+"""
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llmScheduler  # noqa: E402
+from llmScheduler import LlmScheduler  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class StubBackend:
+    """Stands in for llmClient's streaming calls; each generation waits until release()."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def release(self):
+        self.gate.set()
+
+    def stream(self, messages, url=None, **options):
+        self.gate.wait(5)
+        yield ("delta", "hi")
+        yield ("done", {"usage": None, "finish_reason": "stop"})
+
+    async def astream(self, messages, url=None, **options):
+        while not self.gate.is_set():
+            await asyncio.sleep(0.005)
+        yield ("delta", "hi")
+        yield ("done", {"usage": None, "finish_reason": "stop"})
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.backend = StubBackend()
+        patches = [mock.patch.object(llmScheduler, "stream_chat_completion", self.backend.stream),
+                   mock.patch.object(llmScheduler, "astream_chat_completion", self.backend.astream)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.scheduler = LlmScheduler(["http://stub"], max_in_flight=1, queue_timeout=2)
+
+    def assert_idle(self):
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(stats["queue"], 0)
+        self.assertEqual(self.scheduler._flights, {})
+
+
+class AbandonedCallTests(SchedulerTestCase):
+    def test_queued_stream_closed_after_queued_event(self):
+        from app import stream_answer
+
+        running = self.scheduler.request([{"role": "user", "content": "first"}], "a")
+        queued = self.scheduler.request(MESSAGES, "b")
+        self.assertEqual(queued.position, 1)
+        events = stream_answer(queued, [], {})
+        self.assertTrue(next(events).startswith("event: queued"))
+        events.close()      # the client disconnected
+
+        self.backend.release()
+        self.assertEqual(running.result()["content"], "hi")
+        self.assert_idle()
+        self.assertEqual(self.scheduler.counters["abandoned"], 1)
+
+        again = self.scheduler.request(MESSAGES, "b")   # must not coalesce onto the dead flight
+        self.assertFalse(again.coalesced)
+        self.assertEqual(again.result()["content"], "hi")
+        self.assert_idle()
+
+    def test_granted_call_never_read(self):
+        call = self.scheduler.request(MESSAGES, "a")
+        self.assertEqual(self.scheduler.stats()["in_flight"], 1)
+        call.close()
+        self.assert_idle()
+
+    def test_cancelled_task_while_queued(self):
+        async def scenario():
+            running = self.scheduler.request([{"role": "user", "content": "first"}], "a")
+            queued = self.scheduler.request(MESSAGES, "b")
+            task = asyncio.ensure_future(queued.aresult())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.backend.release()
+            await running.aresult()
+
+        asyncio.run(scenario())
+        self.assert_idle()
+
+    def test_follower_of_stalled_flight_times_out(self):
+        owner = self.scheduler.request(MESSAGES, "a")
+        follower = self.scheduler.request(MESSAGES, "b")
+        self.assertTrue(follower.coalesced)
+        self.scheduler.queue_timeout = 0.05
+        with mock.patch.object(llmScheduler, "LLM_STALL_TIMEOUT", 0.05):
+            with self.assertRaises(TimeoutError):
+                follower.result()
+        owner.close()
+        self.assert_idle()
+
+
+class HandoffTests(SchedulerTestCase):
+    """The owner of a coalesced generation goes away; its followers still get the answer."""
+
+    def test_owner_closed_before_reading(self):
+        owner = self.scheduler.request(MESSAGES, "a")
+        follower = self.scheduler.request(MESSAGES, "b")
+        owner.close()
+        self.backend.release()
+        self.assertEqual(follower.result()["content"], "hi")
+        self.assertEqual(self.scheduler.counters["handoffs"], 1)
+        self.assertEqual(self.scheduler.counters["completed"], 1)
+        self.assert_idle()
+
+    def test_owner_left_mid_stream(self):
+        owner = self.scheduler.request(MESSAGES, "a")
+        follower = self.scheduler.request(MESSAGES, "b")
+        self.backend.release()
+        events = owner.stream()
+        self.assertEqual(next(events), ("delta", "hi"))
+        events.close()
+        self.assertEqual(follower.result()["content"], "hi")
+        self.assertEqual(self.scheduler.counters["abandoned"], 0)
+        self.assert_idle()
+
+    def test_async_owner_cancelled_mid_read(self):
+        async def scenario():
+            owner = self.scheduler.request(MESSAGES, "a")
+            follower = self.scheduler.request(MESSAGES, "b")
+            task = asyncio.ensure_future(owner.aresult())
+            waiting = asyncio.ensure_future(follower.aresult())
+            await asyncio.sleep(0.05)      # the owner is inside the upstream read
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.backend.release()
+            return await waiting
+
+        self.assertEqual(asyncio.run(scenario())["content"], "hi")
+        self.assert_idle()
+
+    def test_last_follower_leaving_cancels(self):
+        owner = self.scheduler.request(MESSAGES, "a")
+        follower = self.scheduler.request(MESSAGES, "b")
+        owner.close()
+        follower.close()
+        self.assertEqual(self.scheduler.counters["abandoned"], 1)
+        self.assert_idle()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Tests for prefetch.Prefetcher: joining, cancellation and queries taking a prefetch.
+
+    python -m unittest discover -s tests        # from HackathonBE/
+"""
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prefetch  # noqa: E402
+from prefetch import Prefetcher  # noqa: E402
+
+SITE = "https://abchomes.rentvinedev.com"
+PAGE = SITE + "/portfolios/5"
+OTHER = SITE + "/portfolios/6"
+BLOCKER = SITE + "/portfolios/7"
+
+
+class StubPages:
+    """fetch/chunk for Prefetcher; fetches of a URL in `held` block until release(url)."""
+
+    def __init__(self):
+        self.fetched = []
+        self.held = {}
+        self.lock = threading.Lock()
+
+    def hold(self, url: str):
+        self.held[url] = threading.Event()
+
+    def release(self, url: str):
+        self.held[url].set()
+
+    def fetch(self, url: str):
+        with self.lock:
+            self.fetched.append(url)
+        if url in self.held:
+            self.held[url].wait(5)
+        return {"portfolio": {"portfolioID": int(url.rsplit("/", 1)[1])}}
+
+    def chunk(self, payload) -> list:
+        return [{"content": str(payload)}]
+
+
+class PrefetcherTests(unittest.TestCase):
+    def setUp(self):
+        self.pages = StubPages()
+        self.prefetcher = Prefetcher(self.pages.fetch, self.pages.chunk, workers=1)
+        self.addCleanup(self.prefetcher._executor.shutdown, wait=False, cancel_futures=True)
+
+    def block_worker(self):
+        """Keep the single worker busy so the next start() stays queued."""
+        self.pages.hold(BLOCKER)
+        self.prefetcher.start(BLOCKER, "blocker")
+        self.addCleanup(self.pages.release, BLOCKER)
+
+    def test_same_page_is_fetched_once(self):
+        self.pages.hold(PAGE)
+        self.assertEqual(self.prefetcher.start(PAGE, "tab1"), "started")
+        self.assertEqual(self.prefetcher.start(PAGE + "?tab=ledger", "tab2"), "pending")
+        self.pages.release(PAGE)
+        self.assertIsNotNone(self.prefetcher.take(PAGE))
+        self.assertEqual(self.prefetcher.start(PAGE, "tab3"), "ready")
+        self.assertEqual(self.pages.fetched, [PAGE])
+
+    def test_navigating_away_cancels_a_queued_prefetch(self):
+        self.block_worker()
+        self.prefetcher.start(PAGE, "tab1")
+        self.prefetcher.start(OTHER, "tab1")
+        self.assertEqual(self.prefetcher.stats()["cancelled"], 1)
+        self.assertIsNone(self.prefetcher.take(PAGE))
+        self.pages.release(BLOCKER)
+        self.assertIsNotNone(self.prefetcher.take(OTHER))
+        self.assertNotIn(PAGE, self.pages.fetched)
+
+    def test_shared_prefetch_survives_one_client_leaving(self):
+        self.block_worker()
+        self.prefetcher.start(PAGE, "tab1")
+        self.prefetcher.start(PAGE, "tab2")
+        self.prefetcher.start(OTHER, "tab1")
+        self.assertEqual(self.prefetcher.stats()["cancelled"], 0)
+        self.pages.release(BLOCKER)
+        self.assertIsNotNone(self.prefetcher.take(PAGE))
+
+    def test_take_narrows_and_reuses_chunks(self):
+        self.prefetcher.start(PAGE, "tab1")
+        payload, parts = self.prefetcher.take(PAGE)
+        self.assertEqual(payload, {"portfolio": {"portfolioID": 5}})
+        self.assertEqual(parts, [{"content": str(payload)}])
+        self.assertIsNone(self.prefetcher.take(OTHER))
+        self.assertEqual(self.prefetcher.stats()["misses"], 1)
+
+    def test_waiting_query_keeps_the_prefetch(self):
+        self.pages.hold(PAGE)
+        self.prefetcher.start(PAGE, "tab1")
+        taken = []
+        waiter = threading.Thread(target=lambda: taken.append(self.prefetcher.take(PAGE)))
+        waiter.start()
+        while self.prefetcher.stats()["waits"] == 0:
+            threading.Event().wait(0.005)
+        self.prefetcher.start(OTHER, "tab1")      # the tab moves on while the query waits
+        self.pages.release(PAGE)
+        waiter.join(5)
+        self.assertIsNotNone(taken[0])
+        self.assertEqual(self.prefetcher.stats()["cancelled"], 0)
+
+    def test_page_queried_once_can_still_be_cancelled(self):
+        self.block_worker()
+        self.prefetcher.start(PAGE, "tab1")
+        with mock.patch.object(prefetch, "PREFETCH_WAIT", 0.01):
+            self.assertIsNone(self.prefetcher.take(PAGE))     # timed out while queued
+        self.prefetcher.start(OTHER, "tab1")
+        self.assertEqual(self.prefetcher.stats()["cancelled"], 1)
+        self.pages.release(BLOCKER)
+        self.assertIsNotNone(self.prefetcher.take(OTHER))
+        self.assertNotIn(PAGE, self.pages.fetched)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Regression tests for chunk_for_lm_studio's token fitting without tiktoken.
+
+    python -m unittest discover -s tests        # from HackathonBE/
+"""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import promptParsing  # noqa: E402
+from promptParsing import _estimate_tokens, _Tokens, chunk_for_lm_studio  # noqa: E402
+
+
+def estimate(text: str) -> int:
+    return _estimate_tokens(len(text.split()), len(text))
+
+
+class LongWordTests(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(promptParsing, "get_encoder", lambda encoding_name="cl100k_base": None)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_long_words_chunk_in_linear_time(self):
+        text = " ".join(["abcdefghijklmnop"] * 60000)
+        started = time.perf_counter()
+        parts = chunk_for_lm_studio(text, max_tokens=2000, reserve_tokens=0, overlap_tokens=0)
+        self.assertLess(time.perf_counter() - started, 2.0)
+        sizes = [estimate(p["content"]) for p in parts]
+        self.assertLessEqual(max(sizes), 2000)
+        self.assertGreater(min(sizes[:-1]), 1990)     # every chunk but the last is filled to the cap
+        self.assertEqual(sum(len(p["content"].split()) for p in parts), 60000)
+
+    def test_fit_agrees_with_count(self):
+        tok = _Tokens("cl100k_base")
+        units = tok.encode(" ".join(["abcdefghijklmnop"] * 1000))
+        n = tok.fit(100, units)
+        self.assertLessEqual(tok.count(units[:n]), 100)
+        self.assertGreater(tok.count(units[:n + 1]), 100)
+        self.assertEqual(tok.prefix(units, 100)[2], n)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Regression tests for the bounds on responseCache's shared SQLite tier.
+
+    python -m unittest discover -s tests        # from HackathonBE/
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from responseCache import CacheEntry, ResponseCache, _SqliteStore  # noqa: E402
+
+
+def entry(size: int, expires_in: float = 60) -> CacheEntry:
+    return CacheEntry(b"x" * size, '"etag"', None, time.time() + expires_in)
+
+
+class SqliteTierTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "fetch_cache.sqlite")
+
+    def keys(self, store: _SqliteStore) -> set:
+        return {row[0] for row in store._conn().execute("SELECT key FROM responses")}
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        store = _SqliteStore(self.path, max_bytes=300)
+        for key in ("a", "b", "c"):
+            store.put(key, entry(100))
+            time.sleep(0.01)
+        store._conn().execute("UPDATE responses SET used = used - 3600")    # last read an hour ago
+        store.get("a")                                  # "b" is now the least recently used
+        self.assertEqual(store.put("d", entry(100)), (0, 1))
+        self.assertEqual(self.keys(store), {"a", "c", "d"})
+
+    def test_long_stale_rows_are_purged(self):
+        store = _SqliteStore(self.path, stale_ttl=60)
+        store.put("recently-stale", entry(10, expires_in=-30))    # still worth revalidating
+        store.put("long-stale", entry(10, expires_in=-120))
+        self.assertEqual(self.keys(store), {"recently-stale"})
+
+    def test_store_from_before_the_budget_is_migrated(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE responses ("
+                     " key TEXT PRIMARY KEY, body BLOB, etag TEXT, last_modified TEXT, expires REAL)")
+        conn.execute("INSERT INTO responses VALUES ('old', ?, NULL, NULL, ?)", (b"x" * 200, time.time() + 60))
+        conn.commit()
+        conn.close()
+        cache = ResponseCache(path=self.path)
+        cache._store.max_bytes = 300
+        cache.put("new", entry(200))
+        self.assertEqual(self.keys(cache._store), {"new"})
+        self.assertEqual(cache.stats()["shared_evictions"], 1)
+
+    def test_stale_local_entry_is_refreshed_from_the_shared_tier(self):
+        first, second = ResponseCache(path=self.path), ResponseCache(path=self.path)
+        first.put("page", entry(10, expires_in=-5))
+        second.put("page", CacheEntry(b"new", '"etag2"', None, time.time() + 60))     # another worker revalidated
+        got = first.get("page")
+        self.assertTrue(got.fresh)
+        self.assertEqual(got.body, b"new")
+        self.assertEqual(first.stats()["shared_hits"], 1)
+
+    def test_shared_reads_rarely_write(self):
+        store = _SqliteStore(self.path)
+        store.put("page", entry(10))
+        conn = store._conn()
+        writes = conn.total_changes
+        for _ in range(5):
+            store.get("page")
+        self.assertEqual(conn.total_changes, writes)
+        conn.execute("UPDATE responses SET used = used - 3600")
+        writes = conn.total_changes
+        store.get("page")
+        self.assertEqual(conn.total_changes, writes + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
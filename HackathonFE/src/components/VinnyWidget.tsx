@@ -32,9 +32,19 @@ function chatKeyFor(pathname: string, sessionId: string) {
 function draftKeyFor(pathname: string, sessionId: string) {
   return `vinny_draft::${sessionId}::${pathname}`;
 }
+// the backend keeps a transcript per conversation id; clearing the chat starts a new one (rotate)
+function conversationIdFor(chatKey: string, rotate = false): string {
+  const KEY = `vinny_conversation::${chatKey}`;
+  let cid = sessionStorage.getItem(KEY);
+  if (!cid || rotate) {
+    cid = `${chatKey}::${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    sessionStorage.setItem(KEY, cid);
+  }
+  return cid;
+}
 
 
-async function realChat(q: string, h: string) {
+async function realChat(q: string, h: string, sessionId: string) {
   
   const currentAddress = window.location.href;//parse the url
   const backendPort = import.meta.env.VITE_BACKEND_PORT;
@@ -45,7 +55,9 @@ async function realChat(q: string, h: string) {
     body: JSON.stringify({ 
       question: q,
       url: currentAddress,
-      history: h
+      history: h,
+      // lets the backend keep this chat's transcript and send the model only what changed
+      session_id: sessionId
     }),
   });
   if (!res.ok) {
@@ -55,6 +67,18 @@ async function realChat(q: string, h: string) {
 
 }
 
+// Warm start: ask the backend to fetch this page's Rentvine data while the user is still typing.
+// Fire-and-forget; tabId lets the backend drop the previous page's prefetch when the user moves on
+function prefetchPage(tabId: string) {
+  const backendPort = import.meta.env.VITE_BACKEND_PORT;
+  fetch(`http://localhost:${backendPort}/api/prefetch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ url: window.location.href, user: tabId }),
+    keepalive: true,
+  }).catch(() => {});
+}
+
 
 // export default function VinnyWidget({
 //   onClose,
@@ -75,6 +99,7 @@ export default function VinnyWidget({ onClose, stateClassName }: { onClose?: ()
   const SESSION_ID = ensureSessionId();
   const STORAGE_KEY = chatKeyFor(location.pathname, SESSION_ID);
   const DRAFT_KEY = draftKeyFor(location.pathname, SESSION_ID);
+  const CONVERSATION_ID = conversationIdFor(STORAGE_KEY);
 
   const [history, setHistory] = useState<Msg[]>(() => {
     try {
@@ -86,6 +111,11 @@ export default function VinnyWidget({ onClose, stateClassName }: { onClose?: ()
     try { return localStorage.getItem(DRAFT_KEY) || ""; } catch { return ""; }
   });
 
+  // prefetch the page context when the widget opens and whenever the route changes
+  useEffect(() => {
+    prefetchPage(SESSION_ID);
+  }, [location.pathname, SESSION_ID]);
+
     // keep history in localStorage
   useEffect(() => {
     try { localStorage.setItem(STORAGE_KEY, JSON.stringify(history)); } catch {}
@@ -239,7 +269,7 @@ export default function VinnyWidget({ onClose, stateClassName }: { onClose?: ()
 
   try {
     console.log(q);
-    const data = await realChat(q, JSON.stringify(history));
+    const data = await realChat(q, JSON.stringify(history), CONVERSATION_ID);
 
     const cites = (data.sources || [])
       .slice(0, 2)
@@ -284,7 +314,7 @@ export default function VinnyWidget({ onClose, stateClassName }: { onClose?: ()
             {/*Not needed but maybe in the future? Connectivity tag? <span className="vinny-pill">Yo Mama</span> */}
             <button
               className="vinny-refresh"
-              onClick={() => { setHistory([]); localStorage.removeItem(STORAGE_KEY); localStorage.removeItem(DRAFT_KEY); }}
+              onClick={() => { setHistory([]); localStorage.removeItem(STORAGE_KEY); localStorage.removeItem(DRAFT_KEY); conversationIdFor(STORAGE_KEY, true); }}
               title="Clear chat"
               aria-label="Clear chat"
             >
@@ -30,6 +30,32 @@ Write-Host "🔧 Activating virtual environment..." -ForegroundColor Yellow
 Write-Host "📥 Installing Python dependencies..." -ForegroundColor Yellow
 pip install -r requirements.txt
 
+# Build the knowledge base search index if it is missing
+if (-Not (Test-Path "HackathonBE\index\kb.idx")) {
+    Write-Host "📚 Building knowledge base index..." -ForegroundColor Yellow
+    Push-Location HackathonBE
+    & "..\venv\Scripts\python.exe" kbIndex.py build
+    Pop-Location
+}
+if (-Not (Test-Path "HackathonBE\index\embeddings.json")) {
+    Write-Host "🧠 Building knowledge base embeddings..." -ForegroundColor Yellow
+    Push-Location HackathonBE
+    & "..\venv\Scripts\python.exe" kbEmbeddings.py build
+    Pop-Location
+}
+if (-Not (Test-Path "HackathonBE\index\kb.store")) {
+    Write-Host "🗄️  Building knowledge base store..." -ForegroundColor Yellow
+    Push-Location HackathonBE
+    & "..\venv\Scripts\python.exe" kbStore.py build
+    Pop-Location
+}
+if (-Not (Test-Path "HackathonBE\index\page_context.json")) {
+    Write-Host "🗺️  Building page context..." -ForegroundColor Yellow
+    Push-Location HackathonBE
+    & "..\venv\Scripts\python.exe" pageContext.py build
+    Pop-Location
+}
+
 # Function to handle cleanup
 function Cleanup {
     Write-Host ""
@@ -26,6 +26,24 @@ source venv/bin/activate
 echo "📥 Installing Python dependencies..."
 pip install -r requirements.txt
 
+# Build the knowledge base search index if it is missing
+if [ ! -f "HackathonBE/index/kb.idx" ]; then
+    echo "📚 Building knowledge base index..."
+    (cd HackathonBE && "$SCRIPT_DIR/venv/bin/python" kbIndex.py build)
+fi
+if [ ! -f "HackathonBE/index/embeddings.json" ]; then
+    echo "🧠 Building knowledge base embeddings..."
+    (cd HackathonBE && "$SCRIPT_DIR/venv/bin/python" kbEmbeddings.py build)
+fi
+if [ ! -f "HackathonBE/index/kb.store" ]; then
+    echo "🗄️  Building knowledge base store..."
+    (cd HackathonBE && "$SCRIPT_DIR/venv/bin/python" kbStore.py build)
+fi
+if [ ! -f "HackathonBE/index/page_context.json" ]; then
+    echo "🗺️  Building page context..."
+    (cd HackathonBE && "$SCRIPT_DIR/venv/bin/python" pageContext.py build)
+fi
+
 # Create a function to handle cleanup on exit
 cleanup() {
     echo ""